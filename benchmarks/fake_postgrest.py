@@ -0,0 +1,274 @@
+"""
+In-memory PostgREST stand-in (ASGI) for offline benchmarks.
+
+Implements the subset of PostgREST used by the services: table select/insert/
+update with eq/neq/in/is filters, order/limit/offset, Prefer return/count and
+the begin_payment/finish_payment procedures from src/db/schemas.sql.
+"""
+import asyncio
+import json
+import random
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from uuid import uuid4
+
+# Columns filled by the database when missing on insert
+TABLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "merchants": {"is_active": True, "adiq_environment": "hml"},
+    "invoices": {"currency": "BRL", "status": "PENDING", "description": None, "order_number": None},
+    "transactions": {
+        "currency": "BRL", "installments": 1, "status": "CREATED", "payment_id": None,
+        "authorization_code": None, "nsu": None, "tid": None
+    },
+    "webhook_logs": {"processed": False, "processed_at": None, "error": None, "dedup_key": None},
+}
+
+# Unique columns (besides id) checked on insert
+UNIQUE_COLUMNS: Dict[str, List[str]] = {
+    "merchants": ["api_key_hash"],
+    "webhook_logs": ["dedup_key"],
+}
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _parse_value(raw: str) -> Any:
+    """Unquote a PostgREST filter value."""
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1]
+    return raw
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    """Evaluate one PostgREST filter (eq/neq/in/is/gt/gte/lt/lte) against a row."""
+    operator, _, raw = expression.partition(".")
+    value = row.get(column)
+    
+    if operator == "is":
+        expected = {"null": None, "true": True, "false": False}[raw]
+        return value is expected
+    if operator == "in":
+        options = [_parse_value(item) for item in raw.strip("()").split(",") if item]
+        return str(value) in options
+    
+    raw = _parse_value(raw)
+    if isinstance(value, bool):
+        value = str(value).lower()
+    elif value is not None:
+        value = str(value)
+    
+    if operator == "eq":
+        return value == raw
+    if operator == "neq":
+        return value != raw
+    if value is None:
+        return False
+    if operator == "gt":
+        return value > raw
+    if operator == "gte":
+        return value >= raw
+    if operator == "lt":
+        return value < raw
+    if operator == "lte":
+        return value <= raw
+    raise ValueError(f"unsupported filter operator: {operator}")
+
+
+class PostgrestError(Exception):
+    """Error answered as a PostgREST JSON error body."""
+    
+    def __init__(self, status: int, code: str, message: str, details: Optional[str] = None):
+        self.status = status
+        self.body = {"code": code, "message": message, "details": details, "hint": None}
+
+
+class FakePostgrest:
+    """
+    ASGI app serving /rest/v1 from in-memory tables.
+    
+    Every request sleeps for a sampled latency so pool limits and concurrency
+    behave like a real database round trip.
+    """
+    
+    def __init__(self, latency: Callable[[], float] = lambda: 0.0):
+        """
+        Args:
+            latency: Returns the simulated round-trip time in seconds
+        """
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.statements = 0
+        self.procedures: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "begin_payment": self._begin_payment,
+            "finish_payment": self._finish_payment,
+        }
+    
+    def insert_row(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a row with defaults, ids and timestamps; enforces unique columns."""
+        rows = self.tables.setdefault(table, [])
+        stored = {**TABLE_DEFAULTS.get(table, {}), **row}
+        stored.setdefault("id", str(uuid4()))
+        stored.setdefault("created_at", _now())
+        stored.setdefault("updated_at", stored["created_at"])
+        if table == "webhook_logs":
+            stored.setdefault("received_at", stored["created_at"])
+        
+        for column in ["id"] + UNIQUE_COLUMNS.get(table, []):
+            if stored.get(column) is not None and any(r.get(column) == stored[column] for r in rows):
+                raise PostgrestError(409, "23505", f'duplicate key value violates unique constraint "{table}_{column}"')
+        
+        rows.append(stored)
+        return stored
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        
+        headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+        params = parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+        path = scope["path"].removeprefix("/rest/v1/")
+        
+        delay = self.latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.statements += 1
+        
+        try:
+            status, payload, extra_headers = self._handle(
+                scope["method"], path, params, headers, json.loads(body) if body else None
+            )
+        except PostgrestError as e:
+            status, payload, extra_headers = e.status, e.body, {}
+        
+        content = b"" if payload is None else json.dumps(payload, default=str).encode()
+        response_headers = [(b"content-type", b"application/json")]
+        response_headers += [(key.encode(), value.encode()) for key, value in extra_headers.items()]
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": content})
+    
+    def _handle(
+        self,
+        method: str,
+        path: str,
+        params: List[Tuple[str, str]],
+        headers: Dict[str, str],
+        body: Any
+    ) -> Tuple[int, Any, Dict[str, str]]:
+        """Dispatch a PostgREST request."""
+        if path.startswith("rpc/"):
+            procedure = self.procedures.get(path.removeprefix("rpc/"))
+            if procedure is None:
+                raise PostgrestError(404, "PGRST202", f"Could not find the function {path}")
+            return 200, procedure(body or {}), {}
+        
+        prefer = headers.get("prefer", "")
+        filters = [(column, expression) for column, expression in params if column not in RESERVED_PARAMS]
+        options = dict(params)
+        
+        if method == "POST":
+            rows = body if isinstance(body, list) else [body]
+            inserted = [self.insert_row(path, row) for row in rows]
+            return 201, None if "return=minimal" in prefer else inserted, {}
+        
+        matched = [row for row in self.tables.get(path, []) if all(_matches(row, c, e) for c, e in filters)]
+        
+        if method == "PATCH":
+            for row in matched:
+                row.update(body)
+                row.setdefault("updated_at", _now())
+            return 200, None if "return=minimal" in prefer else matched, {}
+        
+        if method == "DELETE":
+            self.tables[path] = [row for row in self.tables.get(path, []) if row not in matched]
+            return 200, matched, {}
+        
+        total = len(matched)
+        if "order" in options:
+            for clause in reversed(options["order"].split(",")):
+                column, _, direction = clause.partition(".")
+                matched.sort(
+                    key=lambda row: (row.get(column) is None, str(row.get(column))),
+                    reverse=direction.startswith("desc")
+                )
+        offset = int(options.get("offset", 0))
+        limit = int(options["limit"]) if "limit" in options else None
+        page = matched[offset:offset + limit if limit is not None else None]
+        
+        extra_headers = {}
+        if "count=" in prefer:
+            end = offset + len(page) - 1
+            extra_headers["content-range"] = f"{offset}-{end}/{total}" if page else f"*/{total}"
+        return 200, page, extra_headers
+    
+    def _find(self, table: str, **values: Any) -> Optional[Dict[str, Any]]:
+        for row in self.tables.get(table, []):
+            if all(str(row.get(key)) == str(value) for key, value in values.items()):
+                return row
+        return None
+    
+    def _begin_payment(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Mirror of begin_payment in schemas.sql."""
+        merchant = self._find("merchants", id=params["p_merchant_id"])
+        if merchant is None:
+            raise PostgrestError(400, "P0002", "MERCHANT_NOT_FOUND")
+        if not (merchant.get("adiq_client_id") and merchant.get("adiq_client_secret") and merchant.get("adiq_seller_id")):
+            raise PostgrestError(400, "P0001", "MERCHANT_MISSING_ADIQ_CREDENTIALS")
+        
+        invoice = self._find("invoices", id=params["p_invoice_id"], merchant_id=params["p_merchant_id"])
+        if invoice is None:
+            raise PostgrestError(400, "P0002", "INVOICE_NOT_FOUND")
+        if invoice["status"] != "PENDING":
+            raise PostgrestError(400, "P0001", "INVALID_STATE_TRANSITION", invoice["status"])
+        
+        invoice.update({"status": "PROCESSING", "order_number": params["p_order_number"], "updated_at": _now()})
+        transaction = self.insert_row("transactions", {
+            "id": params["p_transaction_id"],
+            "invoice_id": invoice["id"],
+            "merchant_id": merchant["id"],
+            "amount": invoice["amount"],
+            "currency": invoice["currency"],
+            "installments": params["p_installments"],
+            "status": "CREATED"
+        })
+        credentials = ["id", "adiq_client_id", "adiq_client_secret", "adiq_seller_id", "adiq_environment"]
+        return {
+            "invoice": dict(invoice),
+            "transaction": dict(transaction),
+            "merchant": {key: merchant.get(key) for key in credentials}
+        }
+    
+    def _finish_payment(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Mirror of finish_payment in schemas.sql."""
+        transaction = self._find("transactions", id=params["p_transaction_id"], status="CREATED")
+        if transaction is None:
+            raise PostgrestError(400, "P0001", "INVALID_STATE_TRANSITION", "transaction not in CREATED")
+        
+        transaction["status"] = params["p_transaction_status"]
+        for column in ["payment_id", "authorization_code", "nsu", "tid"]:
+            if params.get(f"p_{column}") is not None:
+                transaction[column] = params[f"p_{column}"]
+        transaction["updated_at"] = _now()
+        
+        invoice = self._find("invoices", id=transaction["invoice_id"], status="PROCESSING")
+        if invoice is None:
+            raise PostgrestError(400, "P0001", "INVALID_STATE_TRANSITION", "invoice not in PROCESSING")
+        invoice.update({"status": params["p_invoice_status"], "updated_at": _now()})
+        
+        return {"invoice": dict(invoice), "transaction": dict(transaction)}
+
+
+def uniform_latency(low: float, high: float) -> Callable[[], float]:
+    """Latency sampler: uniform between low and high seconds."""
+    return lambda: random.uniform(low, high)
@@ -0,0 +1,354 @@
+"""
+Offline load benchmark for the gateway API.
+
+Drives POST /v1/invoices, POST /v1/payments and POST /v1/webhooks/adiq through
+the ASGI app in-process, with the database and Adiq replaced by local stand-ins
+(benchmarks/fake_postgrest.py and the Adiq simulator in simulator/adiq.py). No network access or
+credentials are needed.
+
+Usage:
+    python -m benchmarks.run --scenario all --requests 1000 --concurrency 50
+    python -m benchmarks.run --scenario payments --save-baseline
+    python -m benchmarks.run --scenario payments --compare
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Settings are read on import of src.*; the stand-ins need no real values
+for _name, _value in {
+    "SUPABASE_URL": "http://fake-db",
+    "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark",
+    "ADIQ_BASE_URL": "http://fake-adiq",
+    "ADIQ_CLIENT_ID": "benchmark",
+    "ADIQ_CLIENT_SECRET": "benchmark",
+    "JWT_SECRET": "benchmark",
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import httpx
+
+from benchmarks.fake_postgrest import FakePostgrest, uniform_latency
+from simulator.adiq import LatencyDistribution, SimulatorConfig, create_adiq_simulator
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+SCENARIOS = ["invoices", "payments", "webhooks"]
+
+API_KEY = "sk_benchmark_key"
+MERCHANT_ID = "219c230a-5c4b-43d4-861d-f25979de2e88"
+CUSTOMER_ID = "3b415031-7236-425e-bc8f-35c7a5f572ab"
+
+# (method, path, json body)
+RequestSpec = Tuple[str, str, Dict[str, Any]]
+
+
+@dataclass
+class BenchmarkResult:
+    """Latency and throughput for one scenario run."""
+    scenario: str
+    requests: int
+    concurrency: int
+    duration_seconds: float
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    errors: int
+    status_codes: Dict[str, int] = field(default_factory=dict)
+    db_statements: int = 0
+    adiq_calls: int = 0
+    recorded_at: str = ""
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Environment:
+    """Gateway app wired to the in-memory database and Adiq stand-ins."""
+    
+    def __init__(self, db_latency: Callable[[], float], adiq_config: SimulatorConfig):
+        self.fake_db = FakePostgrest(latency=db_latency)
+        self.adiq_app = create_adiq_simulator(adiq_config)
+        self.adiq = self.adiq_app.state.simulator
+        self.client: Optional[httpx.AsyncClient] = None
+    
+    async def __aenter__(self) -> "Environment":
+        from src.adapters import http_client
+        from src.core.security import hash_api_key
+        from src.db.client import db
+        from src.main import app
+        from src.services.webhook_queue import webhook_queue
+        
+        self._webhook_queue = webhook_queue
+        self._http_client = http_client
+        
+        # Services import the global client, so swap its session in place
+        self._db = db
+        self._db_session = db.session
+        db.session = httpx.AsyncClient(
+            base_url=db.session.base_url,
+            headers=db.session.headers,
+            transport=httpx.ASGITransport(app=self.fake_db)
+        )
+        http_client.set_transport(httpx.ASGITransport(app=self.adiq_app))
+        
+        self.fake_db.insert_row("merchants", {
+            "id": MERCHANT_ID,
+            "name": "Benchmark Merchant",
+            "api_key_hash": hash_api_key(API_KEY),
+            "adiq_client_id": "benchmark-client",
+            "adiq_client_secret": "benchmark-secret",
+            "adiq_seller_id": "benchmark-seller",
+        })
+        self.fake_db.insert_row("customers", {"id": CUSTOMER_ID, "merchant_id": MERCHANT_ID})
+        
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://gateway",
+            headers={"X-API-Key": API_KEY},
+            timeout=60.0
+        )
+        await webhook_queue.start()
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self._webhook_queue.stop()
+        await self.client.aclose()
+        await self._db.session.aclose()
+        self._db.session = self._db_session
+        self._http_client.set_transport(None)
+        await self.adiq.close()
+    
+    def seed_invoices(self, count: int) -> List[str]:
+        """Create PENDING invoices directly in the stand-in (not measured)."""
+        return [
+            self.fake_db.insert_row("invoices", {
+                "merchant_id": MERCHANT_ID,
+                "customer_id": CUSTOMER_ID,
+                "amount": 1000
+            })["id"]
+            for _ in range(count)
+        ]
+    
+    def seed_transactions(self, count: int) -> List[str]:
+        """Create AUTHORIZED transactions with Adiq payment ids (not measured)."""
+        payment_ids = []
+        for invoice_id in self.seed_invoices(count):
+            payment_id = f"pay-{invoice_id}"
+            self.fake_db.insert_row("transactions", {
+                "invoice_id": invoice_id,
+                "merchant_id": MERCHANT_ID,
+                "amount": 1000,
+                "status": "AUTHORIZED",
+                "payment_id": payment_id
+            })
+            self.fake_db._find("invoices", id=invoice_id)["status"] = "PROCESSING"
+            payment_ids.append(payment_id)
+        return payment_ids
+    
+    def build_requests(self, scenario: str, count: int) -> List[RequestSpec]:
+        """Build the request list for a scenario."""
+        if scenario == "invoices":
+            body = {"merchant_id": MERCHANT_ID, "customer_id": CUSTOMER_ID, "amount": 1000, "currency": "BRL"}
+            return [("POST", "/v1/invoices/", body) for _ in range(count)]
+        
+        if scenario == "payments":
+            return [
+                ("POST", "/v1/payments/", {
+                    "invoice_id": invoice_id,
+                    "pan": "4761739001010036",
+                    "brand": "visa",
+                    "cardholder_name": "JOSE DA SILVA",
+                    "expiration_month": "12",
+                    "expiration_year": "30",
+                    "security_code": "123",
+                    "installments": 1,
+                    "capture_type": "ac"
+                })
+                for invoice_id in self.seed_invoices(count)
+            ]
+        
+        if scenario == "webhooks":
+            # Captured + Settled per payment, plus a retry of each Captured
+            payment_ids = self.seed_transactions(max(1, count // 3))
+            specs = []
+            for payment_id in payment_ids:
+                captured = {"paymentId": payment_id, "status": "Captured", "eventType": "payment.captured"}
+                settled = {"paymentId": payment_id, "status": "Settled", "eventType": "payment.settled"}
+                specs += [
+                    ("POST", "/v1/webhooks/adiq", captured),
+                    ("POST", "/v1/webhooks/adiq", settled),
+                    ("POST", "/v1/webhooks/adiq", captured)
+                ]
+            return specs[:count]
+        
+        raise ValueError(f"unknown scenario: {scenario}")
+    
+    async def wait_for_webhooks(self, timeout: float = 60.0) -> None:
+        """Wait until the webhook queue has drained."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stats = self._webhook_queue.stats()
+            if stats["depth"] == 0 and stats["in_flight"] == 0:
+                return
+            await asyncio.sleep(0.01)
+
+
+async def run_scenario(env: Environment, scenario: str, count: int, concurrency: int) -> BenchmarkResult:
+    """Fire a scenario's requests with bounded concurrency and collect latencies."""
+    specs = env.build_requests(scenario, count)
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    pending = iter(specs)
+    db_statements = env.fake_db.statements
+    adiq_calls = sum(env.adiq.calls.values())
+    
+    async def worker() -> None:
+        for method, path, body in pending:
+            started = time.perf_counter()
+            try:
+                response = await env.client.request(method, path, json=body)
+                code = str(response.status_code)
+            except Exception as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            status_codes[code] = status_codes.get(code, 0) + 1
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    duration = time.perf_counter() - started
+    
+    if scenario == "webhooks":
+        await env.wait_for_webhooks()
+    
+    latencies.sort()
+    errors = sum(n for code, n in status_codes.items() if not code.startswith("2"))
+    return BenchmarkResult(
+        scenario=scenario,
+        requests=len(specs),
+        concurrency=concurrency,
+        duration_seconds=round(duration, 3),
+        throughput_rps=round(len(specs) / duration, 1) if duration else 0.0,
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 0.95) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        max_ms=round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        errors=errors,
+        status_codes=status_codes,
+        db_statements=env.fake_db.statements - db_statements,
+        adiq_calls=sum(env.adiq.calls.values()) - adiq_calls,
+        recorded_at=datetime.utcnow().isoformat(timespec="seconds")
+    )
+
+
+def baseline_path(scenario: str) -> Path:
+    return BASELINE_DIR / f"{scenario}.json"
+
+
+def save_baseline(result: BenchmarkResult) -> Path:
+    """Store a result as the scenario's baseline."""
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    path = baseline_path(result.scenario)
+    path.write_text(json.dumps(asdict(result), indent=2) + "\n")
+    return path
+
+
+def compare_to_baseline(result: BenchmarkResult, tolerance: float) -> Tuple[bool, List[str]]:
+    """
+    Compare a result with the saved baseline.
+    
+    Returns:
+        (regressed, report lines). Latency above baseline * (1 + tolerance),
+        throughput below baseline * (1 - tolerance) or new errors count as regressions.
+    """
+    path = baseline_path(result.scenario)
+    if not path.exists():
+        return False, [f"  no baseline at {path}"]
+    
+    baseline = json.loads(path.read_text())
+    lines = []
+    regressed = False
+    for metric in ["p50_ms", "p95_ms", "p99_ms", "throughput_rps"]:
+        old, new = baseline[metric], getattr(result, metric)
+        change = (new - old) / old if old else 0.0
+        worse = change < -tolerance if metric == "throughput_rps" else change > tolerance
+        regressed = regressed or worse
+        lines.append(f"  {metric:<15} {old:>10} -> {new:>10} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+    if result.errors > baseline["errors"]:
+        regressed = True
+        lines.append(f"  errors          {baseline['errors']:>10} -> {result.errors:>10}  REGRESSION")
+    return regressed, lines
+
+
+def print_result(result: BenchmarkResult) -> None:
+    print(
+        f"{result.scenario:<9} n={result.requests} c={result.concurrency} "
+        f"rps={result.throughput_rps} p50={result.p50_ms}ms p95={result.p95_ms}ms "
+        f"p99={result.p99_ms}ms max={result.max_ms}ms errors={result.errors} "
+        f"db={result.db_statements} adiq={result.adiq_calls} codes={result.status_codes}"
+    )
+
+
+async def main(args: argparse.Namespace) -> int:
+    scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+    db_latency = uniform_latency(args.db_latency_ms[0] / 1000, args.db_latency_ms[1] / 1000)
+    adiq_config = SimulatorConfig(
+        default_latency=LatencyDistribution(
+            args.adiq_latency, args.adiq_latency_ms[0] / 1000, args.adiq_latency_ms[1] / 1000
+        ),
+        default_error_rate=args.adiq_error_rate,
+        decline_rate=args.adiq_decline_rate
+    )
+    
+    regressed = False
+    async with Environment(db_latency, adiq_config) as env:
+        if args.warmup:
+            await run_scenario(env, "invoices", args.warmup, args.concurrency)
+        
+        for scenario in scenarios:
+            result = await run_scenario(env, scenario, args.requests, args.concurrency)
+            print_result(result)
+            
+            if args.compare:
+                scenario_regressed, lines = compare_to_baseline(result, args.tolerance)
+                print("\n".join(lines))
+                regressed = regressed or scenario_regressed
+            if args.save_baseline:
+                print(f"  baseline saved to {save_baseline(result)}")
+    
+    return 1 if regressed else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline gateway load benchmark")
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="all")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent in-flight requests")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured warm-up requests (0 to skip)")
+    parser.add_argument("--db-latency-ms", type=float, nargs=2, default=[1.0, 3.0], metavar=("MIN", "MAX"))
+    parser.add_argument("--adiq-latency-ms", type=float, nargs=2, default=[20.0, 60.0], metavar=("MIN", "MAX"))
+    parser.add_argument("--adiq-latency", choices=["fixed", "uniform", "lognormal"], default="uniform")
+    parser.add_argument("--adiq-error-rate", type=float, default=0.0, help="Simulated Adiq 503 probability")
+    parser.add_argument("--adiq-decline-rate", type=float, default=0.0, help="Simulated decline probability")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results in benchmarks/baselines/")
+    parser.add_argument("--compare", action="store_true", help="Compare with stored baselines (exit 1 on regression)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (in-process runs vary ~10-20%)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
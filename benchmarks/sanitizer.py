@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for the PCI log sanitizer (src/core/logger.sanitize_data).
+
+Compares the current copy-on-write sanitizer with the previous implementation
+(lower() + linear scan, full recursive copy) on the payload shapes it sees in
+production: log fields, Adiq webhook payloads and payment request bodies.
+
+Usage:
+    python -m benchmarks.sanitizer
+    python -m benchmarks.sanitizer --number 200000
+"""
+import argparse
+import os
+import timeit
+from typing import Any, Callable, Dict
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-db")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark")
+os.environ.setdefault("ADIQ_BASE_URL", "http://fake-adiq")
+os.environ.setdefault("ADIQ_CLIENT_ID", "benchmark")
+os.environ.setdefault("ADIQ_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from src.core.logger import SENSITIVE_FIELDS, sanitize_data
+
+PAYLOADS: Dict[str, Any] = {
+    "log_fields": {
+        "transaction_id": "5b0f8d8e-8a43-4a4e-9d5b-3b0e0c1f9a10",
+        "status": "APPROVED",
+        "invoice_status": "PAID"
+    },
+    "webhook": {
+        "eventType": "payment.status.changed",
+        "paymentId": "0200489674",
+        "status": "Captured",
+        "authorizationCode": "123456",
+        "amount": 10000,
+        "currency": "BRL",
+        "orderNumber": "ORD-1729250000",
+        "merchant": {"sellerId": "7c1c7a4f-1c2b-4a3b-9f10-2f8f5b2d1e11", "name": "Loja Exemplo"},
+        "installments": [{"number": 1, "amount": 10000, "dueDate": "2026-11-18"}],
+        "timestamp": "2026-10-18T12:00:00Z"
+    },
+    "payment": {
+        "payment": {"transactionType": "credit", "amount": 10000, "currencyCode": "brl", "installments": 1},
+        "cardInfo": {
+            "numberToken": "a1b2c3d4e5f6",
+            "brand": "visa",
+            "cardholderName": "JOAO DA SILVA",
+            "expirationMonth": "12",
+            "expirationYear": "30",
+            "securityCode": "123"
+        },
+        "sellerInfo": {"orderNumber": "ORD-1729250000", "softDescriptor": "SPDPAY", "id": "7c1c7a4f"},
+        "customer": {
+            "documentType": "cpf",
+            "documentNumber": "12345678909",
+            "firstName": "Joao",
+            "lastName": "Silva",
+            "email": "joao@example.com",
+            "address": {"street": "Rua A", "number": "1", "city": "Sao Paulo", "state": "SP", "zipCode": "01000000"}
+        }
+    },
+}
+
+
+def legacy_sanitize(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Previous implementation, kept as the comparison baseline."""
+    if not isinstance(data, dict):
+        return data
+    
+    sanitized = {}
+    for key, value in data.items():
+        if any(sensitive in key.lower() for sensitive in SENSITIVE_FIELDS):
+            sanitized[key] = "***REDACTED***"
+        elif isinstance(value, dict):
+            sanitized[key] = legacy_sanitize(value)
+        elif isinstance(value, list):
+            sanitized[key] = [legacy_sanitize(item) if isinstance(item, dict) else item for item in value]
+        else:
+            sanitized[key] = value
+    
+    return sanitized
+
+
+def measure(function: Callable[[Any], Any], payload: Any, number: int) -> float:
+    """Best of 5 runs, in microseconds per call."""
+    runs = timeit.repeat(lambda: function(payload), number=number, repeat=5)
+    return min(runs) / number * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PCI sanitizer micro-benchmark")
+    parser.add_argument("--number", type=int, default=50000, help="Calls per run")
+    args = parser.parse_args()
+    
+    print(f"{'payload':<12} {'legacy µs':>10} {'current µs':>11} {'speedup':>8}")
+    for name, payload in PAYLOADS.items():
+        legacy = measure(legacy_sanitize, payload, args.number)
+        current = measure(sanitize_data, payload, args.number)
+        print(f"{name:<12} {legacy:>10.2f} {current:>11.2f} {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
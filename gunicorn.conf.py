@@ -0,0 +1,51 @@
+"""
+Gunicorn configuration for multi-worker mode (values from Settings / .env).
+
+    gunicorn -c gunicorn.conf.py src.main:app
+    
+Each worker is a uvicorn event loop with its own connection pools, log
+thread and webhook queue; set CACHE_BACKEND=redis so workers share OAuth
+tokens and API key lookups. Workers are recycled after
+WEB_WORKER_MAX_REQUESTS (+ jitter) and drain in-flight requests for up to
+WEB_GRACEFUL_TIMEOUT seconds on restart.
+
+Prometheus runs in multiprocess mode: workers write their samples to
+WEB_METRICS_DIR and /metrics aggregates every worker, not only the one that
+served the scrape.
+"""
+import os
+import shutil
+from src.core.config import settings
+
+# Must be set before prometheus_client is imported (workers inherit it)
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.web_metrics_dir
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.web_workers
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Graceful recycling
+max_requests = settings.web_worker_max_requests
+max_requests_jitter = settings.web_worker_max_requests_jitter
+graceful_timeout = settings.web_graceful_timeout
+timeout = settings.web_worker_timeout
+keepalive = settings.web_keepalive
+
+# Workers import the app after fork: no event loop, pool or thread crosses processes
+preload_app = False
+
+# Request lines come from the app's structured logger
+accesslog = None
+
+
+def on_starting(server):
+    """Drop samples left by a previous run (their counters would be added again)."""
+    shutil.rmtree(settings.web_metrics_dir, ignore_errors=True)
+    os.makedirs(settings.web_metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Remove a dead worker's live gauges from the aggregation."""
+    from prometheus_client import multiprocess
+    
+    multiprocess.mark_process_dead(worker.pid)
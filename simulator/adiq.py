@@ -0,0 +1,394 @@
+"""
+Adiq simulator - Local ASGI stand-in for the Adiq e-commerce API.
+
+Serves the endpoints AdiqAdapter and the merchant onboarding use:
+- POST /auth/oauth2/v1/token
+- POST /v1/tokens/cards
+- POST /v1/vaults/cards
+- POST /v1/payments
+- GET  /v1/payments/{payment_id}
+- POST /v1/sellers
+
+Responses follow Adiq's camelCase shapes (paymentAuthorization, numberToken,
+vaultId...). Latency distributions, error/timeout/decline rates, token expiry
+and webhook callbacks to the gateway are configurable.
+
+In-process (tests, benchmarks):
+    from simulator.adiq import SimulatorConfig, create_adiq_simulator
+    http_client.set_transport(httpx.ASGITransport(app=create_adiq_simulator(SimulatorConfig())))
+    
+Standalone:
+    python -m simulator.adiq --port 9100 --latency-ms 50 200 --error-rate 0.01 \\
+        --webhook-url http://localhost:8000/v1/webhooks/adiq
+    ADIQ_BASE_URL=http://localhost:9100 (or point ADIQ_BASE_URLS at it)
+"""
+import argparse
+import asyncio
+import base64
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from uuid import uuid4
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Operation names used for latency/error configuration
+OPERATIONS = ["token", "tokenize", "vault", "payment", "get_payment", "seller"]
+
+
+@dataclass
+class LatencyDistribution:
+    """
+    Response-time distribution in seconds.
+    
+    kind:
+        fixed     - always `low`
+        uniform   - uniform between `low` and `high`
+        lognormal - median `low`, p99 around `high` (long tail)
+    """
+    kind: str = "fixed"
+    low: float = 0.0
+    high: float = 0.0
+    
+    def sample(self) -> float:
+        """Draw one latency."""
+        if self.kind == "uniform":
+            return random.uniform(self.low, self.high)
+        if self.kind == "lognormal" and 0 < self.low < self.high:
+            # sigma chosen so that exp(2.326 * sigma) = high / low (99th percentile)
+            sigma = math.log(self.high / self.low) / 2.326
+            return random.lognormvariate(math.log(self.low), sigma)
+        return self.low
+
+
+@dataclass
+class SimulatorConfig:
+    """Simulator behaviour. Rates are probabilities between 0 and 1."""
+    latency: Dict[str, LatencyDistribution] = field(default_factory=dict)
+    default_latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    error_rate: Dict[str, float] = field(default_factory=dict)
+    default_error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 30.0
+    decline_rate: float = 0.0
+    token_ttl: int = 3600
+    enforce_token_expiry: bool = True
+    webhook_url: Optional[str] = None
+    webhook_delay: float = 0.5
+    settle_delay: Optional[float] = None
+    webhook_transport: Optional[httpx.AsyncBaseTransport] = None
+    
+    def latency_for(self, operation: str) -> float:
+        return self.latency.get(operation, self.default_latency).sample()
+    
+    def error_rate_for(self, operation: str) -> float:
+        return self.error_rate.get(operation, self.default_error_rate)
+
+
+class AdiqSimulator:
+    """In-memory Adiq state and request handling."""
+    
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.tokens: Dict[str, float] = {}
+        self.card_tokens: Dict[str, Dict[str, Any]] = {}
+        self.vaults: Dict[str, Dict[str, Any]] = {}
+        self.payments: Dict[str, Dict[str, Any]] = {}
+        self.sellers: Dict[str, Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {operation: 0 for operation in OPERATIONS}
+        self.webhooks_sent: List[Dict[str, Any]] = []
+        self._webhook_tasks: Set[asyncio.Task] = set()
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+    
+    async def before_call(self, operation: str) -> Optional[JSONResponse]:
+        """Apply latency and failure injection; returns an error response or None."""
+        self.calls[operation] += 1
+        
+        if self.config.timeout_rate and random.random() < self.config.timeout_rate:
+            await asyncio.sleep(self.config.timeout_seconds)
+            return JSONResponse({"message": "Gateway Timeout"}, status_code=504)
+        
+        delay = self.config.latency_for(operation)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        if random.random() < self.config.error_rate_for(operation):
+            return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+        return None
+    
+    def check_bearer(self, request: Request) -> Optional[JSONResponse]:
+        """Reject unknown or expired access tokens with 401."""
+        authorization = request.headers.get("authorization", "")
+        token = authorization.removeprefix("Bearer ").strip()
+        expires_at = self.tokens.get(token)
+        
+        if expires_at is None or (self.config.enforce_token_expiry and time.monotonic() >= expires_at):
+            return JSONResponse({"message": "Unauthorized", "details": "invalid or expired token"}, status_code=401)
+        return None
+    
+    def issue_token(self) -> Dict[str, Any]:
+        access_token = base64.urlsafe_b64encode(uuid4().bytes).decode().rstrip("=")
+        self.tokens[access_token] = time.monotonic() + self.config.token_ttl
+        return {"accessToken": access_token, "tokenType": "Bearer", "expiresIn": self.config.token_ttl}
+    
+    def authorize_payment(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a payment record and its paymentAuthorization block."""
+        payment = body.get("payment", {})
+        card_info = body.get("cardInfo", {})
+        seller_info = body.get("sellerInfo", {})
+        card = self.card_tokens.get(card_info.get("numberToken"), {})
+        declined = random.random() < self.config.decline_rate
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        
+        payment_id = f"{int(time.time() * 1000):016d}{uuid4().int % 10 ** 26:026d}"
+        if declined:
+            status = "Declined"
+        elif payment.get("captureType", "ac") == "ac":
+            status = "Captured"
+        else:
+            status = "Authorized"
+        
+        authorization = {
+            "returnCode": "51" if declined else "00",
+            "description": "Transação negada" if declined else "Sucesso",
+            "paymentId": payment_id,
+            "authorizationCode": None if declined else f"{random.randint(0, 999999):06d}",
+            "orderNumber": seller_info.get("orderNumber"),
+            "amount": payment.get("amount"),
+            "releaseAt": now,
+            "nsu": f"{random.randint(0, 10 ** 12 - 1):012d}",
+        }
+        self.payments[payment_id] = {
+            "paymentId": payment_id,
+            "status": status,
+            "captureType": payment.get("captureType", "ac"),
+            "installments": payment.get("installments", 1),
+            "brand": card_info.get("brand"),
+            "last4": card.get("last4"),
+            "createdAt": now,
+            "paymentAuthorization": authorization,
+        }
+        return self.payments[payment_id]
+    
+    def schedule_webhooks(self, payment: Dict[str, Any]) -> None:
+        """Send status callbacks to the gateway (current status, then Settled if configured)."""
+        if not self.config.webhook_url:
+            return
+        
+        statuses = [(self.config.webhook_delay, payment["status"])]
+        if payment["status"] == "Captured" and self.config.settle_delay is not None:
+            statuses.append((self.config.settle_delay, "Settled"))
+        
+        task = asyncio.create_task(self._send_webhooks(payment["paymentId"], statuses))
+        self._webhook_tasks.add(task)
+        task.add_done_callback(self._webhook_tasks.discard)
+    
+    async def _send_webhooks(self, payment_id: str, statuses: List[Any]) -> None:
+        for delay, status in statuses:
+            await asyncio.sleep(delay)
+            payment = self.payments[payment_id]
+            payment["status"] = status
+            payload = {
+                "eventType": f"payment.{status.lower()}",
+                "paymentId": payment_id,
+                "status": status,
+                "authorizationCode": payment["paymentAuthorization"]["authorizationCode"],
+                "orderNumber": payment["paymentAuthorization"]["orderNumber"],
+                "amount": payment["paymentAuthorization"]["amount"],
+                "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            }
+            
+            try:
+                response = await self.webhook_client.post(self.config.webhook_url, json=payload)
+                logger.info(
+                    "simulator_webhook_sent",
+                    payment_id=payment_id, status=status, response=response.status_code
+                )
+            except Exception as e:
+                logger.warning("simulator_webhook_failed", payment_id=payment_id, status=status, error=str(e))
+            self.webhooks_sent.append(payload)
+    
+    @property
+    def webhook_client(self) -> httpx.AsyncClient:
+        if self._webhook_client is None:
+            self._webhook_client = httpx.AsyncClient(transport=self.config.webhook_transport, timeout=30.0)
+        return self._webhook_client
+    
+    async def drain_webhooks(self) -> None:
+        """Wait for every scheduled webhook callback."""
+        while self._webhook_tasks:
+            await asyncio.gather(*list(self._webhook_tasks), return_exceptions=True)
+    
+    async def close(self) -> None:
+        for task in self._webhook_tasks:
+            task.cancel()
+        await asyncio.gather(*list(self._webhook_tasks), return_exceptions=True)
+        if self._webhook_client is not None:
+            await self._webhook_client.aclose()
+
+
+def create_adiq_simulator(config: Optional[SimulatorConfig] = None) -> FastAPI:
+    """
+    Build the simulator ASGI app.
+    
+    Args:
+        config: Simulator behaviour (defaults: no latency, no errors, 1h tokens)
+        
+    Returns:
+        FastAPI app; its AdiqSimulator state is available as app.state.simulator
+    """
+    simulator = AdiqSimulator(config or SimulatorConfig())
+    app = FastAPI(title="Adiq Simulator", docs_url=None, redoc_url=None)
+    app.state.simulator = simulator
+    
+    @app.on_event("shutdown")
+    async def shutdown() -> None:
+        await simulator.close()
+    
+    @app.post("/auth/oauth2/v1/token")
+    async def token(request: Request):
+        error = await simulator.before_call("token")
+        if error:
+            return error
+        
+        # AdiqAdapter: Basic auth + JSON {"grantType"}; onboarding: form grant_type/client_id
+        if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+            form = await request.form()
+            if not form.get("client_id"):
+                return JSONResponse({"message": "invalid_client"}, status_code=401)
+            issued = simulator.issue_token()
+            return {**issued, "access_token": issued["accessToken"], "expires_in": issued["expiresIn"]}
+        
+        if not request.headers.get("authorization", "").startswith("Basic "):
+            return JSONResponse({"message": "invalid_client"}, status_code=401)
+        return simulator.issue_token()
+    
+    @app.post("/v1/tokens/cards")
+    async def tokenize_card(request: Request):
+        error = await simulator.before_call("tokenize") or simulator.check_bearer(request)
+        if error:
+            return error
+        
+        body = await request.json()
+        card_number = str(body.get("cardNumber", ""))
+        if not card_number.isdigit() or not 13 <= len(card_number) <= 19:
+            return JSONResponse({"message": "Invalid cardNumber"}, status_code=400)
+        
+        number_token = uuid4().hex + uuid4().hex[:8]
+        simulator.card_tokens[number_token] = {"last4": card_number[-4:]}
+        return {"numberToken": number_token}
+    
+    @app.post("/v1/vaults/cards")
+    async def create_vault(request: Request):
+        error = await simulator.before_call("vault") or simulator.check_bearer(request)
+        if error:
+            return error
+        
+        body = await request.json()
+        card = simulator.card_tokens.get(body.get("numberToken"))
+        if card is None:
+            return JSONResponse({"message": "numberToken not found"}, status_code=400)
+        
+        vault_id = str(uuid4())
+        simulator.vaults[vault_id] = {
+            "vaultId": vault_id,
+            "brand": body.get("brand"),
+            "last4": card["last4"],
+            "cardholderName": body.get("cardholderName"),
+            "verified": bool(body.get("verifyCard"))
+        }
+        return simulator.vaults[vault_id]
+    
+    @app.post("/v1/payments")
+    async def create_payment(request: Request):
+        error = await simulator.before_call("payment") or simulator.check_bearer(request)
+        if error:
+            return error
+        
+        body = await request.json()
+        if not body.get("payment", {}).get("amount") or not body.get("cardInfo", {}).get("numberToken"):
+            return JSONResponse({"message": "payment.amount and cardInfo.numberToken are required"}, status_code=400)
+        
+        payment = simulator.authorize_payment(body)
+        if payment["status"] == "Declined":
+            return JSONResponse({"paymentAuthorization": payment["paymentAuthorization"]}, status_code=422)
+        
+        simulator.schedule_webhooks(payment)
+        return {"paymentAuthorization": payment["paymentAuthorization"]}
+    
+    @app.get("/v1/payments/{payment_id}")
+    async def get_payment(payment_id: str, request: Request):
+        error = await simulator.before_call("get_payment") or simulator.check_bearer(request)
+        if error:
+            return error
+        
+        payment = simulator.payments.get(payment_id)
+        if payment is None:
+            return JSONResponse({"message": "Payment not found"}, status_code=404)
+        return payment
+    
+    @app.post("/v1/sellers")
+    async def create_seller(request: Request):
+        error = await simulator.before_call("seller") or simulator.check_bearer(request)
+        if error:
+            return error
+        
+        body = await request.json()
+        seller_id = str(uuid4())
+        simulator.sellers[seller_id] = {
+            "sellerId": seller_id,
+            "legalName": body.get("legalName"),
+            "documentNumber": body.get("documentNumber"),
+            "clientId": str(uuid4()),
+            "clientSecret": uuid4().hex,
+            "status": "Active"
+        }
+        return simulator.sellers[seller_id]
+    
+    return app
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local Adiq simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="uniform")
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=[50.0, 200.0], metavar=("LOW", "HIGH"))
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 probability per call")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Probability of a hung call")
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--decline-rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=int, default=3600, help="OAuth expiresIn (seconds)")
+    parser.add_argument("--webhook-url", default=None, help="Gateway webhook URL for status callbacks")
+    parser.add_argument("--webhook-delay", type=float, default=0.5)
+    parser.add_argument("--settle-delay", type=float, default=None, help="Also send Settled after this many seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+    
+    args = _parse_args(argv)
+    config = SimulatorConfig(
+        default_latency=LatencyDistribution(args.latency, args.latency_ms[0] / 1000, args.latency_ms[1] / 1000),
+        default_error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        decline_rate=args.decline_rate,
+        token_ttl=args.token_ttl,
+        webhook_url=args.webhook_url,
+        webhook_delay=args.webhook_delay,
+        settle_delay=args.settle_delay
+    )
+    uvicorn.run(create_adiq_simulator(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,59 @@ Handles OAuth2, tokenization, vault, and payments.
 """
 import httpx
 import base64
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from src.core.config import settings
-from src.core.logger import get_logger, sanitize_data
-from src.core.exceptions import AdiqError, AdiqAuthenticationError, AdiqPaymentError
+from src.adapters.http_client import get_http_client
+from src.adapters.resilience import adiq_resilience
+from src.adapters.token_cache import token_cache, TokenKey
+from src.core.logger import get_logger
+from src.core.metrics import ADIQ_TOKEN_REQUESTS
+from src.core.exceptions import (
+    AdiqError,
+    AdiqAuthenticationError,
+    AdiqOutcomeUnknownError,
+    AdiqPaymentError,
+    AdiqTimeoutError,
+    AdiqUnavailableError,
+)
 
 logger = get_logger(__name__)
 
+# Adiq base URLs per merchant environment
+ADIQ_BASE_URLS = {
+    "hml": "https://ecommerce-hml.adiq.io",
+    "prd": "https://ecommerce.adiq.io",
+}
+
+
+def get_adiq_base_url(environment: Optional[str]) -> str:
+    """
+    Resolve the Adiq base URL for a merchant environment.
+    
+    Args:
+        environment: "hml" or "prd" (anything else falls back to HML)
+        
+    Returns:
+        Adiq base URL
+    """
+    return ADIQ_BASE_URLS.get(environment or "hml", ADIQ_BASE_URLS["hml"])
+
+
+def get_adiq_environment(base_url: str) -> str:
+    """
+    Resolve the environment name of an Adiq base URL (metrics label).
+    
+    Args:
+        base_url: Adiq base URL
+        
+    Returns:
+        "hml", "prd" or "custom" (simulator, overrides)
+    """
+    for environment, url in ADIQ_BASE_URLS.items():
+        if base_url.rstrip("/") == url:
+            return environment
+    return "custom"
+
 
 class AdiqAdapter:
     """Adapter for Adiq Gateway API with per-merchant credentials support."""
@@ -42,14 +87,32 @@ class AdiqAdapter:
                 "Merchant deve possuir client_id, client_secret e seller_id."
             )
         
-        self.base_url = base_url or "https://ecommerce-hml.adiq.io"
+        self.base_url = base_url or ADIQ_BASE_URLS["hml"]
         self.client_id = client_id
         self.client_secret = client_secret
         self.seller_id = seller_id
         self.access_token: Optional[str] = None
-        self.token_expires_at: Optional[datetime] = None
         
-        logger.info(f"AdiqAdapter initialized - seller_id={seller_id}, base_url={self.base_url}")
+        logger.info("adiq_adapter_initialized", seller_id=seller_id, base_url=self.base_url)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared pooled HTTP client for this adapter's base URL."""
+        return get_http_client(self.base_url)
+    
+    def ensure_available(self, *operations: str) -> None:
+        """
+        Fail fast when an Adiq operation's circuit breaker is open.
+        
+        Args:
+            operations: Operation names (tokenize_card, create_payment, ...)
+            
+        Raises:
+            AdiqUnavailableError: If any of the operations is unavailable
+        """
+        environment = get_adiq_environment(self.base_url)
+        for operation in operations:
+            adiq_resilience.ensure_available(operation, environment)
     
     def _get_basic_auth(self) -> str:
         """Get Basic Auth header for OAuth."""
@@ -92,38 +155,55 @@ class AdiqAdapter:
         }
         
         try:
-            logger.info(f"tokenizing_card - brand={brand}, last4={pan[-4:]}")
+            logger.info("tokenizing_card", brand=brand, last4=pan[-4:])
+            
+            response = await self.client.post(url, json=payload, headers=headers, timeout=30.0)
+            response.raise_for_status()
+            
+            result = response.json()
+            logger.info("card_tokenized", brand=brand, last4=pan[-4:])
+            
+            return result
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers, timeout=30.0)
-                response.raise_for_status()
-                
-                result = response.json()
-                logger.info(f"card_tokenized - token={result.get('numberToken')[:10]}..., last4={pan[-4:]}")
-                
-                return result
-                
         except httpx.HTTPStatusError as e:
-            logger.error(f"tokenization_failed - status={e.response.status_code}, error={e.response.text}")
+            self._invalidate_token_on_401(e)
+            logger.error("tokenization_failed", status=e.response.status_code, error=e.response.text)
             raise AdiqError(f"Failed to tokenize card: {e.response.text}")
+        except AdiqUnavailableError:
+            raise
         except Exception as e:
-            logger.error(f"tokenization_error - error={str(e)}")
+            logger.error("tokenization_error", error=str(e))
             raise AdiqError(f"Tokenization error: {str(e)}")
     
+    @property
+    def token_key(self) -> TokenKey:
+        """Token cache key: (environment, client_id)."""
+        return (self.base_url, self.client_id)
+    
     async def _ensure_authenticated(self) -> None:
-        """Ensure we have a valid access token."""
-        if self.access_token and self.token_expires_at:
-            if datetime.utcnow() < self.token_expires_at:
-                return  # Token still valid
+        """Ensure we have a valid access token (shared process-wide cache)."""
+        self.access_token = await token_cache.get_token(self.token_key, self._request_token)
+    
+    async def authenticate(self) -> None:
+        """
+        Fetch (or reuse) the OAuth token ahead of a burst of calls, e.g. a payment batch.
         
-        await self.authenticate()
+        Raises:
+            AdiqAuthenticationError: If authentication fails
+        """
+        await self._ensure_authenticated()
+    
+    def _invalidate_token_on_401(self, error: httpx.HTTPStatusError) -> None:
+        """Drop the cached token if Adiq rejected it."""
+        if error.response.status_code == 401:
+            token_cache.invalidate(self.token_key)
     
-    async def authenticate(self) -> str:
+    async def _request_token(self) -> Tuple[str, int]:
         """
-        Authenticate with Adiq using OAuth2 client credentials.
+        Call Adiq's OAuth2 token endpoint.
         
         Returns:
-            Access token
+            Tuple of (access_token, expires_in seconds)
             
         Raises:
             AdiqAuthenticationError: If authentication fails
@@ -136,23 +216,26 @@ class AdiqAdapter:
         payload = {"grantType": "client_credentials"}
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers, timeout=30.0)
-                response.raise_for_status()
-                
-                data = response.json()
-                self.access_token = data["accessToken"]  # Adiq usa camelCase
-                expires_in = int(data.get("expiresIn", 3600))  # Adiq usa camelCase, converter para int
-                self.token_expires_at = datetime.utcnow() + timedelta(seconds=expires_in - 60)
-                
-                logger.info(f"adiq_authenticated - expires_in={expires_in}")
-                return self.access_token
-                
+            response = await self.client.post(url, json=payload, headers=headers, timeout=30.0)
+            response.raise_for_status()
+            
+            data = response.json()
+            access_token = data["accessToken"]  # Adiq usa camelCase
+            expires_in = int(data.get("expiresIn", 3600))  # Adiq usa camelCase, converter para int
+            
+            ADIQ_TOKEN_REQUESTS.labels(get_adiq_environment(self.base_url), "success").inc()
+            logger.info("adiq_authenticated", expires_in=expires_in)
+            return access_token, expires_in
+            
         except httpx.HTTPStatusError as e:
-            logger.error(f"adiq_auth_failed - status_code={e.response.status_code}, error={str(e)}")
+            ADIQ_TOKEN_REQUESTS.labels(get_adiq_environment(self.base_url), "failure").inc()
+            logger.error("adiq_auth_failed", status_code=e.response.status_code, error=str(e))
             raise AdiqAuthenticationError(f"Authentication failed: {e}")
+        except AdiqUnavailableError:
+            raise
         except Exception as e:
-            logger.error(f"adiq_auth_error - error={str(e)}")
+            ADIQ_TOKEN_REQUESTS.labels(get_adiq_environment(self.base_url), "failure").inc()
+            logger.error("adiq_auth_error", error=str(e))
             raise AdiqAuthenticationError(f"Authentication error: {e}")
     
     async def create_vault(
@@ -201,19 +284,21 @@ class AdiqAdapter:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers, timeout=30.0)
-                response.raise_for_status()
-                
-                data = response.json()
-                logger.info(f"vault_created - vault_id={data['vaultId']}, brand={data['brand']}, last4={data['last4']}")
-                return data
-                
+            response = await self.client.post(url, json=payload, headers=headers, timeout=30.0)
+            response.raise_for_status()
+            
+            data = response.json()
+            logger.info("vault_created", vault_id=data['vaultId'], brand=data['brand'], last4=data['last4'])
+            return data
+            
         except httpx.HTTPStatusError as e:
-            logger.error(f"vault_creation_failed - status_code={e.response.status_code}")
+            self._invalidate_token_on_401(e)
+            logger.error("vault_creation_failed", status_code=e.response.status_code)
             raise AdiqError(f"Vault creation failed: {e}", status_code=e.response.status_code)
+        except AdiqUnavailableError:
+            raise
         except Exception as e:
-            logger.error(f"vault_creation_error - error={str(e)}")
+            logger.error("vault_creation_error", error=str(e))
             raise AdiqError(f"Vault creation error: {e}")
     
     async def create_payment(
@@ -255,6 +340,8 @@ class AdiqAdapter:
             
         Raises:
             AdiqPaymentError: If payment fails
+            AdiqOutcomeUnknownError: If the request was sent but no usable answer came back
+                (timeout, dropped connection, 5xx): Adiq may have approved it
         """
         await self._ensure_authenticated()
         
@@ -294,7 +381,7 @@ class AdiqAdapter:
         # Add seller ID if merchant has one (subcredenciadora model)
         if self.seller_id:
             payload["sellerInfo"]["id"] = self.seller_id
-            logger.info(f"payment_with_seller_id - seller_id={self.seller_id}")
+            logger.info("payment_with_seller_id", seller_id=self.seller_id)
         
         if customer:
             payload["customer"] = customer
@@ -303,24 +390,45 @@ class AdiqAdapter:
             payload["deviceInfo"] = device_info
         
         try:
-            # Sanitize payload for logging (remove sensitive data)
-            safe_payload = sanitize_data(payload)
-            logger.info(f"creating_payment - order_number={order_number}, amount={amount}, installments={installments}")
+            logger.info("creating_payment", order_number=order_number, amount=amount, installments=installments)
+            
+            response = await self.client.post(url, json=payload, headers=headers, timeout=90.0)  # Aumentado para 90s
+            response.raise_for_status()
+            
+            data = response.json()
+            logger.info(
+                "payment_created",
+                payment_id=data.get('paymentId'),
+                authorization_code=data.get('authorizationCode'),
+                status=data.get('status')
+            )
+            return data
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers, timeout=90.0)  # Aumentado para 90s
-                response.raise_for_status()
-                
-                data = response.json()
-                logger.info(f"payment_created - payment_id={data.get('paymentId')}, authorization_code={data.get('authorizationCode')}, status={data.get('status')}")
-                return data
-                
         except httpx.HTTPStatusError as e:
+            self._invalidate_token_on_401(e)
             error_detail = e.response.text
-            logger.error(f"payment_failed - status_code={e.response.status_code}, error={error_detail}")
+            if e.response.status_code >= 500:
+                # Gateway/server error: the charge may have gone through behind it
+                logger.error("payment_outcome_unknown", order_number=order_number, status_code=e.response.status_code)
+                raise AdiqOutcomeUnknownError("create_payment", f"HTTP {e.response.status_code}")
+            logger.error("payment_failed", status_code=e.response.status_code, error=error_detail)
             raise AdiqPaymentError(f"Payment failed: {error_detail}")
+        except AdiqUnavailableError:
+            raise
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # Never reached Adiq: nothing was charged
+            logger.error("payment_error", error=str(e))
+            raise AdiqPaymentError(f"Payment error: {e}")
+        except httpx.TimeoutException as e:
+            # Adiq may still approve the charge: the caller must not treat it as declined
+            logger.error("payment_timeout", order_number=order_number, error=str(e))
+            raise AdiqTimeoutError("create_payment")
+        except httpx.TransportError as e:
+            # Sent, then the connection broke (ReadError, RemoteProtocolError, ...)
+            logger.error("payment_outcome_unknown", order_number=order_number, error=str(e))
+            raise AdiqOutcomeUnknownError("create_payment", type(e).__name__)
         except Exception as e:
-            logger.error(f"payment_error - error={str(e)}")
+            logger.error("payment_error", error=str(e))
             raise AdiqPaymentError(f"Payment error: {e}")
     
     async def get_payment(self, payment_id: str) -> Dict[str, Any]:
@@ -344,15 +452,17 @@ class AdiqAdapter:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, timeout=30.0)
-                response.raise_for_status()
-                
-                return response.json()
-                
+            response = await self.client.get(url, headers=headers, timeout=30.0)
+            response.raise_for_status()
+            
+            return response.json()
+            
         except httpx.HTTPStatusError as e:
-            logger.error(f"get_payment_failed - payment_id={payment_id}, status_code={e.response.status_code}")
+            self._invalidate_token_on_401(e)
+            logger.error("get_payment_failed", payment_id=payment_id, status_code=e.response.status_code)
             raise AdiqError(f"Get payment failed: {e}", status_code=e.response.status_code)
+        except AdiqUnavailableError:
+            raise
         except Exception as e:
-            logger.error(f"get_payment_error - payment_id={payment_id}, error={str(e)}")
+            logger.error("get_payment_error", payment_id=payment_id, error=str(e))
             raise AdiqError(f"Get payment error: {e}")
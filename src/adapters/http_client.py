@@ -0,0 +1,82 @@
+"""
+Shared HTTP connection pools for outbound Adiq calls.
+One pooled client per base URL, opened lazily and closed on app shutdown.
+"""
+from typing import Dict, Optional
+import httpx
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.core.metrics import InstrumentedTransport, adiq_observer, adiq_span_namer
+from src.core.tracing import TracingTransport
+from src.adapters.resilience import ResilientTransport
+
+logger = get_logger(__name__)
+
+# Pooled clients keyed by Adiq base URL (hml / prd)
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# Optional transport override (used by tests and offline benchmarks)
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def _build_client(base_url: str) -> httpx.AsyncClient:
+    """Create a pooled client with keep-alive, optional HTTP/2, breakers, call metrics and spans."""
+    from src.adapters.adiq import get_adiq_environment  # adiq imports this module
+    
+    limits = httpx.Limits(
+        max_connections=settings.adiq_http_max_connections,
+        max_keepalive_connections=settings.adiq_http_max_keepalive,
+        keepalive_expiry=settings.adiq_http_keepalive_expiry,
+    )
+    transport = _transport or httpx.AsyncHTTPTransport(http2=settings.adiq_http2, limits=limits)
+    environment = get_adiq_environment(base_url)
+    logger.info(
+        "adiq_http_pool_created",
+        base_url=base_url, max_connections=settings.adiq_http_max_connections, http2=settings.adiq_http2
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        transport=InstrumentedTransport(
+            TracingTransport(ResilientTransport(transport, environment), adiq_span_namer(environment)),
+            adiq_observer(environment)
+        ),
+        timeout=settings.adiq_http_timeout,
+    )
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Get the shared pooled client for an Adiq base URL.
+    
+    Args:
+        base_url: Adiq base URL (e.g. https://ecommerce.adiq.io)
+        
+    Returns:
+        Process-wide httpx.AsyncClient for that base URL
+    """
+    client = _clients.get(base_url)
+    if client is None or client.is_closed:
+        client = _build_client(base_url)
+        _clients[base_url] = client
+    return client
+
+
+def set_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """
+    Route all pooled clients through a custom transport.
+    Existing clients are dropped so the next call picks up the new transport.
+    
+    Args:
+        transport: httpx transport (e.g. ASGITransport) or None for the network
+    """
+    global _transport
+    _transport = transport
+    _clients.clear()
+
+
+async def close_http_clients() -> None:
+    """Close every pooled client. Called on application shutdown."""
+    for base_url, client in list(_clients.items()):
+        await client.aclose()
+        logger.info("adiq_http_pool_closed", base_url=base_url)
+    _clients.clear()
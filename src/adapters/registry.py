@@ -0,0 +1,134 @@
+"""
+Bounded registry of ready-made AdiqAdapter instances.
+Adapters are keyed by merchant_id and rebuilt when the merchant's Adiq
+credentials fingerprint changes. Least recently used entries are evicted.
+The registry is per process: MerchantService compares an entry's fingerprint
+with the one published in the shared cache, so other workers notice a change.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from src.adapters.adiq import AdiqAdapter, get_adiq_base_url
+from src.core.config import settings
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def credentials_fingerprint(merchant: Dict[str, Any]) -> str:
+    """
+    Fingerprint a merchant's Adiq credentials without keeping them in clear text.
+    
+    Args:
+        merchant: Merchant row with adiq_* columns
+        
+    Returns:
+        SHA-256 hex digest of (client_id, client_secret, seller_id, environment)
+    """
+    parts = (
+        merchant.get("adiq_client_id") or "",
+        merchant.get("adiq_client_secret") or "",
+        merchant.get("adiq_seller_id") or "",
+        merchant.get("adiq_environment") or "hml",
+    )
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class AdiqAdapterRegistry:
+    """LRU registry of AdiqAdapter instances per merchant."""
+    
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size: Maximum number of merchants kept in memory
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, AdiqAdapter]]" = OrderedDict()
+    
+    def get(self, merchant_id: str) -> Optional[AdiqAdapter]:
+        """
+        Get the cached adapter for a merchant.
+        
+        Args:
+            merchant_id: Merchant ID
+            
+        Returns:
+            Cached adapter, or None if the merchant is not registered
+        """
+        entry = self._entries.get(merchant_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(merchant_id)
+        return entry[1]
+    
+    def fingerprint(self, merchant_id: str) -> Optional[str]:
+        """
+        Credentials fingerprint of a merchant's cached adapter.
+        
+        Args:
+            merchant_id: Merchant ID
+            
+        Returns:
+            Fingerprint, or None if the merchant is not registered
+        """
+        entry = self._entries.get(merchant_id)
+        return entry[0] if entry is not None else None
+    
+    def put(self, merchant_id: str, merchant: Dict[str, Any]) -> AdiqAdapter:
+        """
+        Register (or refresh) the adapter for a merchant row.
+        The existing adapter is kept if the credentials fingerprint is unchanged.
+        
+        Args:
+            merchant_id: Merchant ID
+            merchant: Merchant row with adiq_* columns
+            
+        Returns:
+            Adapter for the merchant
+            
+        Raises:
+            ValueError: If the merchant has no Adiq credentials
+        """
+        fingerprint = credentials_fingerprint(merchant)
+        entry = self._entries.get(merchant_id)
+        
+        if entry is not None and entry[0] == fingerprint:
+            self._entries.move_to_end(merchant_id)
+            return entry[1]
+        
+        adapter = AdiqAdapter(
+            client_id=merchant.get("adiq_client_id"),
+            client_secret=merchant.get("adiq_client_secret"),
+            seller_id=merchant.get("adiq_seller_id"),
+            base_url=get_adiq_base_url(merchant.get("adiq_environment"))
+        )
+        
+        self._entries[merchant_id] = (fingerprint, adapter)
+        self._entries.move_to_end(merchant_id)
+        
+        while len(self._entries) > self.max_size:
+            evicted_id, _ = self._entries.popitem(last=False)
+            logger.info("adiq_adapter_evicted", merchant_id=evicted_id)
+        
+        return adapter
+    
+    def invalidate(self, merchant_id: str) -> None:
+        """
+        Drop a merchant's adapter (call after its Adiq credentials change).
+        
+        Args:
+            merchant_id: Merchant ID
+        """
+        if self._entries.pop(merchant_id, None) is not None:
+            logger.info("adiq_adapter_invalidated", merchant_id=merchant_id)
+    
+    def clear(self) -> None:
+        """Drop every cached adapter."""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global adapter registry
+adapter_registry = AdiqAdapterRegistry(max_size=settings.adiq_adapter_registry_size)
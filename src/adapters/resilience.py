@@ -0,0 +1,283 @@
+"""
+Circuit breakers and adaptive timeouts for Adiq calls.
+
+Both are kept per (operation, environment), e.g. ("create_payment", "prd"):
+
+- CircuitBreaker: opens after ADIQ_BREAKER_FAILURE_THRESHOLD consecutive
+  failures (transport errors, timeouts, 429/5xx). While open, calls fail fast
+  with AdiqUnavailableError; after ADIQ_BREAKER_RESET_TIMEOUT one probe call
+  is let through (half-open) and its outcome closes or re-opens the breaker.
+- AdaptiveTimeout: read timeout = observed latency percentile x multiplier,
+  never below a floor nor above the timeout the call site passes (hard cap).
+  create_payment is exempt: it is not idempotent, so it keeps its own timeout.
+
+ResilientTransport applies both to every request of the pooled Adiq clients.
+"""
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import httpx
+from src.core.config import settings
+from src.core.exceptions import AdiqUnavailableError
+from src.core.logger import get_logger
+from src.core.metrics import ADIQ_CIRCUIT_REJECTIONS, ADIQ_CIRCUIT_STATE, adiq_operation
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values per state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Acquirer-side failures; other 4xx (declines, validation) are answers, not outages
+FAILURE_STATUS_CODES = {429}
+
+# Not idempotent: cutting a slow charge short leaves its outcome unknown, keep the call site's timeout
+FIXED_TIMEOUT_OPERATIONS = {"create_payment"}
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing."""
+    
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int = 1):
+        """
+        Args:
+            name: Label used in logs and metrics ("operation:environment")
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds open before a probe is allowed
+            half_open_max_calls: Concurrent probe calls while half-open
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probes = 0
+    
+    @property
+    def state(self) -> str:
+        """Current state (an open breaker turns half-open once reset_timeout elapsed)."""
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+            self._probes = 0
+        return self._state
+    
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 if calls are allowed)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+    
+    def allow(self) -> bool:
+        """
+        Reserve a call.
+        
+        Returns:
+            True if the call may proceed (a half-open probe slot is taken)
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        return False
+    
+    def release(self) -> None:
+        """Give back a probe slot for a call that ended without an outcome (e.g. cancelled)."""
+        if self._state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+    
+    def record_success(self) -> None:
+        self.failures = 0
+        if self._state != CLOSED:
+            logger.info("adiq_circuit_closed", breaker=self.name)
+            self._set_state(CLOSED)
+    
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self.failures >= self.failure_threshold):
+            logger.warning("adiq_circuit_opened", breaker=self.name, failures=self.failures)
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+    
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        ADIQ_CIRCUIT_STATE.labels(*self.name.split(":", 1)).set(STATE_VALUES[state])
+
+
+class AdaptiveTimeout:
+    """Read timeout derived from a sliding window of successful call latencies."""
+    
+    def __init__(
+        self,
+        percentile: float,
+        multiplier: float,
+        floor: float,
+        min_samples: int,
+        window: int
+    ):
+        """
+        Args:
+            percentile: Latency percentile tracked (e.g. 0.99)
+            multiplier: Timeout = percentile latency x multiplier
+            floor: Lowest timeout ever applied (seconds)
+            min_samples: Samples needed before adapting (the cap is used until then)
+            window: Number of recent latencies kept
+        """
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._value: Optional[float] = None
+        self._since_update = 0
+    
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a successful call."""
+        self._samples.append(seconds)
+        self._since_update += 1
+        # Re-sorting the window on every call is wasteful: refresh every 20 samples
+        if len(self._samples) >= self.min_samples and (self._value is None or self._since_update >= 20):
+            ordered = sorted(self._samples)
+            index = min(int(math.ceil(self.percentile * len(ordered))) - 1, len(ordered) - 1)
+            self._value = max(ordered[index] * self.multiplier, self.floor)
+            self._since_update = 0
+    
+    def current(self, cap: float) -> float:
+        """
+        Timeout to apply.
+        
+        Args:
+            cap: Hard cap (the timeout requested by the call site)
+            
+        Returns:
+            Adaptive timeout, or the cap while there are too few samples
+        """
+        if self._value is None:
+            return cap
+        return min(self._value, cap)
+
+
+class AdiqResilience:
+    """Breakers and adaptive timeouts per (operation, environment)."""
+    
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._timeouts: Dict[Tuple[str, str], AdaptiveTimeout] = {}
+    
+    def breaker(self, operation: str, environment: str) -> CircuitBreaker:
+        key = (operation, environment)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                f"{operation}:{environment}",
+                failure_threshold=settings.adiq_breaker_failure_threshold,
+                reset_timeout=settings.adiq_breaker_reset_timeout,
+                half_open_max_calls=settings.adiq_breaker_half_open_calls
+            )
+            self._breakers[key] = breaker
+        return breaker
+    
+    def timeout(self, operation: str, environment: str) -> AdaptiveTimeout:
+        key = (operation, environment)
+        timeout = self._timeouts.get(key)
+        if timeout is None:
+            timeout = AdaptiveTimeout(
+                percentile=settings.adiq_timeout_percentile,
+                multiplier=settings.adiq_timeout_multiplier,
+                floor=settings.adiq_timeout_floor,
+                min_samples=settings.adiq_timeout_min_samples,
+                window=settings.adiq_timeout_window
+            )
+            self._timeouts[key] = timeout
+        return timeout
+    
+    def ensure_available(self, operation: str, environment: str) -> None:
+        """
+        Fail fast before starting work that needs an operation (no probe slot is used).
+        
+        Raises:
+            AdiqUnavailableError: If the operation's breaker is open
+        """
+        breaker = self._breakers.get((operation, environment))
+        if breaker is not None and breaker.state == OPEN:
+            ADIQ_CIRCUIT_REJECTIONS.labels(operation, environment).inc()
+            raise AdiqUnavailableError(operation, environment, breaker.retry_after())
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker states and current timeouts, for health checks."""
+        return {
+            f"{operation}:{environment}": {
+                "state": breaker.state,
+                "consecutive_failures": breaker.failures,
+                "retry_after": round(breaker.retry_after(), 1),
+                "adaptive_timeout": self._timeouts[(operation, environment)]._value
+                if (operation, environment) in self._timeouts else None
+            }
+            for (operation, environment), breaker in self._breakers.items()
+        }
+    
+    def reset(self) -> None:
+        """Forget every breaker and latency window."""
+        self._breakers.clear()
+        self._timeouts.clear()
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper applying breakers and adaptive timeouts to Adiq calls."""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, environment: str):
+        """
+        Args:
+            transport: Transport doing the actual I/O
+            environment: Adiq environment of the pooled client (hml, prd, custom)
+        """
+        self._transport = transport
+        self._environment = environment
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        operation = adiq_operation(request.method, request.url.path)
+        breaker = adiq_resilience.breaker(operation, self._environment)
+        
+        if not breaker.allow():
+            ADIQ_CIRCUIT_REJECTIONS.labels(operation, self._environment).inc()
+            raise AdiqUnavailableError(operation, self._environment, breaker.retry_after())
+        
+        # The call site's read timeout is the hard cap
+        adaptive = operation not in FIXED_TIMEOUT_OPERATIONS
+        if adaptive:
+            timeouts = dict(request.extensions.get("timeout", {}))
+            cap = timeouts.get("read") or settings.adiq_http_timeout
+            timeouts["read"] = adiq_resilience.timeout(operation, self._environment).current(cap)
+            request.extensions["timeout"] = timeouts
+        
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        
+        if response.status_code >= 500 or response.status_code in FAILURE_STATUS_CODES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            if adaptive:
+                adiq_resilience.timeout(operation, self._environment).observe(time.perf_counter() - start)
+        return response
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+# Global registry used by the pooled Adiq clients
+adiq_resilience = AdiqResilience()
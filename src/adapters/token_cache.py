@@ -0,0 +1,227 @@
+"""
+Process-wide OAuth token cache for Adiq credentials.
+Tokens are shared by every adapter using the same (environment, client_id),
+refreshed ahead of expiry, and fetched by a single in-flight call per key.
+
+With a shared cache backend (CACHE_BACKEND=redis) tokens are also shared
+across worker processes: a worker missing a token first reads the backend,
+and only the worker holding the per-key lock calls Adiq; the others wait for
+its result.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from src.core.cache import MISSING
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.core.shared_cache import CacheBackend, shared_cache
+
+logger = get_logger(__name__)
+
+# (environment, client_id)
+TokenKey = Tuple[str, str]
+
+# Fetcher returns (access_token, expires_in_seconds)
+TokenFetcher = Callable[[], Awaitable[Tuple[str, int]]]
+
+
+@dataclass
+class CachedToken:
+    """Access token with monotonic expiry bookkeeping."""
+    access_token: str
+    expires_at: float
+    refresh_at: float
+
+
+class AdiqTokenCache:
+    """
+    OAuth token cache with proactive refresh and single-flight fetches.
+    
+    - Fresh token: returned from memory, no I/O.
+    - Inside the refresh window: current token is returned and one background
+      refresh is started.
+    - Expired (or about to): callers wait on a single shared refresh call.
+    """
+    
+    # Interval between checks while another worker refreshes a token
+    poll_interval = 0.05
+    
+    def __init__(
+        self,
+        refresh_margin: float,
+        expiry_margin: float,
+        backend: Optional[CacheBackend] = None,
+        lock_ttl: float = 10.0
+    ):
+        """
+        Args:
+            refresh_margin: Seconds before expiry to start a background refresh
+            expiry_margin: Seconds before expiry after which the token is unusable
+            backend: Cache shared with other workers (ignored unless backend.shared)
+            lock_ttl: Max seconds to wait for another worker's refresh
+        """
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self.backend = backend if backend is not None and backend.shared else None
+        self.lock_ttl = lock_ttl
+        self._tokens: Dict[TokenKey, CachedToken] = {}
+        self._inflight: Dict[TokenKey, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+    
+    async def get_token(self, key: TokenKey, fetch: TokenFetcher) -> str:
+        """
+        Get a valid access token for a credential pair.
+        
+        Args:
+            key: (environment, client_id)
+            fetch: Coroutine factory that calls Adiq's token endpoint
+            
+        Returns:
+            Access token
+            
+        Raises:
+            AdiqAuthenticationError: If the refresh call fails
+        """
+        now = time.monotonic()
+        cached = self._tokens.get(key)
+        
+        if cached and now < cached.expires_at:
+            if now >= cached.refresh_at:
+                self._start_refresh(key, fetch)
+            return cached.access_token
+        
+        return await asyncio.shield(self._start_refresh(key, fetch))
+    
+    def invalidate(self, key: TokenKey) -> None:
+        """Drop a cached token (e.g. after Adiq rejects it with 401), also from the shared backend."""
+        self._tokens.pop(key, None)
+        if self.backend is not None:
+            task = asyncio.create_task(self._shared_call(self.backend.delete(_shared_key(key))))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+    
+    def clear(self) -> None:
+        """Drop every cached token."""
+        self._tokens.clear()
+    
+    def peek(self, key: TokenKey) -> Optional[CachedToken]:
+        """Return the cached token entry without refreshing."""
+        return self._tokens.get(key)
+    
+    def _start_refresh(self, key: TokenKey, fetch: TokenFetcher) -> asyncio.Task:
+        """Return the in-flight refresh for a key, starting one if needed."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, fetch))
+            task.add_done_callback(_log_refresh_failure)
+            self._inflight[key] = task
+        return task
+    
+    async def _refresh(self, key: TokenKey, fetch: TokenFetcher) -> str:
+        """Fetch a new token and store it."""
+        try:
+            if self.backend is not None:
+                return await self._refresh_shared(key, fetch)
+            return (await self._fetch(key, fetch)).access_token
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def _fetch(self, key: TokenKey, fetch: TokenFetcher) -> CachedToken:
+        """Call Adiq's token endpoint and store the token locally."""
+        access_token, expires_in = await fetch()
+        now = time.monotonic()
+        expires_at = now + max(expires_in - self.expiry_margin, 0)
+        refresh_at = max(expires_at - self.refresh_margin, now)
+        cached = CachedToken(access_token, expires_at, refresh_at)
+        self._tokens[key] = cached
+        logger.info("adiq_token_refreshed", environment=key[0], expires_in=expires_in)
+        return cached
+    
+    async def _refresh_shared(self, key: TokenKey, fetch: TokenFetcher) -> str:
+        """Refresh through the shared backend: one worker calls Adiq, the others reuse its token."""
+        shared_key = _shared_key(key)
+        
+        # Another worker may already hold a fresh token
+        current = await self._load_shared(key, shared_key)
+        if current is not None and time.monotonic() < current.refresh_at:
+            return current.access_token
+        
+        lock_key = f"{shared_key}:lock"
+        if await self._shared_call(self.backend.add(lock_key, os.getpid(), ttl=self.lock_ttl), default=True):
+            try:
+                cached = await self._fetch(key, fetch)
+                await self._store_shared(shared_key, cached)
+                return cached.access_token
+            finally:
+                await self._shared_call(self.backend.delete(lock_key))
+        
+        # Another worker is refreshing: keep using a still-valid token meanwhile
+        if current is not None:
+            return current.access_token
+        
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            current = await self._load_shared(key, shared_key)
+            if current is not None:
+                return current.access_token
+        
+        # Lock holder is gone or stuck: fetch ourselves
+        return (await self._fetch(key, fetch)).access_token
+    
+    async def _load_shared(self, key: TokenKey, shared_key: str) -> Optional[CachedToken]:
+        """Read a token stored by any worker; a valid one is copied to the local cache."""
+        entry = await self._shared_call(self.backend.get(shared_key), default=MISSING)
+        if entry is MISSING or entry is None:
+            return None
+        
+        # Stored with wall-clock times; local entries use the monotonic clock
+        offset = time.monotonic() - time.time()
+        cached = CachedToken(entry["access_token"], entry["expires_at"] + offset, entry["refresh_at"] + offset)
+        if time.monotonic() >= cached.expires_at:
+            return None
+        
+        self._tokens[key] = cached
+        return cached
+    
+    async def _store_shared(self, shared_key: str, cached: CachedToken) -> None:
+        """Publish a token to the other workers."""
+        offset = time.time() - time.monotonic()
+        ttl = cached.expires_at - time.monotonic()
+        if ttl > 0:
+            await self._shared_call(self.backend.set(shared_key, {
+                "access_token": cached.access_token,
+                "expires_at": cached.expires_at + offset,
+                "refresh_at": cached.refresh_at + offset
+            }, ttl=ttl))
+    
+    async def _shared_call(self, call: Awaitable, default: Any = None) -> Any:
+        """Await a backend call; if the backend is down, fall back to local behaviour."""
+        try:
+            return await call
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+            return default
+
+
+def _shared_key(key: TokenKey) -> str:
+    """Backend key for a token ((base URL, client_id) hashed)."""
+    return "adiq_token:" + hashlib.sha256("\x1f".join(key).encode()).hexdigest()
+
+
+def _log_refresh_failure(task: asyncio.Task) -> None:
+    """Log failed refreshes so background refresh errors are never silent."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("adiq_token_refresh_failed", error=str(task.exception()))
+
+
+# Global token cache
+token_cache = AdiqTokenCache(
+    refresh_margin=settings.adiq_token_refresh_margin,
+    expiry_margin=settings.adiq_token_expiry_margin,
+    backend=shared_cache,
+    lock_ttl=settings.cache_lock_ttl,
+)
@@ -0,0 +1,85 @@
+"""
+Admin endpoints (operations only).
+
+Disabled unless ADMIN_API_KEY is set; callers send it in the X-Admin-Key header.
+"""
+import hmac
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from src.api.dependencies import evict_merchant_auth
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.core.tracing import ring_buffer
+from src.db.client import db
+from src.services.reconciliation_service import payment_reconciler
+
+logger = get_logger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["admin"], include_in_schema=False)
+
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)) -> None:
+    """
+    Validate the admin key.
+    
+    Raises:
+        HTTPException: 404 if admin endpoints are disabled, 401 if the key is wrong
+    """
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, settings.admin_api_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin key")
+
+
+@router.get("/traces", dependencies=[Depends(require_admin)])
+async def list_traces(limit: int = Query(20, ge=1, le=200)):
+    """
+    Most recent traces from the in-process ring buffer, newest first.
+    
+    - **limit**: Max traces
+    """
+    return {"traces": ring_buffer.list_traces(limit)}
+
+
+@router.get("/traces/{trace_id}", dependencies=[Depends(require_admin)])
+async def get_trace(trace_id: str):
+    """
+    Spans of one trace ordered by start time (waterfall).
+    
+    - **trace_id**: Trace ID (also returned in the X-Trace-Id response header)
+    """
+    spans = ring_buffer.get_trace(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": spans}
+
+
+@router.post("/reconciliation/run", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def run_reconciliation():
+    """
+    Start a reconciliation of stale transactions/invoices now.
+    Progress: GET /health/reconciler.
+    """
+    if not payment_reconciler.trigger():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Reconciliation already running")
+    return {"started": True}
+
+
+@router.post("/merchants/{merchant_id}/deactivate", dependencies=[Depends(require_admin)])
+async def deactivate_merchant(merchant_id: UUID):
+    """
+    Deactivate a merchant: its API key is rejected (403) from now on.
+    Cached lookups are evicted here and in the shared cache; other workers'
+    in-process entries expire within AUTH_CACHE_TTL.
+    
+    - **merchant_id**: Merchant UUID
+    """
+    result = await db.table("merchants").update({"is_active": False}).eq("id", str(merchant_id)).execute()
+    if not result.data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merchant not found")
+    
+    await evict_merchant_auth(merchant_id)
+    logger.info("merchant_deactivated", merchant_id=merchant_id)
+    return {"merchant_id": str(merchant_id), "is_active": False}
@@ -1,16 +1,112 @@
 """
 FastAPI dependencies for authentication and validation.
 """
-from typing import Optional
+from typing import Optional, Tuple
 from uuid import UUID
 from fastapi import Header, HTTPException, status
 from src.core.config import settings
 from src.core.security import hash_api_key
+from src.core.cache import TTLCache, MISSING
 from src.core.logger import get_logger
-from src.db.client import supabase
+from src.core.shared_cache import shared_cache
+from src.db.client import db
 
 logger = get_logger(__name__)
 
+# API key hash -> (merchant_id, is_active), or None for unknown keys
+_api_key_cache = TTLCache(max_size=settings.auth_cache_size, ttl=settings.auth_cache_ttl)
+
+
+def _auth_index_key(merchant_id: str) -> str:
+    """Shared cache key listing the API key hashes cached for a merchant."""
+    return f"auth_keys:{merchant_id}"
+
+
+async def evict_merchant_auth(merchant_id: UUID) -> int:
+    """
+    Evict cached API key lookups for a merchant (call after deactivation).
+    This worker's entries and the shared backend's are dropped at once; other
+    workers' in-process entries still live up to AUTH_CACHE_TTL.
+    
+    Args:
+        merchant_id: Merchant ID
+        
+    Returns:
+        Number of evicted entries in this worker
+    """
+    merchant_id = str(merchant_id)
+    evicted = _api_key_cache.delete_where(
+        lambda _, cached: cached is not None and cached[0] == merchant_id
+    )
+    
+    if shared_cache.shared:
+        try:
+            hashes = await shared_cache.get(_auth_index_key(merchant_id))
+            for api_key_hash in ([] if hashes is MISSING else hashes):
+                await shared_cache.delete(f"auth:{api_key_hash}")
+            await shared_cache.delete(_auth_index_key(merchant_id))
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+    
+    logger.info("merchant_auth_evicted", merchant_id=merchant_id, evicted=evicted)
+    return evicted
+
+
+async def _index_api_key(merchant_id: str, api_key_hash: str) -> None:
+    """Record a merchant's cached API key hash so evict_merchant_auth can drop its shared entry."""
+    index_key = _auth_index_key(merchant_id)
+    hashes = await shared_cache.get(index_key)
+    hashes = [] if hashes is MISSING else hashes
+    if api_key_hash not in hashes:
+        hashes.append(api_key_hash)
+    # Refreshed with every entry it lists, so it outlives them
+    await shared_cache.set(index_key, hashes, ttl=settings.auth_cache_ttl)
+
+
+async def _lookup_api_key(api_key_hash: str) -> Optional[Tuple[str, bool]]:
+    """
+    Resolve an API key hash to (merchant_id, is_active), using the TTL cache.
+    Unknown keys are cached for a shorter time to absorb brute-force traffic.
+    On a local miss the shared backend (other workers' lookups) is tried
+    before the database.
+    """
+    cached = _api_key_cache.get(api_key_hash)
+    if cached is not MISSING:
+        return cached
+    
+    shared_key = f"auth:{api_key_hash}"
+    if shared_cache.shared:
+        try:
+            shared = await shared_cache.get(shared_key)
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+            shared = MISSING
+        if shared is not MISSING:
+            entry = tuple(shared) if shared is not None else None
+            _api_key_cache.set(api_key_hash, entry, ttl=settings.auth_cache_negative_ttl if entry is None else None)
+            return entry
+    
+    result = await db.table("merchants")\
+        .select("id, is_active")\
+        .eq("api_key_hash", api_key_hash)\
+        .execute()
+    
+    if not result.data:
+        entry, ttl = None, settings.auth_cache_negative_ttl
+    else:
+        merchant = result.data[0]
+        entry, ttl = (merchant["id"], bool(merchant["is_active"])), settings.auth_cache_ttl
+    
+    _api_key_cache.set(api_key_hash, entry, ttl=ttl)
+    if shared_cache.shared:
+        try:
+            if entry is not None:
+                await _index_api_key(entry[0], api_key_hash)
+            await shared_cache.set(shared_key, entry, ttl=ttl)
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+    return entry
+
 
 async def get_current_merchant(
     x_api_key: Optional[str] = Header(None, alias=settings.api_key_header)
@@ -40,36 +136,32 @@ async def get_current_merchant(
     
     # Look up merchant by API key hash
     try:
-        result = supabase.table("merchants")\
-            .select("id, is_active")\
-            .eq("api_key_hash", api_key_hash)\
-            .execute()
+        merchant = await _lookup_api_key(api_key_hash)
         
-        if not result.data:
-            logger.warning(f"invalid_api_key - key_hash={api_key_hash[:10]}")
+        if merchant is None:
+            logger.warning("invalid_api_key", key_hash=api_key_hash[:10])
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid API key"
             )
         
-        merchant = result.data[0]
+        merchant_id, is_active = merchant
         
-        if not merchant["is_active"]:
-            logger.warning(f"inactive_merchant - merchant_id={merchant['id']}")
+        if not is_active:
+            logger.warning("inactive_merchant", merchant_id=merchant_id)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Merchant account is inactive"
             )
         
-        merchant_id = UUID(merchant["id"])
-        logger.info(f"merchant_authenticated - merchant_id={str(merchant_id)}")
+        logger.info("merchant_authenticated", merchant_id=merchant_id)
         
-        return merchant_id
+        return UUID(merchant_id)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"auth_error - error={str(e)}")
+        logger.error("auth_error", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication error"
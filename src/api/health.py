@@ -1,9 +1,13 @@
 """
 Health check endpoint.
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from datetime import datetime
+from src.adapters.resilience import adiq_resilience
 from src.core.config import settings
+from src.core.metrics import render_metrics
+from src.services.reconciliation_service import payment_reconciler
+from src.services.webhook_queue import webhook_queue
 
 router = APIRouter(tags=["health"])
 
@@ -24,6 +28,43 @@ async def health_check():
     }
 
 
+@router.get("/health/webhooks")
+async def webhook_queue_health():
+    """
+    Webhook queue back-pressure metrics.
+    
+    Returns queue depth, in-flight events, processed/failed counters and lag.
+    """
+    return webhook_queue.stats()
+
+
+@router.get("/health/adiq")
+async def adiq_health():
+    """
+    Adiq circuit breakers and adaptive timeouts.
+    
+    Returns state, consecutive failures, retry_after and current timeout per operation:environment.
+    """
+    return adiq_resilience.snapshot()
+
+
+@router.get("/health/reconciler")
+async def reconciler_health():
+    """
+    Stale payment reconciler progress.
+    
+    Returns whether it runs and the counters of the current or last run.
+    """
+    return await payment_reconciler.stats()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (text exposition format)."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @router.get("/")
 async def root():
     """Root endpoint - redirects to docs."""
@@ -0,0 +1,34 @@
+"""
+Fast response serialization (orjson).
+
+ORJSONResponse is the app's default response class. Routes returning models
+built from trusted data (our own DB rows, see BaseSchema.from_row) wrap them
+in trusted_response: FastAPI then skips validating and re-serializing them
+against response_model, which still documents the route.
+"""
+from typing import Any, Dict, Optional
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def trusted_response(
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> ORJSONResponse:
+    """
+    Serialize an already valid response model (or plain JSON data) with orjson.
+    
+    Args:
+        content: Response model, or JSON-compatible data
+        status_code: HTTP status code
+        headers: Extra response headers
+        
+    Returns:
+        ORJSONResponse
+    """
+    if isinstance(content, BaseModel):
+        # Python mode: orjson writes UUID/datetime natively; constructed models
+        # may hold DB strings in those fields, so type warnings are off
+        content = content.model_dump(warnings=False)
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
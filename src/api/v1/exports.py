@@ -0,0 +1,91 @@
+"""
+Export API endpoints - streamed NDJSON/CSV downloads.
+"""
+from datetime import datetime
+from typing import Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from src.api.dependencies import get_current_merchant
+from src.core.logger import get_logger
+from src.services.export_service import EXPORTS, ExportService, csv_chunks, gzip_chunks, ndjson_chunks
+
+logger = get_logger(__name__)
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _export(
+    resource: str,
+    request: Request,
+    merchant_id: UUID,
+    export_format: str,
+    status_filter: Optional[str],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime],
+    brand: Optional[str]
+) -> StreamingResponse:
+    """Build the streamed (and optionally gzipped) export response."""
+    spec = EXPORTS[resource]
+    batches = ExportService().batches(spec, merchant_id, status_filter, created_from, created_to, brand)
+    body = ndjson_chunks(batches) if export_format == "ndjson" else csv_chunks(batches, spec.columns)
+    
+    headers = {"Content-Disposition": f'attachment; filename="{resource}.{export_format}"'}
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    
+    logger.info("export_started", resource=resource, merchant_id=merchant_id, format=export_format)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[export_format], headers=headers)
+
+
+@router.get("/invoices")
+async def export_invoices(
+    request: Request,
+    merchant_id: UUID = Depends(get_current_merchant),
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format", description="ndjson or csv"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter by status"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+    created_to: Optional[datetime] = Query(None, description="Created before (ISO 8601)"),
+    brand: Optional[str] = Query(None, description="Only invoices with a transaction of this card brand")
+):
+    """
+    Export all invoices of the authenticated merchant, newest first.
+    
+    The file is streamed while it is read from the database (chunked
+    transfer), so exports of any size start immediately. Send
+    `Accept-Encoding: gzip` to get it compressed.
+    
+    - **format**: `ndjson` (one JSON object per line) or `csv` (with header)
+    - **status**: Optional status filter (PENDING, PROCESSING, PAID, FAILED)
+    - **created_from** / **created_to**: created_at range (from inclusive, to exclusive)
+    - **brand**: Card brand (visa, mastercard, elo, ...)
+    """
+    return _export("invoices", request, merchant_id, export_format, status_filter, created_from, created_to, brand)
+
+
+@router.get("/transactions")
+async def export_transactions(
+    request: Request,
+    merchant_id: UUID = Depends(get_current_merchant),
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format", description="ndjson or csv"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter by status"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+    created_to: Optional[datetime] = Query(None, description="Created before (ISO 8601)"),
+    brand: Optional[str] = Query(None, description="Filter by card brand")
+):
+    """
+    Export all transactions of the authenticated merchant, newest first.
+    
+    Streamed like `/v1/exports/invoices`. Card data is limited to brand and
+    last 4 digits.
+    
+    - **format**: `ndjson` (one JSON object per line) or `csv` (with header)
+    - **status**: Optional status filter (CREATED, AUTHORIZED, CAPTURED, DENIED, ...)
+    - **created_from** / **created_to**: created_at range (from inclusive, to exclusive)
+    - **brand**: Card brand (visa, mastercard, elo, ...)
+    """
+    return _export("transactions", request, merchant_id, export_format, status_filter, created_from, created_to, brand)
@@ -1,13 +1,19 @@
 """
 Invoice API endpoints.
 """
+import json
+from datetime import datetime
 from uuid import UUID
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from src.schemas.invoice import InvoiceCreate, InvoiceResponse, InvoiceListResponse
+from typing import Any, AsyncIterator, Dict, Literal, Optional
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from src.schemas.invoice import InvoiceCreate, InvoiceResponse, InvoiceListResponse, InvoiceBulkResponse
 from src.services.invoice_service import InvoiceService
+from src.services.invoice_bulk_service import InvoiceBulkService, iter_items, iter_ndjson
 from src.api.dependencies import get_current_merchant
-from src.core.exceptions import InvoiceNotFoundError
+from src.api.responses import trusted_response
+from src.core.exceptions import InvoiceNotFoundError, ValidationError
 from src.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -52,15 +58,117 @@ async def create_invoice(
     service = InvoiceService()
     try:
         invoice = await service.create(data, merchant_id)
-        return invoice
+        return trusted_response(invoice, status_code=status.HTTP_201_CREATED)
     except Exception as e:
-        logger.error(f"create_invoice_failed - error={str(e)}")
+        logger.error("create_invoice_failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create invoice: {str(e)}"
         )
 
 
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body is produced while the request body is still being read.
+    
+    StreamingResponse listens for the client disconnect on `receive` from the start,
+    which would swallow the request body chunks. This one only starts listening once
+    the request body was read (`request_read`); disconnect handling and background
+    tasks are otherwise StreamingResponse's.
+    """
+    
+    def __init__(self, content: AsyncIterator[bytes], request_read: Optional[anyio.Event] = None, **kwargs):
+        """
+        Args:
+            content: Response body chunks
+            request_read: Set once the request body is fully consumed (None: already read)
+            **kwargs: StreamingResponse arguments
+        """
+        super().__init__(content, **kwargs)
+        self.request_read = request_read
+    
+    async def listen_for_disconnect(self, receive) -> None:
+        if self.request_read is not None:
+            await self.request_read.wait()
+        await super().listen_for_disconnect(receive)
+
+
+async def _read_body(request: Request, done: anyio.Event) -> AsyncIterator[bytes]:
+    """Request body chunks; sets `done` once the body is consumed (or reading stopped)."""
+    try:
+        async for chunk in request.stream():
+            yield chunk
+    finally:
+        done.set()
+
+
+@router.post("/bulk", response_model=InvoiceBulkResponse)
+async def create_invoices_bulk(
+    request: Request,
+    merchant_id: UUID = Depends(get_current_merchant)
+):
+    """
+    Create many invoices in one request (e.g. a monthly billing file).
+    
+    ## 📥 Input
+    - `Content-Type: application/json`: a JSON array of invoices
+    - `Content-Type: application/x-ndjson`: one invoice JSON per line (streamed, for large files)
+    
+    Each row has the same fields as POST /v1/invoices (merchant_id is taken from the API key).
+    Up to INVOICE_BULK_MAX_ITEMS rows (default 10000), inserted INVOICE_BULK_CHUNK_SIZE at a time.
+    
+    ## 📤 Output
+    Per-row results in input order: `{"index": 0, "id": "..."}` or `{"index": 1, "error": "..."}`.
+    - JSON input: one JSON object with total / created / failed / results
+    - NDJSON input (or `Accept: application/x-ndjson`): results streamed as NDJSON while
+      rows are inserted, ending with a `{"total", "created", "failed"}` line
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    ndjson_input = content_type in NDJSON_MEDIA_TYPES
+    request_read = None
+    
+    if ndjson_input:
+        request_read = anyio.Event()
+        rows = iter_ndjson(_read_body(request, request_read))
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid JSON: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array of invoices")
+        rows = iter_items(items)
+    
+    results = InvoiceBulkService().create(rows, merchant_id)
+    
+    if ndjson_input or any(media in request.headers.get("accept", "") for media in NDJSON_MEDIA_TYPES):
+        return DuplexStreamingResponse(
+            _stream_bulk_results(results), request_read=request_read, media_type="application/x-ndjson"
+        )
+    
+    collected = [result async for result in results]
+    created = sum(1 for result in collected if "id" in result)
+    return InvoiceBulkResponse(
+        total=len(collected),
+        created=created,
+        failed=len(collected) - created,
+        results=collected
+    )
+
+
+async def _stream_bulk_results(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """NDJSON lines: one per row, then the totals."""
+    total = created = 0
+    async for result in results:
+        total += 1
+        created += "id" in result
+        yield json.dumps(result).encode() + b"\n"
+    yield json.dumps({"total": total, "created": created, "failed": total - created}).encode() + b"\n"
+
+
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
 async def get_invoice(
     invoice_id: UUID,
@@ -74,40 +182,66 @@ async def get_invoice(
     service = InvoiceService()
     try:
         invoice = await service.get(invoice_id, merchant_id)
-        return invoice
+        return trusted_response(invoice)
     except InvoiceNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"get_invoice_failed - invoice_id={str(invoice_id)}, error={str(e)}")
+        logger.error("get_invoice_failed", invoice_id=invoice_id, error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get invoice: {str(e)}"
         )
 
 
-@router.get("/", response_model=List[InvoiceResponse])
+@router.get("/", response_model=InvoiceListResponse)
 async def list_invoices(
     merchant_id: UUID = Depends(get_current_merchant),
-    status: Optional[str] = Query(None, description="Filter by status"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter by status"),
     limit: int = Query(50, ge=1, le=100, description="Max results"),
-    offset: int = Query(0, ge=0, description="Pagination offset")
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+    created_to: Optional[datetime] = Query(None, description="Created before (ISO 8601)"),
+    include_total: Optional[Literal["estimated", "exact"]] = Query(None, description="Also return a total count")
 ):
     """
-    List invoices for the authenticated merchant.
+    List invoices for the authenticated merchant, newest first.
     
     - **status**: Optional status filter (PENDING, PROCESSING, PAID, FAILED)
     - **limit**: Maximum number of results (1-100)
-    - **offset**: Pagination offset
+    - **cursor**: Pass the `next_cursor` of the previous page to get the next one
+      (`next_cursor` is null on the last page)
+    - **created_from** / **created_to**: created_at range (from inclusive, to exclusive)
+    - **include_total**: `estimated` (fast, approximate) or `exact` (cached for a minute);
+      omitted by default
     """
     service = InvoiceService()
     try:
-        invoices = await service.list(merchant_id, status, limit, offset)
-        return invoices
+        invoices, next_cursor = await service.list(
+            merchant_id, status_filter, limit, cursor, created_from, created_to
+        )
+        
+        total = None
+        if include_total:
+            total = await service.count(
+                merchant_id, status_filter, created_from, created_to, estimated=include_total == "estimated"
+            )
+        
+        return trusted_response(InvoiceListResponse.model_construct(
+            invoices=invoices,
+            next_cursor=next_cursor,
+            total=total,
+            total_is_estimate=include_total == "estimated" if include_total else None
+        ))
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message
+        )
     except Exception as e:
-        logger.error(f"list_invoices_failed - error={str(e)}")
+        logger.error("list_invoices_failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to list invoices: {str(e)}"
@@ -5,10 +5,13 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status
 from src.schemas.merchant import MerchantRegisterAdiq, MerchantResponse
 from src.api.dependencies import get_current_merchant
+from src.services.merchant_service import MerchantService
 from src.core.logger import get_logger
-from src.db.client import supabase
+from src.db.client import db
 import httpx
 from src.core.config import settings
+from src.adapters.adiq import get_adiq_base_url
+from src.adapters.http_client import get_http_client
 
 logger = get_logger(__name__)
 
@@ -42,7 +45,7 @@ async def register_merchant_in_adiq(
     """
     try:
         # Determine Adiq base URL
-        base_url = "https://ecommerce.adiq.io" if data.adiq_environment == "prd" else "https://ecommerce-hml.adiq.io"
+        base_url = get_adiq_base_url(data.adiq_environment)
         
         # 1. Authenticate with Adiq (using global credentials)
         auth_url = f"{base_url}/auth/oauth2/v1/token"
@@ -55,10 +58,10 @@ async def register_merchant_in_adiq(
             "client_secret": settings.adiq_client_secret
         }
         
-        async with httpx.AsyncClient() as client:
-            auth_response = await client.post(auth_url, data=auth_data, headers=auth_headers, timeout=30.0)
-            auth_response.raise_for_status()
-            access_token = auth_response.json()["access_token"]
+        client = get_http_client(base_url)
+        auth_response = await client.post(auth_url, data=auth_data, headers=auth_headers, timeout=30.0)
+        auth_response.raise_for_status()
+        access_token = auth_response.json()["access_token"]
         
         # 2. Register seller in Adiq
         seller_url = f"{base_url}/v1/sellers"
@@ -92,15 +95,14 @@ async def register_merchant_in_adiq(
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            seller_response = await client.post(
-                seller_url,
-                json=seller_payload,
-                headers=seller_headers,
-                timeout=60.0
-            )
-            seller_response.raise_for_status()
-            seller_data = seller_response.json()
+        seller_response = await client.post(
+            seller_url,
+            json=seller_payload,
+            headers=seller_headers,
+            timeout=60.0
+        )
+        seller_response.raise_for_status()
+        seller_data = seller_response.json()
         
         # 3. Update merchant in Supabase
         update_data = {
@@ -113,7 +115,7 @@ async def register_merchant_in_adiq(
             "account": data.account
         }
         
-        result = supabase.table("merchants").update(update_data).eq("id", str(merchant_id)).execute()
+        result = await db.table("merchants").update(update_data).eq("id", str(merchant_id)).execute()
         
         if not result.data:
             raise HTTPException(
@@ -123,9 +125,12 @@ async def register_merchant_in_adiq(
         
         merchant = result.data[0]
         
+        # Credentials changed: drop the cached adapter so the next payment uses them
+        await MerchantService().invalidate_adiq_adapter(merchant_id, merchant)
+        
         logger.info(
-            f"merchant_registered_in_adiq - merchant_id={merchant_id}, "
-            f"seller_id={seller_data['sellerId']}, env={data.adiq_environment}"
+            "merchant_registered_in_adiq",
+            merchant_id=merchant_id, seller_id=seller_data['sellerId'], env=data.adiq_environment
         )
         
         return MerchantResponse(
@@ -141,13 +146,13 @@ async def register_merchant_in_adiq(
         )
         
     except httpx.HTTPStatusError as e:
-        logger.error(f"adiq_registration_failed - status={e.response.status_code}, detail={e.response.text}")
+        logger.error("adiq_registration_failed", status=e.response.status_code, detail=e.response.text)
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Adiq registration failed: {e.response.text}"
         )
     except Exception as e:
-        logger.error(f"merchant_registration_error - error={str(e)}")
+        logger.error("merchant_registration_error", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Merchant registration failed: {str(e)}"
@@ -162,7 +167,7 @@ async def get_current_merchant_info(
     Get current merchant information (based on API key).
     """
     try:
-        result = supabase.table("merchants").select("*").eq("id", str(merchant_id)).execute()
+        result = await db.table("merchants").select("*").eq("id", str(merchant_id)).execute()
         
         if not result.data:
             raise HTTPException(
@@ -185,7 +190,7 @@ async def get_current_merchant_info(
         )
         
     except Exception as e:
-        logger.error(f"get_merchant_failed - error={str(e)}")
+        logger.error("get_merchant_failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get merchant: {str(e)}"
@@ -3,22 +3,37 @@ Payment API endpoints.
 """
 from uuid import UUID
 from typing import Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-from src.schemas.payment import PaymentCreate, PaymentResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header
+from fastapi.responses import ORJSONResponse
+from src.schemas.payment import (
+    PaymentBatchCreate,
+    PaymentBatchJob,
+    PaymentBatchResponse,
+    PaymentCreate,
+    PaymentResponse,
+)
 from src.services.payment_service import PaymentService
+from src.services.batch_payment_service import batch_payment_service
+from src.services.idempotency import idempotency_store, payment_fingerprint
 from src.api.dependencies import get_current_merchant
-from src.core.exceptions import InvoiceNotFoundError, AdiqPaymentError
+from src.api.responses import trusted_response
+from src.core.exceptions import InvoiceNotFoundError, AdiqPaymentError, AdiqOutcomeUnknownError, AdiqUnavailableError
 from src.core.logger import get_logger
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
+# Error statuses replayed for an Idempotency-Key (the payment outcome is final);
+# other errors release the key so the request can be retried
+REPLAYED_ERROR_STATUSES = {status.HTTP_402_PAYMENT_REQUIRED}
+
 
 @router.post("/", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
 async def create_payment(
     data: PaymentCreate,
-    merchant_id: UUID = Depends(get_current_merchant)
+    merchant_id: UUID = Depends(get_current_merchant),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255)
 ):
     """
     Process a payment for an invoice.
@@ -70,7 +85,51 @@ async def create_payment(
     - **security_code**: CVV (3-4 digits)
     - **installments**: 1-12 (default: 1)
     - **capture_type**: "ac" (auto-capture) or "pa" (pre-auth)
+    
+    ## 🔁 Retries
+    Send an `Idempotency-Key` header (e.g. a UUID) to make retries safe: a repeat
+    with the same key within 24h replays the original response
+    (`Idempotent-Replayed: true`) without charging again. A repeat sent while the
+    first request is still running waits for its result.
     """
+    if idempotency_key is None:
+        payment = await _process_payment(data, merchant_id)
+        return trusted_response(payment, status_code=status.HTTP_201_CREATED)
+    
+    fingerprint = payment_fingerprint(data)
+    stored = await idempotency_store.begin(merchant_id, idempotency_key, fingerprint)
+    if stored is not None:
+        return _replay(stored)
+    
+    try:
+        payment = await _process_payment(data, merchant_id)
+    except HTTPException as e:
+        if e.status_code in REPLAYED_ERROR_STATUSES:
+            await idempotency_store.complete(
+                merchant_id, idempotency_key, fingerprint, e.status_code, {"detail": e.detail}
+            )
+        else:
+            await idempotency_store.release(merchant_id, idempotency_key)
+        raise
+    except BaseException:
+        await idempotency_store.release(merchant_id, idempotency_key)
+        raise
+    
+    body = payment.model_dump(mode="json")
+    await idempotency_store.complete(merchant_id, idempotency_key, fingerprint, status.HTTP_201_CREATED, body)
+    return trusted_response(body, status_code=status.HTTP_201_CREATED)
+
+
+def _replay(stored: Dict[str, Any]) -> ORJSONResponse:
+    """Rebuild the stored response of an Idempotency-Key (our own JSON, sent as is)."""
+    headers = {"Idempotent-Replayed": "true"}
+    if stored["status_code"] >= 400:
+        raise HTTPException(status_code=stored["status_code"], detail=stored["body"]["detail"], headers=headers)
+    return trusted_response(stored["body"], status_code=stored["status_code"], headers=headers)
+
+
+async def _process_payment(data: PaymentCreate, merchant_id: UUID) -> PaymentResponse:
+    """Run a payment and map service errors to HTTP errors."""
     service = PaymentService()
     try:
         payment = await service.process_payment(data, merchant_id, customer_data=None)
@@ -80,19 +139,81 @@ async def create_payment(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    except AdiqUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
+    except AdiqOutcomeUnknownError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except AdiqPaymentError as e:
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"create_payment_failed - error={str(e)}")
+        logger.error("create_payment_failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Payment processing failed: {str(e)}"
         )
 
 
+@router.post("/batch", response_model=PaymentBatchResponse)
+async def create_payment_batch(
+    data: PaymentBatchCreate,
+    merchant_id: UUID = Depends(get_current_merchant)
+):
+    """
+    Process several payments in one call (e.g. a recurring billing run).
+    
+    - **items**: list of payment requests, same fields as POST /v1/payments
+      (at most PAYMENT_BATCH_MAX_ITEMS, default 100)
+    
+    Items run concurrently (PAYMENT_BATCH_CONCURRENCY per merchant) and each one
+    gets its own result: `success` with the `payment`, or `error` / `error_code`.
+    A failed item does not stop the others. For large runs use POST /v1/payments/batch/jobs.
+    """
+    return await batch_payment_service.process_batch(data.items, merchant_id)
+
+
+@router.post("/batch/jobs", response_model=PaymentBatchJob, status_code=status.HTTP_202_ACCEPTED)
+async def create_payment_batch_job(
+    data: PaymentBatchCreate,
+    merchant_id: UUID = Depends(get_current_merchant)
+):
+    """
+    Start a payment batch in the background.
+    
+    Returns a `job_id` right away; poll GET /v1/payments/batch/jobs/{job_id}
+    until `status` is `completed` (results in `result`) or `failed`.
+    """
+    return await batch_payment_service.submit(data.items, merchant_id)
+
+
+@router.get("/batch/jobs/{job_id}", response_model=PaymentBatchJob)
+async def get_payment_batch_job(
+    job_id: UUID,
+    merchant_id: UUID = Depends(get_current_merchant)
+):
+    """
+    Get the progress (`processed` / `total`) or results of a batch job.
+    
+    - **job_id**: Job UUID returned by POST /v1/payments/batch/jobs
+    """
+    job = await batch_payment_service.get_job(job_id, merchant_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Batch job {job_id} not found or expired"
+        )
+    return job
+
+
 @router.get("/{transaction_id}", response_model=PaymentResponse)
 async def get_payment(
     transaction_id: UUID,
@@ -106,7 +227,7 @@ async def get_payment(
     service = PaymentService()
     try:
         payment = await service.get_payment(transaction_id, merchant_id)
-        return payment
+        return trusted_response(payment)
     except Exception as e:
         logger.error("get_payment_failed", transaction_id=str(transaction_id), error=str(e))
         raise HTTPException(
@@ -7,10 +7,10 @@ from pydantic import BaseModel, Field
 from uuid import UUID
 from typing import Optional
 
+from src.core.exceptions import AdiqUnavailableError
 from src.core.logger import get_logger
 from src.api.dependencies import get_current_merchant
-from src.adapters.adiq import AdiqAdapter
-from src.db.client import supabase
+from src.services.merchant_service import MerchantService
 
 logger = get_logger(__name__)
 
@@ -60,37 +60,11 @@ async def tokenize_card(
     
     The merchant must have Adiq credentials configured.
     """
-    logger.info(f"tokenization_request - merchant_id={merchant_id}, brand={data.brand}, last4={data.pan[-4:]}")
+    logger.info("tokenization_request", merchant_id=merchant_id, brand=data.brand, last4=data.pan[-4:])
     
     try:
-        # Get merchant credentials
-        result = supabase.table("merchants").select("*").eq("id", str(merchant_id)).execute()
-        
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Merchant not found"
-            )
-        
-        merchant = result.data[0]
-        
-        # Validate merchant has Adiq credentials
-        if not merchant.get("adiq_client_id") or not merchant.get("adiq_client_secret"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Merchant does not have Adiq credentials configured"
-            )
-        
-        # Create Adiq adapter with merchant credentials
-        adiq_env = merchant.get("adiq_environment", "hml")
-        base_url = "https://ecommerce.adiq.io" if adiq_env == "prd" else "https://ecommerce-hml.adiq.io"
-        
-        adapter = AdiqAdapter(
-            client_id=merchant["adiq_client_id"],
-            client_secret=merchant["adiq_client_secret"],
-            seller_id=merchant["adiq_seller_id"],
-            base_url=base_url
-        )
+        # Get merchant adapter (cached per merchant credentials)
+        adapter = await MerchantService().get_adiq_adapter(merchant_id)
         
         # Tokenize card at Adiq
         token_result = await adapter.tokenize_card(
@@ -100,7 +74,7 @@ async def tokenize_card(
             brand=data.brand
         )
         
-        logger.info(f"tokenization_success - merchant_id={merchant_id}, last4={data.pan[-4:]}")
+        logger.info("tokenization_success", merchant_id=merchant_id, last4=data.pan[-4:])
         
         return TokenizeCardResponse(
             number_token=token_result["numberToken"],
@@ -112,8 +86,14 @@ async def tokenize_card(
         
     except HTTPException:
         raise
+    except AdiqUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
     except Exception as e:
-        logger.error(f"tokenization_failed - merchant_id={merchant_id}, error={str(e)}")
+        logger.error("tokenization_failed", merchant_id=merchant_id, error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to tokenize card: {str(e)}"
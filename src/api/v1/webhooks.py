@@ -5,6 +5,7 @@ from typing import Dict, Any
 from fastapi import APIRouter, HTTPException, status, Header, Request
 from src.schemas.webhook import WebhookResponse
 from src.services.webhook_service import WebhookService
+from src.services.webhook_queue import webhook_queue
 from src.core.exceptions import DuplicateWebhookError
 from src.core.logger import get_logger
 
@@ -21,7 +22,8 @@ async def adiq_webhook(
     """
     Receive webhook notifications from Adiq.
     
-    This endpoint processes payment status updates from Adiq.
+    The raw event is stored in webhook_logs and acknowledged immediately;
+    status updates are applied asynchronously by the webhook queue workers.
     
     **Webhook Events:**
     - payment.authorized
@@ -34,26 +36,30 @@ async def adiq_webhook(
     service = WebhookService()
     
     try:
-        # Get raw body
-        body = await request.body()
         payload = await request.json()
         
         # TODO: Validate signature
-        # validate_webhook_signature(body, x_webhook_signature, webhook_secret)
+        # validate_webhook_signature(await request.body(), x_webhook_signature, webhook_secret)
         
-        # Process webhook
-        response = await service.process_webhook(payload, x_webhook_signature or "")
-        return response
+        # Persist, then hand off to the workers
+        webhook_log = await service.receive_webhook(payload, x_webhook_signature or "")
+        await webhook_queue.enqueue(webhook_log)
+        
+        return WebhookResponse(
+            success=True,
+            message="Webhook received",
+            webhook_id=webhook_log["id"]
+        )
         
     except DuplicateWebhookError as e:
-        # Return 200 for duplicates (already processed)
+        # Return 200 for duplicates (already received)
         logger.info("duplicate_webhook_received", detail=str(e))
         return WebhookResponse(
             success=True,
             message="Webhook already processed"
         )
     except Exception as e:
-        logger.error(f"webhook_processing_failed: {str(e)}")
+        logger.error("webhook_processing_failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Webhook processing failed: {str(e)}"
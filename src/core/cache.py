@@ -0,0 +1,91 @@
+"""
+In-process caches shared by the API and services.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+# Sentinel returned when a key is absent or expired
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a time-to-live.
+    Not thread-safe; meant to be used from the event loop.
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Args:
+            max_size: Maximum number of entries
+            ttl: Default time-to-live in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """
+        Get a cached value.
+        
+        Args:
+            key: Cache key
+            default: Returned when the key is absent or expired
+            
+        Returns:
+            Cached value or default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return default
+        
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value.
+        
+        Args:
+            key: Cache key
+            value: Value to cache (None is a valid value)
+            ttl: Optional per-entry time-to-live in seconds
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def delete(self, key: Hashable) -> None:
+        """Remove a key if present."""
+        self._entries.pop(key, None)
+    
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Remove every entry matching a predicate.
+        
+        Args:
+            predicate: Called with (key, value)
+            
+        Returns:
+            Number of removed entries
+        """
+        keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+    
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -2,6 +2,7 @@
 Configuration management using Pydantic Settings.
 Loads environment variables and provides typed configuration.
 """
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -19,22 +20,131 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_key: str
     
+    # Database (async PostgREST) connection pool
+    db_pool_max_connections: int = 50
+    db_pool_max_keepalive: int = 20
+    db_pool_keepalive_expiry: float = 30.0
+    db_http2: bool = True
+    db_timeout: float = 30.0
+    
     # Adiq
     adiq_base_url: str
     adiq_client_id: str
     adiq_client_secret: str
     
+    # Adiq HTTP connection pool
+    adiq_http_max_connections: int = 100
+    adiq_http_max_keepalive: int = 20
+    adiq_http_keepalive_expiry: float = 30.0
+    adiq_http2: bool = True
+    adiq_http_timeout: float = 30.0
+    
+    # Adiq circuit breakers (per operation and environment)
+    adiq_breaker_failure_threshold: int = 5  # Consecutive failures that open the breaker
+    adiq_breaker_reset_timeout: float = 30.0  # Seconds open before a half-open probe
+    adiq_breaker_half_open_calls: int = 1
+    
+    # Adiq adaptive timeouts: percentile latency x multiplier, capped by each call's timeout
+    adiq_timeout_percentile: float = 0.99
+    adiq_timeout_multiplier: float = 3.0
+    adiq_timeout_floor: float = 2.0
+    adiq_timeout_min_samples: int = 50
+    adiq_timeout_window: int = 500
+    
+    # Adiq OAuth token cache (seconds)
+    adiq_token_refresh_margin: float = 300.0
+    adiq_token_expiry_margin: float = 60.0
+    
+    # Adiq adapter registry (max merchants kept in memory)
+    adiq_adapter_registry_size: int = 1024
+    adiq_credentials_version_ttl: float = 86400.0  # Shared credentials fingerprint checked on registry hits
+    
     # Environment
     env: str = "development"
     log_level: str = "INFO"
+    log_format: str = "json"  # json | text
+    log_queue_size: int = 10000  # Records buffered for the log writer thread (overflow is dropped)
+    log_sample_rates: str = ""  # Per-logger sampling of DEBUG/INFO, e.g. "src.api.dependencies=0.01,src.main=0.1"
     
     # Security
     jwt_secret: str
     api_key_header: str = "X-API-Key"
+    admin_api_key: Optional[str] = None  # Enables /admin endpoints (X-Admin-Key header)
+    
+    # API key lookup cache (seconds)
+    auth_cache_size: int = 10000
+    auth_cache_ttl: float = 60.0
+    auth_cache_negative_ttl: float = 5.0
+    
+    # Webhook processing queue
+    webhook_workers: int = 4
+    webhook_queue_max_size: int = 10000
+    webhook_enqueue_timeout: float = 1.0
+    webhook_resume_batch_size: int = 500
+    webhook_resume_lock_ttl: float = 60.0  # Workers starting together resume pending rows once
+    webhook_coalesce_window: float = 0.05
+    webhook_dedup_cache_size: int = 100000
+    webhook_dedup_ttl: float = 3600.0
+    # Failed webhooks are retried with exponential backoff (Adiq retries are acked as duplicates)
+    webhook_retry_interval: float = 60.0  # How often stored failures are picked up again
+    webhook_retry_max_attempts: int = 10
+    webhook_retry_backoff: float = 30.0  # Delay after the first failure, doubled per attempt
+    webhook_retry_backoff_max: float = 3600.0
+    webhook_claim_lease: float = 300.0  # Rows received or resumed by a process are skipped by the others meanwhile
+    
+    # Tracing (exporters: ring_buffer, log)
+    tracing_enabled: bool = True
+    tracing_sample_rate: float = 1.0
+    tracing_exporters: str = "ring_buffer"
+    tracing_ring_buffer_size: int = 200
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
+    
+    # Multi-worker mode (gunicorn.conf.py)
+    web_workers: int = 1
+    web_worker_max_requests: int = 10000  # Recycle a worker after N requests (0 = never)
+    web_worker_max_requests_jitter: int = 1000  # Spread recycling so workers don't restart together
+    web_worker_timeout: int = 120
+    web_graceful_timeout: int = 30
+    web_keepalive: int = 5
+    web_metrics_dir: str = "/tmp/spdpay-metrics"  # Per-worker Prometheus samples, wiped on startup
+    
+    # Cache shared across workers (memory | redis)
+    cache_backend: str = "memory"
+    cache_redis_url: str = "redis://localhost:6379/0"
+    cache_key_prefix: str = "spdpay:"
+    cache_lock_ttl: float = 10.0  # Max wait for another worker's token refresh
+    
+    # Invoice listing: cache of exact counts (?include_total=exact), seconds
+    invoice_count_cache_ttl: float = 60.0
+    
+    # Bulk invoice creation (POST /v1/invoices/bulk)
+    invoice_bulk_max_items: int = 10000
+    invoice_bulk_chunk_size: int = 500  # Rows per multi-row INSERT
+    
+    # Streaming exports (GET /v1/exports/*)
+    export_batch_size: int = 1000  # Rows read (and held) per keyset query
+    
+    # Batch payments (POST /v1/payments/batch)
+    payment_batch_max_items: int = 100
+    payment_batch_concurrency: int = 5  # Payments in flight per merchant, across batches
+    payment_batch_job_ttl: float = 3600.0  # How long async job results can be polled
+    
+    # Reconciler of stale CREATED transactions / PROCESSING invoices (seconds)
+    reconcile_enabled: bool = True
+    reconcile_interval: float = 300.0  # Pause between runs
+    reconcile_stale_after: float = 900.0  # Rows untouched for this long are checked
+    reconcile_lookback: float = 604800.0  # Older rows are left alone (7 days)
+    reconcile_batch_size: int = 500  # Rows read and updated per statement
+    reconcile_concurrency: int = 4  # Adiq lookups in flight per merchant
+    reconcile_lock_ttl: float = 900.0  # One run at a time across workers
+    
+    # Idempotency-Key on POST /v1/payments (seconds)
+    idempotency_ttl: float = 86400.0  # How long a response is replayed
+    idempotency_lock_ttl: float = 120.0  # Longest payment (90s Adiq timeout) + margin
+    idempotency_max_keys: int = 200000  # Memory backend only: keys kept per worker for IDEMPOTENCY_TTL
 
 
 # Global settings instance
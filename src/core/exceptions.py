@@ -103,6 +103,61 @@ class AdiqPaymentError(AdiqError):
         super().__init__(message)
 
 
+class AdiqUnavailableError(AdiqError):
+    """Raised without calling Adiq when the operation's circuit breaker is open."""
+    
+    def __init__(self, operation: str, environment: str, retry_after: float):
+        self.operation = operation
+        self.environment = environment
+        self.retry_after = retry_after
+        super().__init__(
+            f"Adiq {operation} temporarily unavailable ({environment}); retry in {retry_after:.0f}s",
+            status_code=503
+        )
+        self.code = "ADIQ_UNAVAILABLE"
+
+
+class AdiqOutcomeUnknownError(AdiqError):
+    """Raised when a request reached Adiq but no usable answer came back (dropped connection, 5xx)."""
+    
+    def __init__(self, operation: str, reason: str):
+        self.operation = operation
+        self.reason = reason
+        super().__init__(
+            f"Adiq {operation} outcome unknown ({reason}); the payment will be reconciled once Adiq reports it",
+            status_code=504
+        )
+        self.code = "ADIQ_OUTCOME_UNKNOWN"
+
+
+class AdiqTimeoutError(AdiqOutcomeUnknownError):
+    """Raised when Adiq did not answer in time: the outcome of the call is unknown."""
+    
+    def __init__(self, operation: str):
+        super().__init__(operation, "timed out")
+        self.code = "ADIQ_TIMEOUT"
+
+
+class IdempotencyKeyReuseError(SpdpayException):
+    """Raised when an Idempotency-Key is reused for a different request."""
+    
+    def __init__(self, key: str):
+        super().__init__(
+            f"Idempotency-Key {key} was already used for a different request",
+            code="IDEMPOTENCY_KEY_REUSED"
+        )
+
+
+class IdempotencyConflictError(SpdpayException):
+    """Raised when the request holding an Idempotency-Key is still in progress."""
+    
+    def __init__(self, key: str):
+        super().__init__(
+            f"A request with Idempotency-Key {key} is still being processed",
+            code="IDEMPOTENCY_CONFLICT"
+        )
+
+
 class SupabaseError(SpdpayException):
     """Raised when Supabase operation fails."""
     
@@ -127,7 +182,7 @@ class InvalidWebhookSignatureError(SpdpayException):
 
 
 class DuplicateWebhookError(SpdpayException):
-    """Raised when webhook has already been processed."""
+    """Raised when webhook has already been received."""
     
-    def __init__(self, webhook_id: str):
-        super().__init__(f"Webhook {webhook_id} already processed", code="DUPLICATE_WEBHOOK")
+    def __init__(self, dedup_key: str):
+        super().__init__(f"Webhook {dedup_key} already processed", code="DUPLICATE_WEBHOOK")
@@ -1,11 +1,34 @@
 """
 Structured logging with PCI DSS compliance.
 Automatically sanitizes sensitive data from logs.
+
+Logging is non-blocking: the event loop only builds a LogRecord and puts it on
+a bounded queue; a background thread (QueueListener) sanitizes, formats (JSON
+or text) and writes to stdout. Records are dropped, never awaited, when the
+queue is full.
+
+Usage:
+    logger = get_logger(__name__)
+    logger.info("payment_finished", transaction_id=transaction_id, status=status)
+
+Fields are passed as keyword arguments and are never interpolated into the
+message; calls below the configured level return before anything is built.
+Sensitive fields are redacted by sanitize_data when the record is formatted.
+Fields are snapshotted (dicts and lists copied) when the record is queued, so
+the caller may keep mutating its objects.
 """
+import atexit
+import json
 import logging
+import queue
+import random
+import re
 import sys
-from typing import Any, Dict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 from src.core.config import settings
+from src.core.metrics import LOG_RECORDS_DROPPED
 
 
 # Sensitive fields that should NEVER be logged
@@ -18,41 +41,240 @@ SENSITIVE_FIELDS = [
     "password", "api_key", "secret", "token",
 ]
 
+REDACTED = "***REDACTED***"
+
+# One case-insensitive scan per key instead of lower() + a pass per field
+_SENSITIVE_KEY = re.compile("|".join(re.escape(field) for field in SENSITIVE_FIELDS), re.IGNORECASE)
+
+# Key -> sensitive? Payload keys repeat, so most lookups skip the regex.
+# Cleared when full: webhook payloads may carry arbitrary keys.
+KEY_VERDICT_CACHE_SIZE = 4096
+_key_verdicts: Dict[Any, bool] = {}
+
+# LogRecord attribute holding the structured fields
+FIELDS_ATTR = "fields"
+
+
+def is_sensitive_key(key: Any) -> bool:
+    """
+    Check whether a key names sensitive data (substring match, any case).
+    
+    Args:
+        key: Dictionary key
+        
+    Returns:
+        True if the value must be redacted
+    """
+    verdict = _key_verdicts.get(key)
+    if verdict is None:
+        verdict = isinstance(key, str) and _SENSITIVE_KEY.search(key) is not None
+        if len(_key_verdicts) >= KEY_VERDICT_CACHE_SIZE:
+            _key_verdicts.clear()
+        _key_verdicts[key] = verdict
+    return verdict
+
+
+def _sanitize(value: Any) -> Any:
+    """Sanitize dicts and lists copy-on-write; returns `value` itself when clean."""
+    if isinstance(value, dict):
+        copy = None
+        for key, item in value.items():
+            clean = REDACTED if is_sensitive_key(key) else _sanitize(item)
+            if clean is not item:
+                if copy is None:
+                    copy = dict(value)
+                copy[key] = clean
+        return value if copy is None else copy
+    
+    if isinstance(value, list):
+        copy = None
+        for index, item in enumerate(value):
+            clean = _sanitize(item)
+            if clean is not item:
+                if copy is None:
+                    copy = list(value)
+                copy[index] = clean
+        return value if copy is None else copy
+    
+    return value
+
+
+def _snapshot(value: Any) -> Any:
+    """Copy nested dicts, lists and tuples; other values are kept as they are."""
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_snapshot(item) for item in value]
+    return value
+
 
 def sanitize_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Remove sensitive fields from data before logging.
     
+    Only the dicts and lists on the path to a redacted key are copied; clean
+    branches (and clean inputs) are returned as-is, so the result must be
+    treated as read-only. Called by the formatters on the writer thread,
+    i.e. only for records that are actually emitted.
+    
     Args:
-        data: Dictionary that may contain sensitive data
+        data: Dictionary (or list) that may contain sensitive data
         
     Returns:
-        Sanitized dictionary with sensitive fields redacted
+        Sanitized data with sensitive fields redacted
+    """
+    return _sanitize(data)
+
+
+def parse_sample_rates(raw: str) -> Dict[str, float]:
+    """
+    Parse LOG_SAMPLE_RATES ("logger=rate,logger=rate").
+    
+    Args:
+        raw: Comma-separated logger=rate pairs
+        
+    Returns:
+        Logger name -> fraction of DEBUG/INFO records kept
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event and the sanitized fields."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, FIELDS_ATTR, None)
+        if fields:
+            entry.update(sanitize_data(fields))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development: "... - event - key=value, ..."."""
+    
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = getattr(record, FIELDS_ATTR, None)
+        if fields:
+            line += " - " + ", ".join(f"{key}={value}" for key, value in sanitize_data(fields).items())
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never formats on the caller's thread and drops on overflow."""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting (and sanitizing) happens on the listener thread; the fields are
+        # copied now because the caller may mutate its dicts/lists before then
+        fields = getattr(record, FIELDS_ATTR, None)
+        if fields:
+            setattr(record, FIELDS_ATTR, _snapshot(fields))
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class StructuredLogger:
+    """
+    Logger facade taking an event name plus keyword fields.
+    
+    Level checks and sampling happen before a record is created, so disabled
+    or sampled-out calls cost one comparison.
+    """
+    
+    def __init__(self, logger: logging.Logger, sample_rate: float = 1.0):
+        """
+        Args:
+            logger: Underlying stdlib logger
+            sample_rate: Fraction of DEBUG/INFO records kept (warnings and errors always are)
+        """
+        self.logger = logger
+        self.name = logger.name
+        self.sample_rate = sample_rate
+    
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+    
+    def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info: Any = None) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.sample_rate < 1.0 and level < logging.WARNING and random.random() >= self.sample_rate:
+            return
+        self.logger._log(level, event, (), exc_info=exc_info, extra={FIELDS_ATTR: fields}, stacklevel=3)
+    
+    def debug(self, event: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, event, fields)
+    
+    def info(self, event: str, **fields: Any) -> None:
+        self._log(logging.INFO, event, fields)
+    
+    def warning(self, event: str, **fields: Any) -> None:
+        self._log(logging.WARNING, event, fields)
+    
+    def error(self, event: str, exc_info: Any = None, **fields: Any) -> None:
+        self._log(logging.ERROR, event, fields, exc_info)
+    
+    def exception(self, event: str, **fields: Any) -> None:
+        self._log(logging.ERROR, event, fields, True)
+    
+    def critical(self, event: str, **fields: Any) -> None:
+        self._log(logging.CRITICAL, event, fields)
+
+
+_sample_rates = parse_sample_rates(settings.log_sample_rates)
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> None:
     """
-    if not isinstance(data, dict):
-        return data
-    
-    sanitized = {}
-    for key, value in data.items():
-        if any(sensitive in key.lower() for sensitive in SENSITIVE_FIELDS):
-            sanitized[key] = "***REDACTED***"
-        elif isinstance(value, dict):
-            sanitized[key] = sanitize_data(value)
-        elif isinstance(value, list):
-            sanitized[key] = [sanitize_data(item) if isinstance(item, dict) else item for item in value]
-        else:
-            sanitized[key] = value
-    
-    return sanitized
-
-
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, settings.log_level.upper()),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)],
-    force=True  # Override any existing configuration
-)
+    Route the root logger through the queue and start the writer thread.
+    Called once at import; the thread is flushed and stopped at exit.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if settings.log_format == "json" else TextFormatter())
+    
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    root = logging.getLogger()
+    root.handlers = [NonBlockingQueueHandler(log_queue)]
+    root.setLevel(getattr(logging, settings.log_level.upper()))
+    
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush pending records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+configure_logging()
 
 # Configure uvicorn access logger
 uvicorn_access = logging.getLogger("uvicorn.access")
@@ -63,7 +285,7 @@ uvicorn_error = logging.getLogger("uvicorn.error")
 uvicorn_error.setLevel(logging.INFO)
 
 
-def get_logger(name: str) -> logging.Logger:
+def get_logger(name: str) -> StructuredLogger:
     """
     Get a logger instance for a module.
     
@@ -71,6 +293,6 @@ def get_logger(name: str) -> logging.Logger:
         name: Module name (usually __name__)
         
     Returns:
-        Configured logger instance
+        Structured logger (sampled when listed in LOG_SAMPLE_RATES)
     """
-    return logging.getLogger(name)
+    return StructuredLogger(logging.getLogger(name), _sample_rates.get(name, 1.0))
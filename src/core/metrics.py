@@ -0,0 +1,240 @@
+"""
+Prometheus metrics.
+
+- HTTP requests per route template and status code
+- Adiq calls per operation and environment (latency, errors, OAuth token requests,
+  circuit breaker state and rejections)
+- Database statements per table and operation (PostgREST)
+- Webhook queue depth, in-flight events and lag
+- Log records dropped by the non-blocking log pipeline
+
+Outbound calls are measured by wrapping the httpx transport of the pooled
+clients (InstrumentedTransport), so no call site has to be touched.
+
+Under gunicorn every worker has its own values: gunicorn.conf.py sets
+PROMETHEUS_MULTIPROC_DIR, workers write their samples there and /metrics
+aggregates all of them (gauges declare how: sum or max over live workers).
+"""
+import os
+import time
+from typing import Callable, Optional
+import httpx
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Latency buckets (seconds) - API requests and Adiq calls go up to the 90s payment timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 90.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "spdpay_http_request_duration_seconds",
+    "API request latency by route template and status code",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+ADIQ_REQUEST_DURATION = Histogram(
+    "spdpay_adiq_request_duration_seconds",
+    "Adiq call latency by operation and environment",
+    ["operation", "environment"],
+    buckets=LATENCY_BUCKETS
+)
+
+ADIQ_REQUEST_ERRORS = Counter(
+    "spdpay_adiq_request_errors_total",
+    "Failed Adiq calls by operation, environment and reason (HTTP status or exception)",
+    ["operation", "environment", "reason"]
+)
+
+ADIQ_TOKEN_REQUESTS = Counter(
+    "spdpay_adiq_oauth_token_requests_total",
+    "OAuth token requests sent to Adiq (cache misses and refreshes)",
+    ["environment", "result"]
+)
+
+ADIQ_CIRCUIT_STATE = Gauge(
+    "spdpay_adiq_circuit_state",
+    "Adiq circuit breaker state (0 closed, 1 half-open, 2 open), worst over the workers",
+    ["operation", "environment"],
+    multiprocess_mode="livemax"
+)
+
+ADIQ_CIRCUIT_REJECTIONS = Counter(
+    "spdpay_adiq_circuit_rejections_total",
+    "Adiq calls rejected without I/O because the circuit breaker was open",
+    ["operation", "environment"]
+)
+
+DB_STATEMENT_DURATION = Histogram(
+    "spdpay_db_statement_duration_seconds",
+    "PostgREST statement latency by table and operation",
+    ["table", "operation"],
+    buckets=DB_BUCKETS
+)
+
+DB_STATEMENT_ERRORS = Counter(
+    "spdpay_db_statement_errors_total",
+    "Failed PostgREST statements by table, operation and reason",
+    ["table", "operation", "reason"]
+)
+
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "spdpay_webhook_queue_depth",
+    "Webhook events buffered and waiting for a worker",
+    multiprocess_mode="livesum"
+)
+
+WEBHOOK_QUEUE_IN_FLIGHT = Gauge(
+    "spdpay_webhook_queue_in_flight",
+    "Webhook events being processed",
+    multiprocess_mode="livesum"
+)
+
+WEBHOOK_QUEUE_LAG = Histogram(
+    "spdpay_webhook_queue_lag_seconds",
+    "Time from enqueue to processing start",
+    buckets=LATENCY_BUCKETS
+)
+
+WEBHOOK_EVENTS = Counter(
+    "spdpay_webhook_events_total",
+    "Webhook events handled by the queue workers",
+    ["result"]
+)
+
+RECONCILER_ROWS = Counter(
+    "spdpay_reconciler_rows_total",
+    "Stale transactions and invoices checked by the reconciler, by outcome",
+    ["table", "result"]
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "spdpay_log_records_dropped_total",
+    "Log records dropped because the log writer queue was full"
+)
+
+# Observer called with (request, response or None on exception, elapsed seconds)
+Observer = Callable[[httpx.Request, Optional[httpx.Response], float], None]
+
+# Adiq operations by (method, first path segments)
+ADIQ_OPERATIONS = {
+    ("POST", "/auth/oauth2/v1/token"): "oauth_token",
+    ("POST", "/v1/tokens/cards"): "tokenize_card",
+    ("POST", "/v1/vaults/cards"): "create_vault",
+    ("POST", "/v1/payments"): "create_payment",
+    ("GET", "/v1/payments"): "get_payment",
+    ("POST", "/v1/sellers"): "create_seller",
+}
+
+DB_OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete", "HEAD": "count"}
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper reporting every request to an observer."""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, observe: Observer):
+        """
+        Args:
+            transport: Transport doing the actual I/O
+            observe: Called after each request, also when it raised
+        """
+        self._transport = transport
+        self._observe = observe
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            self._observe(request, None, time.perf_counter() - start)
+            raise
+        self._observe(request, response, time.perf_counter() - start)
+        return response
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def adiq_operation(method: str, path: str) -> str:
+    """Map an Adiq request to a low-cardinality operation name."""
+    operation = ADIQ_OPERATIONS.get((method, path))
+    if operation is None and path.startswith("/v1/payments/"):
+        operation = ADIQ_OPERATIONS.get((method, "/v1/payments"))
+    return operation or "other"
+
+
+def adiq_observer(environment: str) -> Observer:
+    """Build the observer for one Adiq environment's pooled client."""
+    def observe(request: httpx.Request, response: Optional[httpx.Response], elapsed: float) -> None:
+        operation = adiq_operation(request.method, request.url.path)
+        ADIQ_REQUEST_DURATION.labels(operation, environment).observe(elapsed)
+        if response is None:
+            ADIQ_REQUEST_ERRORS.labels(operation, environment, "exception").inc()
+        elif response.status_code >= 400:
+            ADIQ_REQUEST_ERRORS.labels(operation, environment, str(response.status_code)).inc()
+    
+    return observe
+
+
+def adiq_span_namer(environment: str) -> Callable[[httpx.Request], tuple]:
+    """Span name and attributes for Adiq calls (no query string, headers or body)."""
+    def namer(request: httpx.Request) -> tuple:
+        operation = adiq_operation(request.method, request.url.path)
+        return f"adiq.{operation}", {
+            "adiq.operation": operation,
+            "adiq.environment": environment,
+            "http.method": request.method,
+            "http.path": request.url.path
+        }
+    
+    return namer
+
+
+def db_span_namer(request: httpx.Request) -> tuple:
+    """Span name and attributes for PostgREST calls (filters are left out: they may hold keys)."""
+    table, operation = db_statement_labels(request.method, request.url.path)
+    return f"db.{table}.{operation}", {"db.table": table, "db.operation": operation}
+
+
+def db_statement_labels(method: str, path: str) -> tuple:
+    """(table, operation) for a PostgREST request path like /rest/v1/invoices or /rest/v1/rpc/begin_payment."""
+    resource = path.rsplit("/rest/v1/", 1)[-1]
+    if resource.startswith("rpc/"):
+        return resource[4:], "rpc"
+    return resource, DB_OPERATIONS.get(method, method.lower())
+
+
+def observe_db_statement(request: httpx.Request, response: Optional[httpx.Response], elapsed: float) -> None:
+    """Observer for the PostgREST client."""
+    table, operation = db_statement_labels(request.method, request.url.path)
+    DB_STATEMENT_DURATION.labels(table, operation).observe(elapsed)
+    if response is None:
+        DB_STATEMENT_ERRORS.labels(table, operation, "exception").inc()
+    elif response.status_code >= 400:
+        DB_STATEMENT_ERRORS.labels(table, operation, str(response.status_code)).inc()
+
+
+def render_metrics() -> tuple:
+    """
+    Render the registry in the Prometheus text format.
+    
+    In multiprocess mode (PROMETHEUS_MULTIPROC_DIR set) the samples of every
+    worker are aggregated, whichever worker serves the scrape.
+    
+    Returns:
+        Tuple of (body, content type)
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,92 @@
+"""
+Keyset (cursor) pagination helpers for PostgREST queries.
+
+Rows are ordered by (created_at DESC, id DESC); a page continues strictly
+after the last row of the previous one, so every page costs the same index
+range scan no matter how deep it is (OFFSET reads and discards every
+skipped row).
+
+The cursor handed to clients is opaque: base64url of the last row's
+(created_at, id).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+from src.core.exceptions import ValidationError
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """
+    Build the cursor pointing after a row.
+    
+    Args:
+        row: Last row of a page (needs created_at and id)
+        
+    Returns:
+        Opaque cursor string
+    """
+    raw = json.dumps([str(row["created_at"]), str(row["id"])], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Read a cursor produced by encode_cursor.
+    
+    Args:
+        cursor: Opaque cursor string
+        
+    Returns:
+        Tuple of (created_at, id)
+        
+    Raises:
+        ValidationError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(row_id, str):
+            raise ValueError("cursor fields must be strings")
+        # Both end up inside a PostgREST filter: only accept what encode_cursor can produce
+        datetime.fromisoformat(created_at)
+        UUID(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValidationError(f"Invalid cursor: {e}")
+    return created_at, row_id
+
+
+def keyset_filter(cursor: str) -> str:
+    """
+    PostgREST `or` filter selecting rows after a cursor in (created_at DESC, id DESC) order.
+    
+    Args:
+        cursor: Opaque cursor string
+        
+    Returns:
+        Filter body for query.or_()
+        
+    Raises:
+        ValidationError: If the cursor is malformed
+    """
+    created_at, row_id = decode_cursor(cursor)
+    # Quoted: timestamps contain reserved characters (":" "." "+")
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+
+
+def apply_keyset(query: Any, cursor: Optional[str]) -> Any:
+    """
+    Order a select query for keyset pagination and continue after a cursor.
+    
+    Args:
+        query: PostgREST select builder
+        cursor: Cursor of the previous page, or None for the first page
+        
+    Returns:
+        The query, ordered by (created_at DESC, id DESC)
+    """
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if cursor:
+        query = query.or_(keyset_filter(cursor))
+    return query
@@ -0,0 +1,173 @@
+"""
+Cache backends shared across worker processes.
+
+With several gunicorn workers each process has its own memory, so OAuth
+tokens and API key lookups would be fetched once per worker. A shared
+backend lets workers reuse each other's results:
+
+- memory: in-process only (default, single worker / tests)
+- redis: any Redis-compatible server (Redis, Valkey, KeyDB, Dragonfly)
+
+Values must be JSON-serializable. The in-process caches (TTLCache, token
+cache) stay in front of the backend, so a shared lookup only happens on a
+local miss.
+"""
+import json
+from typing import Any, Callable, Dict
+from src.core.cache import MISSING, TTLCache
+from src.core.config import settings
+from src.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CacheBackend:
+    """Async key/value store with per-key TTL."""
+    
+    # False when entries are only visible to this process
+    shared = False
+    
+    async def get(self, key: str) -> Any:
+        """
+        Get a value.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Stored value, or MISSING if absent or expired
+        """
+        raise NotImplementedError
+    
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Store a value.
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable value (None is a valid value)
+            ttl: Time-to-live in seconds
+        """
+        raise NotImplementedError
+    
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        """
+        Store a value only if the key is absent (used as a cross-worker lock).
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+            ttl: Time-to-live in seconds
+            
+        Returns:
+            True if stored, False if the key already existed
+        """
+        raise NotImplementedError
+    
+    async def delete(self, key: str) -> None:
+        """Remove a key if present."""
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        """Release connections."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process backend; each worker sees only its own entries."""
+    
+    def __init__(self, max_size: int = 10000):
+        """
+        Args:
+            max_size: Maximum number of entries
+        """
+        self._cache = TTLCache(max_size=max_size, ttl=60)
+    
+    async def get(self, key: str) -> Any:
+        return self._cache.get(key)
+    
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._cache.set(key, value, ttl=ttl)
+    
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        if self._cache.get(key) is not MISSING:
+            return False
+        self._cache.set(key, value, ttl=ttl)
+        return True
+    
+    async def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend on a Redis-compatible server (requires the `redis` package)."""
+    
+    shared = True
+    
+    def __init__(self, url: str, prefix: str):
+        """
+        Args:
+            url: Server URL (e.g. redis://localhost:6379/0)
+            prefix: Prefix added to every key
+        """
+        try:
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+        
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+    
+    async def get(self, key: str) -> Any:
+        raw = await self._client.get(self.prefix + key)
+        return MISSING if raw is None else json.loads(raw)
+    
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._client.set(self.prefix + key, json.dumps(value), px=max(int(ttl * 1000), 1))
+    
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        stored = await self._client.set(self.prefix + key, json.dumps(value), px=max(int(ttl * 1000), 1), nx=True)
+        return bool(stored)
+    
+    async def delete(self, key: str) -> None:
+        await self._client.delete(self.prefix + key)
+    
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+# Backend factories for CACHE_BACKEND
+BACKENDS: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": MemoryCacheBackend,
+    "redis": lambda: RedisCacheBackend(settings.cache_redis_url, settings.cache_key_prefix),
+}
+
+
+def create_cache_backend(name: str) -> CacheBackend:
+    """
+    Build the configured cache backend.
+    
+    Args:
+        name: Backend name (memory, redis)
+        
+    Returns:
+        Cache backend
+        
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown CACHE_BACKEND: {name} (expected one of {', '.join(BACKENDS)})")
+    return factory()
+
+
+# Global backend, shared by the token cache and the API key lookup
+shared_cache: CacheBackend = create_cache_backend(settings.cache_backend)
+
+if settings.web_workers > 1 and not shared_cache.shared:
+    logger.warning("shared_cache_not_shared", backend=settings.cache_backend, workers=settings.web_workers)
+
+
+async def close_shared_cache() -> None:
+    """Close the shared backend. Called on application shutdown."""
+    await shared_cache.close()
@@ -134,6 +134,23 @@ def get_invoice_next_states(current_status: str) -> List[str]:
         return []
 
 
+def get_invoice_source_states(to_status: str) -> List[str]:
+    """
+    Get list of statuses an invoice may transition from into the given status.
+    
+    Args:
+        to_status: Desired invoice status
+        
+    Returns:
+        List of allowed source statuses (empty if none)
+    """
+    try:
+        status_enum = InvoiceStatus(to_status)
+    except ValueError:
+        return []
+    return [s.value for s, targets in INVOICE_TRANSITIONS.items() if status_enum in targets]
+
+
 def get_transaction_next_states(current_status: str) -> List[str]:
     """
     Get list of allowed next states for a transaction.
@@ -149,3 +166,48 @@ def get_transaction_next_states(current_status: str) -> List[str]:
         return [s.value for s in TRANSACTION_TRANSITIONS.get(status_enum, [])]
     except ValueError:
         return []
+
+
+def can_reach_transaction(from_status: str, to_status: str) -> bool:
+    """
+    Check if a transaction can get from one status to another in zero or more
+    allowed transitions (e.g. CREATED can reach SETTLED, SETTLED cannot reach CAPTURED).
+    
+    Args:
+        from_status: Current transaction status
+        to_status: Target transaction status
+        
+    Returns:
+        True if to_status is from_status or one of its successors
+    """
+    try:
+        from_enum = TransactionStatus(from_status)
+        to_enum = TransactionStatus(to_status)
+    except ValueError:
+        return False
+    
+    seen = {from_enum}
+    frontier = [from_enum]
+    while frontier:
+        status = frontier.pop()
+        if status == to_enum:
+            return True
+        for next_status in TRANSACTION_TRANSITIONS.get(status, []):
+            if next_status not in seen:
+                seen.add(next_status)
+                frontier.append(next_status)
+    return False
+
+
+def get_transaction_source_states(to_status: str) -> List[str]:
+    """
+    Get list of statuses from which a transaction can reach the given status.
+    Used to keep a stale status from overwriting a newer one.
+    
+    Args:
+        to_status: Target transaction status
+        
+    Returns:
+        List of source statuses, including to_status itself (empty if unknown)
+    """
+    return [s.value for s in TransactionStatus if can_reach_transaction(s.value, to_status)]
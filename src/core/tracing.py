@@ -0,0 +1,253 @@
+"""
+Request-scoped tracing.
+
+Spans are opened with `tracer.span(name, **attributes)` and nest through a
+context variable, so a payment request yields one trace whose child spans
+cover each service step and each outbound Adiq/DB call (TracingTransport).
+
+When the root span ends, the whole trace goes to the configured exporters:
+- ring_buffer: keeps the last N traces in memory (GET /admin/traces)
+- log: one summary log line per trace
+Custom exporters implement SpanExporter and are added with tracer.add_exporter.
+"""
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+import httpx
+from src.core.config import settings
+from src.core.logger import get_logger, sanitize_data
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Span:
+    """One timed operation within a trace."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    sampled: bool = True
+    _start_perf: float = 0.0
+    _trace: Optional[List["Span"]] = None
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Attach an attribute (sanitized before export)."""
+        if self.sampled:
+            self.attributes[key] = value
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": sanitize_data(self.attributes)
+        }
+
+
+class SpanExporter:
+    """Receives finished traces (root span last)."""
+    
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+
+class RingBufferExporter(SpanExporter):
+    """Keeps the most recent traces in memory."""
+    
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Number of traces kept
+        """
+        self._traces: Deque[List[Dict[str, Any]]] = deque(maxlen=capacity)
+    
+    def export(self, spans: List[Span]) -> None:
+        self._traces.append([span.to_dict() for span in spans])
+    
+    def list_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Summaries of the most recent traces, newest first.
+        
+        Args:
+            limit: Max traces
+            
+        Returns:
+            List of {trace_id, name, duration_ms, status, span_count, start_time}
+        """
+        summaries = []
+        for spans in list(self._traces)[::-1][:limit]:
+            root = spans[-1]
+            summaries.append({
+                "trace_id": root["trace_id"],
+                "name": root["name"],
+                "start_time": root["start_time"],
+                "duration_ms": root["duration_ms"],
+                "status": root["status"],
+                "span_count": len(spans)
+            })
+        return summaries
+    
+    def get_trace(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Spans of a trace ordered by start time (waterfall), or None."""
+        for spans in self._traces:
+            if spans[-1]["trace_id"] == trace_id:
+                return sorted(spans, key=lambda span: span["start_time"])
+        return None
+    
+    def clear(self) -> None:
+        self._traces.clear()
+
+
+class LogExporter(SpanExporter):
+    """Writes one log line per trace with the slowest child spans."""
+    
+    def export(self, spans: List[Span]) -> None:
+        root = spans[-1]
+        slowest = sorted(spans[:-1], key=lambda span: span.duration_ms or 0, reverse=True)[:3]
+        logger.info(
+            "trace_finished",
+            trace_id=root.trace_id,
+            name=root.name,
+            duration_ms=root.duration_ms,
+            spans=len(spans),
+            slowest=','.join(f'{span.name}:{span.duration_ms}' for span in slowest)
+        )
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Creates spans and hands finished traces to exporters."""
+    
+    def __init__(self, sample_rate: float = 1.0):
+        """
+        Args:
+            sample_rate: Fraction of root spans (traces) recorded
+        """
+        self.sample_rate = sample_rate
+        self.exporters: List[SpanExporter] = []
+    
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.append(exporter)
+    
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+    
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Open a span as a child of the current one (or a new trace).
+        
+        Args:
+            name: Span name (e.g. "payment.tokenize")
+            **attributes: Initial attributes
+            
+        Yields:
+            The span; exceptions mark it as error and are re-raised
+        """
+        parent = _current_span.get()
+        
+        if parent is None:
+            sampled = bool(self.exporters) and random.random() < self.sample_rate
+            span = Span(name, uuid4().hex, uuid4().hex[:16], None, time.time(), sampled=sampled)
+            span._trace = []
+        else:
+            span = Span(
+                name, parent.trace_id, uuid4().hex[:16], parent.span_id, time.time(),
+                sampled=parent.sampled
+            )
+            span._trace = parent._trace
+        
+        if span.sampled:
+            span.attributes.update(attributes)
+        span._start_perf = time.perf_counter()
+        token = _current_span.set(span)
+        
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration_ms = round((time.perf_counter() - span._start_perf) * 1000, 3)
+            if span.sampled:
+                span._trace.append(span)
+                if parent is None:
+                    self._export(span._trace)
+    
+    def _export(self, spans: List[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.error("trace_export_failed", exporter=type(exporter).__name__, error=str(e))
+
+
+# Request -> (span name, attributes); only path-level data, never query strings or bodies
+SpanNamer = Callable[[httpx.Request], Tuple[str, Dict[str, Any]]]
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper recording each outbound request as a child span."""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, namer: SpanNamer):
+        """
+        Args:
+            transport: Transport doing the actual I/O
+            namer: Builds the span name and sanitized attributes for a request
+        """
+        self._transport = transport
+        self._namer = namer
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Outside a trace (startup, CLI scripts) there is nothing to attach to
+        if _current_span.get() is None:
+            return await self._transport.handle_async_request(request)
+        
+        name, attributes = self._namer(request)
+        with tracer.span(name, **attributes) as span:
+            response = await self._transport.handle_async_request(request)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 400:
+                span.status = "error"
+            return response
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+# Exporter factories for TRACING_EXPORTERS
+EXPORTERS: Dict[str, Callable[[], SpanExporter]] = {
+    "ring_buffer": lambda: ring_buffer,
+    "log": LogExporter,
+}
+
+# Global tracer and in-process trace buffer
+tracer = Tracer(sample_rate=settings.tracing_sample_rate)
+ring_buffer = RingBufferExporter(capacity=settings.tracing_ring_buffer_size)
+
+if settings.tracing_enabled:
+    for _exporter_name in filter(None, (name.strip() for name in settings.tracing_exporters.split(","))):
+        if _exporter_name in EXPORTERS:
+            tracer.add_exporter(EXPORTERS[_exporter_name]())
+        else:
+            logger.warning("unknown_trace_exporter", name=_exporter_name)
@@ -1,16 +1,103 @@
 """
-Supabase database client.
+Supabase database clients.
+
+- `db`: async PostgREST client with a pooled HTTP session. Used by the API and
+  services so database round trips never block the event loop.
+- `get_supabase_client()`: synchronous Supabase client for the CLI/debug
+  scripts only, created on first call (the API never builds it).
 """
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Dict, Optional, Union
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
 from src.core.config import settings
 from src.core.logger import get_logger
+from src.core.metrics import InstrumentedTransport, db_span_namer, observe_db_statement
+from src.core.tracing import TracingTransport
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = get_logger(__name__)
 
-# Global Supabase client
-supabase: Client = create_client(
-    settings.supabase_url,
-    settings.supabase_key
-)
 
-logger.info(f"supabase_client_initialized: {settings.supabase_url}")
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose HTTP session uses configurable pool limits."""
+    
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> httpx.AsyncClient:
+        """Create the pooled HTTP session used for every query (with statement metrics and spans)."""
+        transport = httpx.AsyncHTTPTransport(
+            verify=verify,
+            proxy=proxy,
+            http2=settings.db_http2,
+            limits=httpx.Limits(
+                max_connections=settings.db_pool_max_connections,
+                max_keepalive_connections=settings.db_pool_max_keepalive,
+                keepalive_expiry=settings.db_pool_keepalive_expiry,
+            ),
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=InstrumentedTransport(TracingTransport(transport, db_span_namer), observe_db_statement),
+        )
+
+
+def create_db_client() -> PooledPostgrestClient:
+    """
+    Create the async PostgREST client for the Supabase project.
+    
+    Returns:
+        Async client pointing at {SUPABASE_URL}/rest/v1
+    """
+    headers = {
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apikey": settings.supabase_key,
+        "Authorization": f"Bearer {settings.supabase_key}",
+    }
+    return PooledPostgrestClient(
+        f"{settings.supabase_url.rstrip('/')}/rest/v1",
+        headers=headers,
+        timeout=settings.db_timeout,
+    )
+
+
+_supabase: Optional["Client"] = None
+
+
+def get_supabase_client() -> "Client":
+    """
+    Synchronous Supabase client for CLI/debug scripts (blocking: never call it from the API).
+    
+    Returns:
+        Client created on first call and reused afterwards
+    """
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        _supabase = create_client(settings.supabase_url, settings.supabase_key)
+    return _supabase
+
+
+async def close_db() -> None:
+    """Close the async client's connection pool. Called on application shutdown."""
+    await db.aclose()
+    logger.info("db_client_closed")
+
+
+# Global async client (API and services)
+db: PooledPostgrestClient = create_db_client()
+
+logger.info(
+    "supabase_client_initialized",
+    supabase_url=settings.supabase_url, pool_max_connections=settings.db_pool_max_connections
+)
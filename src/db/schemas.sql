@@ -117,6 +117,7 @@ CREATE TABLE IF NOT EXISTS webhook_logs (
     processed BOOLEAN DEFAULT false,
     processed_at TIMESTAMP,
     error TEXT,
+    dedup_key VARCHAR(320),
     received_at TIMESTAMP DEFAULT NOW(),
     created_at TIMESTAMP DEFAULT NOW()
 );
@@ -125,10 +126,32 @@ CREATE TABLE IF NOT EXISTS webhook_logs (
 CREATE INDEX IF NOT EXISTS idx_invoices_merchant ON invoices(merchant_id);
 CREATE INDEX IF NOT EXISTS idx_invoices_customer ON invoices(customer_id);
 CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices(status);
+-- Keyset pagination: GET /v1/invoices?cursor=... (ORDER BY created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_invoices_merchant_created ON invoices(merchant_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_transactions_invoice ON transactions(invoice_id);
+-- Keyset reads: GET /v1/exports/transactions (ORDER BY created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_transactions_merchant_created ON transactions(merchant_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_transactions_payment_id ON transactions(payment_id);
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_payment_id ON webhook_logs(payment_id);
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_processed ON webhook_logs(processed);
+-- Reconciler scans: only the (few) rows still waiting for a final status
+CREATE INDEX IF NOT EXISTS idx_transactions_created_stale ON transactions(created_at DESC, id DESC)
+    WHERE status = 'CREATED';
+CREATE INDEX IF NOT EXISTS idx_invoices_processing_stale ON invoices(created_at DESC, id DESC)
+    WHERE status = 'PROCESSING';
+-- Reconciler: payment_id of a payment whose finish_payment never ran, by order number
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_order_number ON webhook_logs((payload->>'orderNumber'));
+
+-- Webhook deduplication: one row per (payment_id, status/eventType).
+-- The insert itself rejects Adiq retries (unique_violation).
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS dedup_key VARCHAR(320);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_logs_dedup_key ON webhook_logs(dedup_key);
+
+-- Webhook retries: a failed row stays pending until processed or out of attempts
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_pending ON webhook_logs(received_at)
+    WHERE processed = false;
 
 -- Updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -154,3 +177,224 @@ CREATE TRIGGER update_cards_updated_at BEFORE UPDATE ON cards
 
 CREATE TRIGGER update_transactions_updated_at BEFORE UPDATE ON transactions
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- =====================================================================
+-- Payment procedures (called via PostgREST RPC by PaymentService)
+-- =====================================================================
+
+-- begin_payment: validate merchant credentials, lock the PENDING invoice,
+-- move it to PROCESSING and create the CREATED transaction in one transaction.
+-- Returns everything the Adiq call needs.
+-- Card brand and last4 are stored on the transaction (exports filter on them).
+DROP FUNCTION IF EXISTS begin_payment(UUID, UUID, UUID, INTEGER, TEXT);
+CREATE OR REPLACE FUNCTION begin_payment(
+    p_merchant_id UUID,
+    p_invoice_id UUID,
+    p_transaction_id UUID,
+    p_installments INTEGER,
+    p_order_number TEXT,
+    p_card_brand TEXT DEFAULT NULL,
+    p_card_last4 TEXT DEFAULT NULL
+) RETURNS JSONB AS $$
+DECLARE
+    v_merchant merchants%ROWTYPE;
+    v_invoice invoices%ROWTYPE;
+    v_transaction transactions%ROWTYPE;
+BEGIN
+    SELECT * INTO v_merchant FROM merchants WHERE id = p_merchant_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'MERCHANT_NOT_FOUND' USING ERRCODE = 'P0002';
+    END IF;
+
+    IF v_merchant.adiq_client_id IS NULL
+        OR v_merchant.adiq_client_secret IS NULL
+        OR v_merchant.adiq_seller_id IS NULL THEN
+        RAISE EXCEPTION 'MERCHANT_MISSING_ADIQ_CREDENTIALS' USING ERRCODE = 'P0001';
+    END IF;
+
+    SELECT * INTO v_invoice FROM invoices
+        WHERE id = p_invoice_id AND merchant_id = p_merchant_id
+        FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'INVOICE_NOT_FOUND' USING ERRCODE = 'P0002';
+    END IF;
+
+    IF v_invoice.status <> 'PENDING' THEN
+        RAISE EXCEPTION 'INVALID_STATE_TRANSITION'
+            USING ERRCODE = 'P0001', DETAIL = v_invoice.status;
+    END IF;
+
+    UPDATE invoices
+        SET status = 'PROCESSING', order_number = p_order_number, updated_at = NOW()
+        WHERE id = p_invoice_id
+        RETURNING * INTO v_invoice;
+
+    INSERT INTO transactions (id, invoice_id, merchant_id, amount, currency, installments,
+                              card_brand, card_last4, status)
+        VALUES (p_transaction_id, p_invoice_id, p_merchant_id,
+                v_invoice.amount, v_invoice.currency, p_installments,
+                lower(p_card_brand), p_card_last4, 'CREATED')
+        RETURNING * INTO v_transaction;
+
+    RETURN jsonb_build_object(
+        'invoice', to_jsonb(v_invoice),
+        'transaction', to_jsonb(v_transaction),
+        'merchant', jsonb_build_object(
+            'id', v_merchant.id,
+            'adiq_client_id', v_merchant.adiq_client_id,
+            'adiq_client_secret', v_merchant.adiq_client_secret,
+            'adiq_seller_id', v_merchant.adiq_seller_id,
+            'adiq_environment', v_merchant.adiq_environment
+        )
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- finish_payment: write the Adiq result on the transaction and the final
+-- invoice status together. The invoice only moves if it is still PROCESSING.
+CREATE OR REPLACE FUNCTION finish_payment(
+    p_transaction_id UUID,
+    p_transaction_status TEXT,
+    p_invoice_status TEXT,
+    p_payment_id TEXT DEFAULT NULL,
+    p_authorization_code TEXT DEFAULT NULL,
+    p_nsu TEXT DEFAULT NULL,
+    p_tid TEXT DEFAULT NULL
+) RETURNS JSONB AS $$
+DECLARE
+    v_transaction transactions%ROWTYPE;
+    v_invoice invoices%ROWTYPE;
+BEGIN
+    UPDATE transactions SET
+        status = p_transaction_status,
+        payment_id = COALESCE(p_payment_id, payment_id),
+        authorization_code = COALESCE(p_authorization_code, authorization_code),
+        nsu = COALESCE(p_nsu, nsu),
+        tid = COALESCE(p_tid, tid),
+        authorized_at = CASE WHEN p_transaction_status = 'AUTHORIZED' THEN NOW() ELSE authorized_at END,
+        captured_at = CASE WHEN p_transaction_status = 'CAPTURED' THEN NOW() ELSE captured_at END,
+        updated_at = NOW()
+        WHERE id = p_transaction_id AND status = 'CREATED'
+        RETURNING * INTO v_transaction;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'INVALID_STATE_TRANSITION'
+            USING ERRCODE = 'P0001', DETAIL = 'transaction not in CREATED';
+    END IF;
+
+    UPDATE invoices
+        SET status = p_invoice_status, updated_at = NOW()
+        WHERE id = v_transaction.invoice_id AND status = 'PROCESSING'
+        RETURNING * INTO v_invoice;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'INVALID_STATE_TRANSITION'
+            USING ERRCODE = 'P0001', DETAIL = 'invoice not in PROCESSING';
+    END IF;
+
+    RETURN jsonb_build_object(
+        'invoice', to_jsonb(v_invoice),
+        'transaction', to_jsonb(v_transaction)
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- abort_payment: undo begin_payment when Adiq was never called (circuit
+-- breaker open): delete the CREATED transaction and put the PROCESSING
+-- invoice back to PENDING so the payment can be retried.
+CREATE OR REPLACE FUNCTION abort_payment(p_transaction_id UUID) RETURNS JSONB AS $$
+DECLARE
+    v_transaction transactions%ROWTYPE;
+    v_invoice invoices%ROWTYPE;
+BEGIN
+    DELETE FROM transactions
+        WHERE id = p_transaction_id AND status = 'CREATED'
+        RETURNING * INTO v_transaction;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'INVALID_STATE_TRANSITION'
+            USING ERRCODE = 'P0001', DETAIL = 'transaction not in CREATED';
+    END IF;
+
+    UPDATE invoices
+        SET status = 'PENDING', updated_at = NOW()
+        WHERE id = v_transaction.invoice_id AND status = 'PROCESSING'
+        RETURNING * INTO v_invoice;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'INVALID_STATE_TRANSITION'
+            USING ERRCODE = 'P0001', DETAIL = 'invoice not in PROCESSING';
+    END IF;
+
+    RETURN jsonb_build_object('invoice', to_jsonb(v_invoice));
+END;
+$$ LANGUAGE plpgsql;
+
+-- claim_pending_webhooks: take up to p_limit due webhook_logs rows (never
+-- tried, or failed with their backoff elapsed) for this process. Claimed rows
+-- get next_attempt_at = now + lease, so other processes skip them until they
+-- are processed, fail (backoff) or the lease expires (crashed process);
+-- SKIP LOCKED lets concurrent claims split the rows instead of waiting.
+CREATE OR REPLACE FUNCTION claim_pending_webhooks(
+    p_limit INTEGER,
+    p_max_attempts INTEGER,
+    p_lease_seconds DOUBLE PRECISION
+) RETURNS TABLE (
+    id UUID, payment_id VARCHAR, event_type VARCHAR, payload JSONB, attempts INTEGER
+) AS $$
+    WITH due AS (
+        SELECT w.id FROM webhook_logs w
+            WHERE w.processed = false
+              AND w.attempts < p_max_attempts
+              AND (w.next_attempt_at IS NULL OR w.next_attempt_at <= NOW())
+            ORDER BY w.received_at
+            LIMIT p_limit
+            FOR UPDATE SKIP LOCKED
+    ), claimed AS (
+        UPDATE webhook_logs w
+            SET next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+            FROM due
+            WHERE w.id = due.id
+            RETURNING w.id, w.payment_id, w.event_type, w.payload, w.attempts, w.received_at
+    )
+    SELECT c.id, c.payment_id, c.event_type, c.payload, c.attempts
+        FROM claimed c
+        ORDER BY c.received_at;
+$$ LANGUAGE sql;
+
+-- reconcile_transactions: apply the Adiq status of a batch of stale CREATED
+-- transactions and move their PROCESSING invoices to PAID/FAILED, one
+-- statement per table for the whole batch. Rows that left CREATED since they
+-- were read are untouched. Returns the number of transactions updated.
+-- p_updates: [{"id", "status", "invoice_status", "payment_id", "authorization_code", "nsu"}]
+CREATE OR REPLACE FUNCTION reconcile_transactions(p_updates JSONB) RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    WITH u AS (
+        SELECT * FROM jsonb_to_recordset(p_updates) AS x(
+            id UUID, status TEXT, invoice_status TEXT,
+            payment_id TEXT, authorization_code TEXT, nsu TEXT
+        )
+    ), updated AS (
+        UPDATE transactions t SET
+            status = u.status,
+            payment_id = COALESCE(u.payment_id, t.payment_id),
+            authorization_code = COALESCE(u.authorization_code, t.authorization_code),
+            nsu = COALESCE(u.nsu, t.nsu),
+            tid = COALESCE(u.payment_id, t.tid),  -- TID é o paymentId
+            authorized_at = CASE WHEN u.status = 'AUTHORIZED' THEN NOW() ELSE t.authorized_at END,
+            captured_at = CASE WHEN u.status = 'CAPTURED' THEN NOW() ELSE t.captured_at END,
+            settled_at = CASE WHEN u.status = 'SETTLED' THEN NOW() ELSE t.settled_at END,
+            updated_at = NOW()
+            FROM u
+            WHERE t.id = u.id AND t.status = 'CREATED'
+            RETURNING t.invoice_id, u.invoice_status
+    ), invoices_updated AS (
+        UPDATE invoices i
+            SET status = updated.invoice_status, updated_at = NOW()
+            FROM updated
+            WHERE i.id = updated.invoice_id AND i.status = 'PROCESSING'
+            RETURNING i.id
+    )
+    SELECT count(*) INTO v_count FROM updated;
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
@@ -3,13 +3,21 @@ Spdpay Gateway - Main FastAPI application.
 """
 import time
 from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from src.core.config import settings
 from src.core.logger import get_logger
 from src.core.exceptions import SpdpayException
-from src.api import health
-from src.api.v1 import invoices, payments, webhooks, merchants, tokenization
+from src.core.metrics import HTTP_REQUEST_DURATION
+from src.core.tracing import tracer
+from src.adapters.http_client import close_http_clients
+from src.db.client import close_db
+from src.core.shared_cache import close_shared_cache
+from src.services.webhook_queue import webhook_queue
+from src.services.batch_payment_service import batch_payment_service
+from src.services.reconciliation_service import payment_reconciler
+from src.api import admin, health
+from src.api.v1 import invoices, payments, webhooks, merchants, tokenization, exports
 
 logger = get_logger(__name__)
 
@@ -19,7 +27,8 @@ app = FastAPI(
     description="Payment gateway for credit card processing via Adiq",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -35,22 +44,38 @@ app.add_middleware(
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all HTTP requests with timing."""
+    """Log all HTTP requests with timing; each request is the root span of a trace."""
     start_time = time.time()
     
-    # Log request
-    logger.info(f"→ {request.method} {request.url.path}")
+    # Log request (DEBUG: the finished line below carries the same fields)
+    logger.debug("request_started", method=request.method, path=request.url.path)
     
-    # Process request
-    response = await call_next(request)
+    with tracer.span(f"{request.method} {request.url.path}", **{"http.method": request.method}) as span:
+        # Process request
+        response = await call_next(request)
+        
+        # Route template (e.g. /v1/invoices/{invoice_id}) keeps label cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        span.name = f"{request.method} {route_path}"
+        span.set_attribute("http.route", route_path)
+        span.set_attribute("http.status_code", response.status_code)
+        if span.sampled:
+            response.headers["X-Trace-Id"] = span.trace_id
     
     # Calculate duration
     duration = time.time() - start_time
     
+    HTTP_REQUEST_DURATION.labels(request.method, route_path, str(response.status_code)).observe(duration)
+    
     # Log response
     logger.info(
-        f"← {request.method} {request.url.path} "
-        f"status={response.status_code} duration={duration:.3f}s"
+        "request_finished",
+        method=request.method,
+        path=request.url.path,
+        route=route_path,
+        status=response.status_code,
+        duration_ms=round(duration * 1000, 1)
     )
     
     return response
@@ -60,7 +85,7 @@ async def log_requests(request: Request, call_next):
 @app.exception_handler(SpdpayException)
 async def spdpay_exception_handler(request: Request, exc: SpdpayException):
     """Handle custom Spdpay exceptions."""
-    logger.error(f"spdpay_exception - code={exc.code}, message={exc.message}, path={request.url.path}")
+    logger.error("spdpay_exception", code=exc.code, message=exc.message, path=request.url.path)
     
     status_code_map = {
         "UNAUTHORIZED": status.HTTP_401_UNAUTHORIZED,
@@ -70,7 +95,12 @@ async def spdpay_exception_handler(request: Request, exc: SpdpayException):
         "PAYMENT_NOT_FOUND": status.HTTP_404_NOT_FOUND,
         "MERCHANT_NOT_FOUND": status.HTTP_404_NOT_FOUND,
         "INVALID_STATE_TRANSITION": status.HTTP_400_BAD_REQUEST,
+        "IDEMPOTENCY_KEY_REUSED": status.HTTP_422_UNPROCESSABLE_ENTITY,
+        "IDEMPOTENCY_CONFLICT": status.HTTP_409_CONFLICT,
         "ADIQ_ERROR": status.HTTP_502_BAD_GATEWAY,
+        "ADIQ_UNAVAILABLE": status.HTTP_503_SERVICE_UNAVAILABLE,
+        "ADIQ_TIMEOUT": status.HTTP_504_GATEWAY_TIMEOUT,
+        "ADIQ_OUTCOME_UNKNOWN": status.HTTP_504_GATEWAY_TIMEOUT,
         "DATABASE_ERROR": status.HTTP_500_INTERNAL_SERVER_ERROR,
         "PCI_VIOLATION": status.HTTP_400_BAD_REQUEST,
     }
@@ -89,23 +119,33 @@ async def spdpay_exception_handler(request: Request, exc: SpdpayException):
 
 # Include routers
 app.include_router(health.router)
+app.include_router(admin.router)
 app.include_router(invoices.router, prefix="/v1")
 app.include_router(payments.router, prefix="/v1")
 app.include_router(webhooks.router, prefix="/v1")
 app.include_router(merchants.router, prefix="/v1")
 app.include_router(tokenization.router, prefix="/v1")
+app.include_router(exports.router, prefix="/v1")
 
 
 @app.on_event("startup")
 async def startup_event():
     """Run on application startup."""
-    logger.info(f"spdpay_gateway_starting - env={settings.env}, host={settings.host}, port={settings.port}")
+    logger.info("spdpay_gateway_starting", env=settings.env, host=settings.host, port=settings.port)
+    await webhook_queue.start()
+    await payment_reconciler.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown."""
     logger.info("spdpay_gateway_shutting_down")
+    await webhook_queue.stop()
+    await payment_reconciler.stop()
+    await batch_payment_service.stop()
+    await close_http_clients()
+    await close_db()
+    await close_shared_cache()
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 Base schemas for common patterns.
 """
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from pydantic import BaseModel, Field
 from uuid import UUID
 
@@ -16,6 +16,22 @@ class BaseSchema(BaseModel):
             datetime: lambda v: v.isoformat(),
             UUID: lambda v: str(v)
         }
+    
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]):
+        """
+        Build from a trusted database row without validation (model_construct).
+        
+        Values keep their JSON types (UUIDs and timestamps stay strings) and
+        serialize unchanged; columns that are not fields are dropped.
+        
+        Args:
+            row: Row returned by PostgREST (or our own stored response)
+            
+        Returns:
+            Schema instance
+        """
+        return cls.model_construct(**{name: row[name] for name in cls.model_fields if name in row})
 
 
 class TimestampSchema(BaseSchema):
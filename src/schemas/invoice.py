@@ -76,9 +76,24 @@ class InvoiceResponse(InvoiceBase, TimestampSchema):
         from_attributes = True
 
 
+class InvoiceBulkResult(BaseModel):
+    """Outcome of one bulk row: the new invoice id, or why the row was rejected."""
+    index: int
+    id: Optional[UUID] = None
+    error: Optional[str] = None
+
+
+class InvoiceBulkResponse(BaseModel):
+    """Schema for a bulk creation (JSON response)."""
+    total: int
+    created: int
+    failed: int
+    results: list[InvoiceBulkResult]
+
+
 class InvoiceListResponse(BaseSchema):
-    """Schema for list of invoices."""
+    """Schema for a page of invoices (keyset pagination)."""
     invoices: list[InvoiceResponse]
-    total: int
-    page: int
-    page_size: int
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page; None on the last page
+    total: Optional[int] = None  # Only with ?include_total=estimated|exact
+    total_is_estimate: Optional[bool] = None
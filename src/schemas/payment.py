@@ -3,7 +3,7 @@ Payment schemas for request/response validation.
 """
 from pydantic import BaseModel, Field, validator
 from uuid import UUID
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from src.schemas.base import BaseSchema, TimestampSchema
 
@@ -120,6 +120,41 @@ class PaymentResponse(TimestampSchema):
         from_attributes = True
 
 
+class PaymentBatchCreate(BaseModel):
+    """Schema for a batch of payments (up to PAYMENT_BATCH_MAX_ITEMS items)."""
+    items: List[PaymentCreate] = Field(..., min_length=1, description="Payments to process")
+
+
+class PaymentBatchItemResult(BaseModel):
+    """Outcome of one batch item: the payment, or the error that stopped it."""
+    index: int
+    invoice_id: UUID
+    success: bool
+    payment: Optional[PaymentResponse] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class PaymentBatchResponse(BaseModel):
+    """Schema for a processed batch."""
+    total: int
+    succeeded: int
+    failed: int
+    results: List[PaymentBatchItemResult]
+
+
+class PaymentBatchJob(BaseModel):
+    """Schema for an asynchronous batch job (results once completed)."""
+    job_id: UUID
+    status: str  # running, completed, failed
+    total: int
+    processed: int = 0
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[PaymentBatchResponse] = None
+    error: Optional[str] = None  # Set when the whole batch failed (e.g. merchant or OAuth error)
+
+
 class PaymentStatusUpdate(BaseModel):
     """Schema for updating payment status."""
     status: str
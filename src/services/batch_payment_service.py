@@ -0,0 +1,237 @@
+"""
+Batch payments - many invoices charged in one API call.
+
+Items run through PaymentService concurrently, at most
+PAYMENT_BATCH_CONCURRENCY at a time per merchant (shared by every batch of
+that merchant in this worker), after a single merchant lookup and OAuth
+token fetch for the whole batch. Each item gets its own result; one failing
+item never stops the others.
+
+Asynchronous jobs run the same batch in the background; their state is kept
+in the shared cache backend for PAYMENT_BATCH_JOB_TTL so any worker can
+answer polls.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from uuid import UUID, uuid4
+from fastapi import HTTPException
+from src.core.cache import MISSING
+from src.core.config import settings
+from src.core.exceptions import SpdpayException, ValidationError
+from src.core.logger import get_logger
+from src.core.shared_cache import shared_cache
+from src.schemas.payment import (
+    PaymentBatchItemResult,
+    PaymentBatchJob,
+    PaymentBatchResponse,
+    PaymentCreate,
+)
+from src.services.merchant_service import MerchantService
+from src.services.payment_service import PaymentService
+
+logger = get_logger(__name__)
+
+# Called after each item completes
+ProgressCallback = Callable[[], Awaitable[None]]
+
+
+def item_error(error: Exception) -> tuple:
+    """
+    (error_code, message) reported for a failed batch item.
+    
+    Args:
+        error: Exception raised by the payment
+        
+    Returns:
+        Tuple of (code, message)
+    """
+    if isinstance(error, SpdpayException):
+        return error.code, error.message
+    if isinstance(error, HTTPException):
+        return f"HTTP_{error.status_code}", str(error.detail)
+    return "PAYMENT_FAILED", str(error)
+
+
+class BatchPaymentService:
+    """Runs payment batches with bounded per-merchant concurrency."""
+    
+    # Minimum interval between progress writes of a running job (seconds)
+    progress_interval = 1.0
+    
+    def __init__(self):
+        self.payment_service = PaymentService()
+        self.merchant_service = MerchantService()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._jobs: Set[asyncio.Task] = set()
+        self._stopping = False
+    
+    def _semaphore(self, merchant_id: UUID) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(str(merchant_id))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.payment_batch_concurrency)
+            self._semaphores[str(merchant_id)] = semaphore
+        return semaphore
+    
+    @staticmethod
+    def _validate(items: List[PaymentCreate]) -> None:
+        if len(items) > settings.payment_batch_max_items:
+            raise ValidationError(f"A batch accepts at most {settings.payment_batch_max_items} items")
+    
+    async def process_batch(
+        self,
+        items: List[PaymentCreate],
+        merchant_id: UUID,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> PaymentBatchResponse:
+        """
+        Process a batch of payments.
+        
+        Args:
+            items: Payment requests
+            merchant_id: Merchant ID
+            on_progress: Awaited after each item completes
+            
+        Returns:
+            Per-item results, in request order
+            
+        Raises:
+            ValidationError: If the batch is too large
+            HTTPException: If merchant not found or missing Adiq credentials
+            AdiqError: If the OAuth token cannot be obtained
+        """
+        self._validate(items)
+        
+        # One merchant lookup and one token for the whole batch; items reuse both
+        # through the adapter registry and the token cache
+        adapter = await self.merchant_service.get_adiq_adapter(merchant_id)
+        await adapter.authenticate()
+        
+        semaphore = self._semaphore(merchant_id)
+        
+        async def run(index: int, item: PaymentCreate) -> PaymentBatchItemResult:
+            async with semaphore:
+                if self._stopping:
+                    result = PaymentBatchItemResult(
+                        index=index, invoice_id=item.invoice_id, success=False,
+                        error="Server shutting down; item not processed", error_code="SHUTTING_DOWN"
+                    )
+                else:
+                    try:
+                        payment = await self.payment_service.process_payment(item, merchant_id)
+                        result = PaymentBatchItemResult(
+                            index=index, invoice_id=item.invoice_id, success=True, payment=payment
+                        )
+                    except Exception as e:
+                        code, message = item_error(e)
+                        result = PaymentBatchItemResult(
+                            index=index, invoice_id=item.invoice_id, success=False,
+                            error=message, error_code=code
+                        )
+            if on_progress is not None:
+                await on_progress()
+            return result
+        
+        results = await asyncio.gather(*(run(index, item) for index, item in enumerate(items)))
+        succeeded = sum(1 for result in results if result.success)
+        
+        logger.info(
+            "payment_batch_processed",
+            merchant_id=merchant_id, total=len(results), succeeded=succeeded
+        )
+        return PaymentBatchResponse(
+            total=len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            results=results
+        )
+    
+    async def submit(self, items: List[PaymentCreate], merchant_id: UUID) -> PaymentBatchJob:
+        """
+        Start a batch in the background.
+        
+        Args:
+            items: Payment requests
+            merchant_id: Merchant ID
+            
+        Returns:
+            Job in "running" state (poll with get_job)
+            
+        Raises:
+            ValidationError: If the batch is too large
+        """
+        self._validate(items)
+        
+        job = PaymentBatchJob(job_id=uuid4(), status="running", total=len(items), created_at=datetime.utcnow())
+        await self._save(merchant_id, job)
+        
+        task = asyncio.create_task(self._run_job(job, items, merchant_id))
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+        
+        logger.info("payment_batch_job_started", merchant_id=merchant_id, job_id=job.job_id, total=job.total)
+        return job.model_copy()
+    
+    async def get_job(self, job_id: UUID, merchant_id: UUID) -> Optional[PaymentBatchJob]:
+        """
+        Get a batch job of a merchant.
+        
+        Args:
+            job_id: Job ID
+            merchant_id: Merchant ID (jobs of other merchants are not visible)
+            
+        Returns:
+            Job, or None if unknown or expired
+        """
+        record = await shared_cache.get(self._job_key(merchant_id, job_id))
+        return None if record is MISSING else PaymentBatchJob(**record)
+    
+    async def _run_job(self, job: PaymentBatchJob, items: List[PaymentCreate], merchant_id: UUID) -> None:
+        last_saved = time.monotonic()
+        
+        async def progress() -> None:
+            nonlocal last_saved
+            job.processed += 1
+            if time.monotonic() - last_saved >= self.progress_interval:
+                last_saved = time.monotonic()
+                await self._save(merchant_id, job)
+        
+        try:
+            job.result = await self.process_batch(items, merchant_id, on_progress=progress)
+            job.status = "completed"
+        except Exception as e:
+            _, message = item_error(e)
+            logger.error("payment_batch_job_failed", merchant_id=merchant_id, job_id=job.job_id, error=message)
+            job.status = "failed"
+            job.error = message
+        
+        job.finished_at = datetime.utcnow()
+        await self._save(merchant_id, job)
+    
+    @staticmethod
+    def _job_key(merchant_id: UUID, job_id: UUID) -> str:
+        return f"batch:{merchant_id}:{job_id}"
+    
+    async def _save(self, merchant_id: UUID, job: PaymentBatchJob) -> None:
+        try:
+            await shared_cache.set(
+                self._job_key(merchant_id, job.job_id),
+                job.model_dump(mode="json"),
+                ttl=settings.payment_batch_job_ttl
+            )
+        except Exception as e:
+            logger.error("payment_batch_job_save_failed", job_id=job.job_id, error=str(e))
+    
+    async def stop(self) -> None:
+        """
+        Let running jobs finish their in-flight payments (up to WEB_GRACEFUL_TIMEOUT);
+        items not started yet are reported as SHUTTING_DOWN. Called on shutdown.
+        """
+        self._stopping = True
+        if self._jobs:
+            await asyncio.wait(set(self._jobs), timeout=settings.web_graceful_timeout)
+
+
+# Global instance: per-merchant limits apply across all batches of this worker
+batch_payment_service = BatchPaymentService()
@@ -0,0 +1,173 @@
+"""
+Idempotency keys for payment requests.
+
+A client sends `Idempotency-Key: <unique value>` with POST /v1/payments.
+The first request with a key claims it (a "processing" marker) and stores
+its response when done; repeats within IDEMPOTENCY_TTL get that response
+replayed without touching Adiq or the invoice. A duplicate arriving while
+the first one is still running waits for its result.
+
+Keys are scoped per merchant. With CACHE_BACKEND=redis they live in the
+shared backend, so every worker sees them (the server must not evict them
+early: use a noeviction or volatile-ttl maxmemory policy). With the memory
+backend they get a store of their own, separate from the shared LRU, holding
+at most IDEMPOTENCY_MAX_KEYS keys per worker: size it for the payments of one
+IDEMPOTENCY_TTL window. Past that, the least recently used keys are dropped
+and a late retry is stopped by the invoice state machine instead of replayed.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+from src.core.cache import MISSING
+from src.core.config import settings
+from src.core.exceptions import IdempotencyConflictError, IdempotencyKeyReuseError
+from src.core.logger import get_logger
+from src.core.shared_cache import CacheBackend, MemoryCacheBackend, shared_cache
+from src.schemas.payment import PaymentCreate
+
+logger = get_logger(__name__)
+
+PROCESSING = "processing"
+COMPLETED = "completed"
+
+
+def payment_fingerprint(data: PaymentCreate) -> str:
+    """
+    Fingerprint of the payment a key was first used for (no card data).
+    
+    Args:
+        data: Payment request
+        
+    Returns:
+        SHA-256 hex digest of invoice, brand, installments and capture type
+    """
+    parts = (str(data.invoice_id), data.brand or "", str(data.installments), data.capture_type)
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Claim / complete / release of idempotency keys on a cache backend."""
+    
+    # Interval between checks while a duplicate waits for the first request
+    poll_interval = 0.05
+    
+    def __init__(self, backend: CacheBackend, ttl: float, lock_ttl: float):
+        """
+        Args:
+            backend: Cache backend holding the keys
+            ttl: Seconds a completed response is replayed
+            lock_ttl: Seconds a "processing" marker lives (longest payment + margin)
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+    
+    @staticmethod
+    def _key(merchant_id: UUID, key: str) -> str:
+        return f"idem:payments:{merchant_id}:{key}"
+    
+    async def begin(self, merchant_id: UUID, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a key, or get the response stored for it.
+        
+        Args:
+            merchant_id: Merchant ID
+            key: Idempotency-Key header value
+            fingerprint: Request fingerprint
+            
+        Returns:
+            None if the caller now owns the key and must process the request,
+            else the stored {"status_code", "body"} to replay
+            
+        Raises:
+            IdempotencyKeyReuseError: If the key was used for a different request
+            IdempotencyConflictError: If the first request is still running after lock_ttl
+        """
+        cache_key = self._key(merchant_id, key)
+        deadline = time.monotonic() + self.lock_ttl
+        
+        while True:
+            record = await self.backend.get(cache_key)
+            
+            if record is MISSING:
+                claimed = await self.backend.add(
+                    cache_key, {"state": PROCESSING, "fingerprint": fingerprint}, ttl=self.lock_ttl
+                )
+                if claimed:
+                    return None
+                continue
+            
+            if record["fingerprint"] != fingerprint:
+                raise IdempotencyKeyReuseError(key)
+            
+            if record["state"] == COMPLETED:
+                logger.info("idempotent_replay", merchant_id=merchant_id, status=record["status_code"])
+                return record
+            
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflictError(key)
+            
+            await asyncio.sleep(self.poll_interval)
+    
+    async def complete(
+        self,
+        merchant_id: UUID,
+        key: str,
+        fingerprint: str,
+        status_code: int,
+        body: Any
+    ) -> None:
+        """
+        Store the response of a claimed key.
+        
+        Args:
+            merchant_id: Merchant ID
+            key: Idempotency-Key header value
+            fingerprint: Request fingerprint
+            status_code: HTTP status code to replay
+            body: JSON-serializable response body
+        """
+        record = {"state": COMPLETED, "fingerprint": fingerprint, "status_code": status_code, "body": body}
+        try:
+            await self.backend.set(self._key(merchant_id, key), record, ttl=self.ttl)
+        except Exception as e:
+            # The payment itself succeeded; a retry will hit the invoice state machine instead
+            logger.error("idempotency_store_failed", merchant_id=merchant_id, error=str(e))
+    
+    async def release(self, merchant_id: UUID, key: str) -> None:
+        """
+        Drop a claimed key so the request can be retried (result not worth replaying).
+        
+        Args:
+            merchant_id: Merchant ID
+            key: Idempotency-Key header value
+        """
+        try:
+            await self.backend.delete(self._key(merchant_id, key))
+        except Exception as e:
+            logger.warning("idempotency_release_failed", merchant_id=merchant_id, error=str(e))
+
+
+def create_idempotency_backend() -> CacheBackend:
+    """
+    Backend for idempotency keys: the shared one when it is shared (Redis),
+    else a dedicated in-process store sized for the retention window.
+    
+    Returns:
+        Cache backend
+    """
+    if shared_cache.shared:
+        return shared_cache
+    if settings.web_workers > 1:
+        logger.warning("idempotency_keys_not_shared", backend=settings.cache_backend, workers=settings.web_workers)
+    return MemoryCacheBackend(max_size=settings.idempotency_max_keys)
+
+
+# Global store for POST /v1/payments
+idempotency_store = IdempotencyStore(
+    create_idempotency_backend(),
+    ttl=settings.idempotency_ttl,
+    lock_ttl=settings.idempotency_lock_ttl
+)
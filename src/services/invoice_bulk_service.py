@@ -0,0 +1,162 @@
+"""
+Bulk invoice creation - billing files loaded in one request.
+
+Rows (a JSON array or an NDJSON stream of InvoiceCreate objects) are read
+incrementally, validated in chunks of INVOICE_BULK_CHUNK_SIZE and every
+chunk's valid rows are written with one multi-row INSERT. If Postgres rejects
+a chunk because of a row's data (SQLSTATE class 22 or 23, e.g. an unknown
+customer_id), its rows are retried one by one so only the offending rows are
+reported. Any other failure (timeout, connection error) may have happened
+after the INSERT committed, so the chunk is reported as failed, not retried.
+
+Results are produced per row, in input order, as soon as their chunk is
+written, so they can be streamed back while the rest of the input is read.
+"""
+import json
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from uuid import UUID
+from postgrest.exceptions import APIError
+from pydantic import ValidationError as PydanticValidationError
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.schemas.invoice import InvoiceCreate
+from src.services.invoice_service import InvoiceService
+
+logger = get_logger(__name__)
+
+# SQLSTATE classes caused by the rows themselves: data exception, integrity constraint violation
+ROW_ERROR_CLASSES = ("22", "23")
+
+
+class InvalidRow:
+    """Input line that could not be parsed as JSON."""
+    
+    def __init__(self, message: str):
+        self.message = message
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Parse an NDJSON byte stream (one JSON object per line, blank lines skipped).
+    
+    Args:
+        chunks: Request body chunks (split anywhere)
+        
+    Yields:
+        Parsed objects, or InvalidRow for lines that are not valid JSON
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode(line)
+    if buffer.strip():
+        yield _decode(buffer)
+
+
+async def iter_items(items: List[Any]) -> AsyncIterator[Any]:
+    """Async iterator over an already parsed JSON array."""
+    for item in items:
+        yield item
+
+
+def _decode(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidRow(f"Invalid JSON: {e}")
+
+
+def _validation_message(error: PydanticValidationError) -> str:
+    """Compact "field: message; ..." text of a pydantic validation error."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+class InvoiceBulkService:
+    """Validates and inserts invoice rows chunk by chunk."""
+    
+    def __init__(self):
+        self.invoice_service = InvoiceService()
+    
+    async def create(self, rows: AsyncIterator[Any], merchant_id: UUID) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Create invoices from a row stream.
+        
+        Args:
+            rows: Parsed input rows (dicts, or InvalidRow)
+            merchant_id: Merchant ID from API key (overrides any merchant_id in the rows)
+            
+        Yields:
+            {"index", "id"} for created rows, {"index", "error"} for rejected ones;
+            rows past INVOICE_BULK_MAX_ITEMS end the stream with one error entry
+        """
+        chunk: List[Tuple[int, Any]] = []
+        index = 0
+        
+        async for row in rows:
+            if index >= settings.invoice_bulk_max_items:
+                yield {"index": index, "error": f"Limit of {settings.invoice_bulk_max_items} rows reached; rest ignored"}
+                break
+            
+            chunk.append((index, row))
+            index += 1
+            
+            if len(chunk) >= settings.invoice_bulk_chunk_size:
+                for result in await self._create_chunk(chunk, merchant_id):
+                    yield result
+                chunk = []
+        
+        if chunk:
+            for result in await self._create_chunk(chunk, merchant_id):
+                yield result
+    
+    async def _create_chunk(self, chunk: List[Tuple[int, Any]], merchant_id: UUID) -> List[Dict[str, Any]]:
+        results: Dict[int, Dict[str, Any]] = {}
+        valid: List[Tuple[int, InvoiceCreate]] = []
+        
+        for index, row in chunk:
+            if isinstance(row, InvalidRow):
+                results[index] = {"index": index, "error": row.message}
+                continue
+            if isinstance(row, dict):
+                # Rows belong to the API key's merchant, like POST /v1/invoices
+                row = {**row, "merchant_id": str(merchant_id)}
+            try:
+                valid.append((index, InvoiceCreate.model_validate(row)))
+            except PydanticValidationError as e:
+                results[index] = {"index": index, "error": _validation_message(e)}
+        
+        if valid:
+            try:
+                invoices = await self.invoice_service.create_many([data for _, data in valid], merchant_id)
+                for (index, _), invoice in zip(valid, invoices):
+                    results[index] = {"index": index, "id": str(invoice.id)}
+            except Exception as e:
+                if isinstance(e, APIError) and str(e.code or "").startswith(ROW_ERROR_CLASSES):
+                    # The INSERT was rejected as a whole: isolate the failing rows
+                    logger.warning("invoice_bulk_chunk_retried_per_row", rows=len(valid), error=str(e))
+                    for index, data in valid:
+                        try:
+                            invoice = await self.invoice_service.create(data, merchant_id)
+                            results[index] = {"index": index, "id": str(invoice.id)}
+                        except Exception as row_error:
+                            results[index] = {"index": index, "error": str(row_error)}
+                else:
+                    self._fail_chunk(results, valid, e)
+        
+        return [results[index] for index, _ in chunk]
+    
+    @staticmethod
+    def _fail_chunk(results: Dict[int, Dict[str, Any]], valid: List[Tuple[int, InvoiceCreate]], error: Exception) -> None:
+        """Report every row of a chunk whose INSERT outcome is unknown, without re-inserting them."""
+        logger.error("invoice_bulk_chunk_failed", rows=len(valid), error=str(error))
+        for index, _ in valid:
+            results[index] = {
+                "index": index,
+                "error": f"Chunk insert failed, rows not retried (check before resending): {error}"
+            }
@@ -2,13 +2,18 @@
 Invoice service - Business logic for invoice management.
 """
 from uuid import UUID
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 from datetime import datetime
+from postgrest.types import CountMethod
 from src.schemas.invoice import InvoiceCreate, InvoiceResponse, InvoiceUpdate
 from src.core.exceptions import InvoiceNotFoundError, InvalidStateTransitionError
-from src.core.state_machine import validate_invoice_transition
+from src.core.state_machine import get_invoice_source_states
+from src.core.cache import MISSING
+from src.core.config import settings
 from src.core.logger import get_logger
-from src.db.client import supabase
+from src.core.pagination import apply_keyset, encode_cursor
+from src.core.shared_cache import shared_cache
+from src.db.client import db
 
 logger = get_logger(__name__)
 
@@ -27,26 +32,53 @@ class InvoiceService:
         Returns:
             Created invoice
         """
-        invoice_data = {
-            "merchant_id": str(merchant_id),
-            "customer_id": str(data.customer_id),
-            "amount": data.amount,
-            "currency": data.currency,
-            "description": data.description,
-            "status": "PENDING"
-        }
+        invoice_data = self._new_row(data, merchant_id)
         
         try:
-            result = supabase.table("invoices").insert(invoice_data).execute()
+            result = await db.table("invoices").insert(invoice_data).execute()
             invoice = result.data[0]
             
-            logger.info(f"invoice_created - invoice_id={invoice['id']}, merchant_id={str(merchant_id)}, amount={invoice['amount']}")
+            logger.info("invoice_created", invoice_id=invoice['id'], merchant_id=merchant_id, amount=invoice['amount'])
             
-            return InvoiceResponse(**invoice)
+            return InvoiceResponse.from_row(invoice)
+            
+        except Exception as e:
+            logger.error("invoice_creation_failed", error=str(e))
+            raise
+    
+    async def create_many(self, items: List[InvoiceCreate], merchant_id: UUID) -> List[InvoiceResponse]:
+        """
+        Create several invoices with a single multi-row INSERT (all or none).
+        
+        Args:
+            items: Invoice creation data
+            merchant_id: Merchant ID from API key
             
+        Returns:
+            Created invoices, in the order of items
+        """
+        rows = [self._new_row(data, merchant_id) for data in items]
+        
+        try:
+            result = await db.table("invoices").insert(rows).execute()
         except Exception as e:
-            logger.error(f"invoice_creation_failed - error={str(e)}")
+            logger.error("invoice_bulk_insert_failed", merchant_id=merchant_id, rows=len(rows), error=str(e))
             raise
+        
+        logger.info("invoices_created", merchant_id=merchant_id, count=len(result.data))
+        return [InvoiceResponse.from_row(invoice) for invoice in result.data]
+    
+    @staticmethod
+    def _new_row(data: InvoiceCreate, merchant_id: UUID) -> dict:
+        """Row inserted for a new invoice (merchant comes from the API key, status is PENDING)."""
+        return {
+            "merchant_id": str(merchant_id),
+            "customer_id": str(data.customer_id),
+            "amount": data.amount,
+            "currency": data.currency,
+            "description": data.description,
+            "status": "PENDING"
+        }
     
     async def get(self, invoice_id: UUID, merchant_id: UUID) -> InvoiceResponse:
         """
@@ -63,7 +95,7 @@ class InvoiceService:
             InvoiceNotFoundError: If invoice not found
         """
         try:
-            result = supabase.table("invoices")\
+            result = await db.table("invoices")\
                 .select("*")\
                 .eq("id", str(invoice_id))\
                 .eq("merchant_id", str(merchant_id))\
@@ -72,12 +104,12 @@ class InvoiceService:
             if not result.data:
                 raise InvoiceNotFoundError(str(invoice_id))
             
-            return InvoiceResponse(**result.data[0])
+            return InvoiceResponse.from_row(result.data[0])
             
         except InvoiceNotFoundError:
             raise
         except Exception as e:
-            logger.error(f"invoice_get_failed - invoice_id={str(invoice_id)}, error={str(e)}")
+            logger.error("invoice_get_failed", invoice_id=invoice_id, error=str(e))
             raise
     
     async def list(
@@ -85,37 +117,106 @@ class InvoiceService:
         merchant_id: UUID,
         status: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
-    ) -> List[InvoiceResponse]:
+        cursor: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> Tuple[List[InvoiceResponse], Optional[str]]:
         """
-        List invoices for a merchant.
+        List invoices for a merchant, newest first, with keyset pagination.
         
         Args:
             merchant_id: Merchant ID
             status: Optional status filter
             limit: Max results
-            offset: Pagination offset
+            cursor: next_cursor of the previous page
+            created_from: Only invoices created at or after this instant
+            created_to: Only invoices created before this instant
             
         Returns:
-            List of invoices
+            Tuple of (invoices, next_cursor); next_cursor is None on the last page
+            
+        Raises:
+            ValidationError: If the cursor is malformed
         """
+        query = self._filtered(db.table("invoices").select("*"), merchant_id, status, created_from, created_to)
+        # One extra row tells whether another page exists
+        query = apply_keyset(query, cursor).limit(limit + 1)
+        
         try:
-            query = supabase.table("invoices")\
-                .select("*")\
-                .eq("merchant_id", str(merchant_id))\
-                .order("created_at", desc=True)\
-                .range(offset, offset + limit - 1)
-            
-            if status:
-                query = query.eq("status", status)
-            
-            result = query.execute()
-            
-            return [InvoiceResponse(**invoice) for invoice in result.data]
+            result = await query.execute()
+        except Exception as e:
+            logger.error("invoice_list_failed", merchant_id=merchant_id, error=str(e))
+            raise
+        
+        rows = result.data[:limit]
+        next_cursor = encode_cursor(rows[-1]) if len(result.data) > limit else None
+        return [InvoiceResponse.from_row(invoice) for invoice in rows], next_cursor
+    
+    async def count(
+        self,
+        merchant_id: UUID,
+        status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        estimated: bool = True
+    ) -> int:
+        """
+        Count a merchant's invoices matching the list filters.
+        
+        Estimated counts come from the planner (cheap, approximate on large sets);
+        exact counts scan the matching rows and are cached for INVOICE_COUNT_CACHE_TTL.
+        
+        Args:
+            merchant_id: Merchant ID
+            status: Optional status filter
+            created_from: Only invoices created at or after this instant
+            created_to: Only invoices created before this instant
+            estimated: Planner estimate instead of an exact count
             
+        Returns:
+            Number of invoices
+        """
+        cache_key = None
+        if not estimated:
+            cache_key = f"count:invoices:{merchant_id}:{status}:{created_from}:{created_to}"
+            cached = await shared_cache.get(cache_key)
+            if cached is not MISSING:
+                return cached
+        
+        method = CountMethod.estimated if estimated else CountMethod.exact
+        query = self._filtered(
+            db.table("invoices").select("id", count=method, head=True),
+            merchant_id, status, created_from, created_to
+        )
+        
+        try:
+            result = await query.execute()
         except Exception as e:
-            logger.error(f"invoice_list_failed - merchant_id={str(merchant_id)}, error={str(e)}")
+            logger.error("invoice_count_failed", merchant_id=merchant_id, error=str(e))
             raise
+        
+        total = result.count or 0
+        if cache_key is not None:
+            await shared_cache.set(cache_key, total, ttl=settings.invoice_count_cache_ttl)
+        return total
+    
+    @staticmethod
+    def _filtered(
+        query: Any,
+        merchant_id: UUID,
+        status: Optional[str],
+        created_from: Optional[datetime],
+        created_to: Optional[datetime]
+    ) -> Any:
+        """Apply the merchant, status and created_at range filters."""
+        query = query.eq("merchant_id", str(merchant_id))
+        if status:
+            query = query.eq("status", status)
+        if created_from:
+            query = query.gte("created_at", created_from.isoformat())
+        if created_to:
+            query = query.lt("created_at", created_to.isoformat())
+        return query
     
     async def update_status(
         self,
@@ -126,6 +227,10 @@ class InvoiceService:
         """
         Update invoice status with state machine validation.
         
+        Compare-and-set in a single statement: the UPDATE only matches rows whose
+        current status is an allowed source state (from INVOICE_TRANSITIONS),
+        so concurrent payments on the same invoice cannot both succeed.
+        
         Args:
             invoice_id: Invoice ID
             new_status: New status
@@ -138,41 +243,47 @@ class InvoiceService:
             InvoiceNotFoundError: If invoice not found
             InvalidStateTransitionError: If transition is invalid
         """
-        # Get current invoice
-        query = supabase.table("invoices")\
-            .select("*")\
+        source_statuses = get_invoice_source_states(new_status)
+        
+        if source_statuses:
+            try:
+                update_data = {
+                    "status": new_status,
+                    "updated_at": datetime.utcnow().isoformat()
+                }
+                
+                query = db.table("invoices")\
+                    .update(update_data)\
+                    .eq("id", str(invoice_id))\
+                    .in_("status", source_statuses)
+                
+                if merchant_id:
+                    query = query.eq("merchant_id", str(merchant_id))
+                
+                result = await query.execute()
+                
+            except Exception as e:
+                logger.error("invoice_status_update_failed", invoice_id=invoice_id, error=str(e))
+                raise
+            
+            if result.data:
+                logger.info(
+                    "invoice_status_updated",
+                    invoice_id=invoice_id, from_status='|'.join(source_statuses), to_status=new_status
+                )
+                return InvoiceResponse.from_row(result.data[0])
+        
+        # No row matched: find out whether the invoice is missing or in the wrong state
+        query = db.table("invoices")\
+            .select("status")\
             .eq("id", str(invoice_id))
         
         if merchant_id:
             query = query.eq("merchant_id", str(merchant_id))
         
-        result = query.execute()
+        result = await query.execute()
         
         if not result.data:
             raise InvoiceNotFoundError(str(invoice_id))
         
-        invoice = result.data[0]
-        current_status = invoice["status"]
-        
-        # Validate state transition
-        validate_invoice_transition(current_status, new_status)
-        
-        # Update status
-        try:
-            update_data = {
-                "status": new_status,
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            
-            result = supabase.table("invoices")\
-                .update(update_data)\
-                .eq("id", str(invoice_id))\
-                .execute()
-            
-            logger.info(f"invoice_status_updated - invoice_id={str(invoice_id)}, from_status={current_status}, to_status={new_status}")
-            
-            return InvoiceResponse(**result.data[0])
-            
-        except Exception as e:
-            logger.error(f"invoice_status_update_failed - invoice_id={str(invoice_id)}, error={str(e)}")
-            raise
+        raise InvalidStateTransitionError(result.data[0]["status"], new_status)
@@ -0,0 +1,163 @@
+"""
+Merchant service - Merchant lookups and per-merchant Adiq adapters.
+"""
+from uuid import UUID
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, status
+from src.adapters.adiq import AdiqAdapter
+from src.adapters.registry import adapter_registry, credentials_fingerprint
+from src.core.cache import MISSING
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.core.shared_cache import shared_cache
+from src.db.client import db
+
+logger = get_logger(__name__)
+
+# Only the columns needed to build an adapter
+ADIQ_CREDENTIAL_COLUMNS = "id, adiq_client_id, adiq_client_secret, adiq_seller_id, adiq_environment"
+
+
+def credentials_version_key(merchant_id: UUID) -> str:
+    """Shared cache key holding the current credentials fingerprint of a merchant."""
+    return f"adiq_credentials:{merchant_id}"
+
+
+def merchant_not_found_error() -> HTTPException:
+    """Error returned when the authenticated merchant no longer exists."""
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Merchant não encontrado"
+    )
+
+
+def missing_adiq_credentials_error() -> HTTPException:
+    """Error returned when the merchant has no Adiq credentials configured."""
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=(
+            "Merchant não possui credenciais da Adiq configuradas. "
+            "Registre-se via POST /v1/merchants/register-adiq antes de processar pagamentos."
+        )
+    )
+
+
+class MerchantService:
+    """Service for merchant operations."""
+    
+    async def get_adiq_adapter(self, merchant_id: UUID) -> AdiqAdapter:
+        """
+        Get AdiqAdapter with merchant-specific credentials.
+        Served from the adapter registry while its credentials fingerprint matches
+        the one in the shared cache (another worker may have changed them); the
+        database is only read on a miss or a mismatch.
+        REQUIRES merchant to have Adiq credentials configured.
+        
+        Args:
+            merchant_id: Merchant ID
+            
+        Returns:
+            Configured AdiqAdapter
+            
+        Raises:
+            HTTPException: If merchant not found or missing Adiq credentials
+        """
+        adapter = adapter_registry.get(str(merchant_id))
+        if adapter is not None:
+            current = await self._shared_fingerprint(merchant_id)
+            if current is None or current == adapter_registry.fingerprint(str(merchant_id)):
+                return adapter
+            if current:
+                logger.info("adiq_adapter_stale", merchant_id=merchant_id)
+        
+        # Fetch merchant from database
+        result = await db.table("merchants")\
+            .select(ADIQ_CREDENTIAL_COLUMNS)\
+            .eq("id", str(merchant_id))\
+            .execute()
+        
+        if not result.data:
+            logger.error("merchant_not_found", merchant_id=merchant_id)
+            raise merchant_not_found_error()
+        
+        merchant = result.data[0]
+        
+        # Get merchant credentials
+        client_id = merchant.get("adiq_client_id")
+        client_secret = merchant.get("adiq_client_secret")
+        seller_id = merchant.get("adiq_seller_id")
+        
+        # VALIDATE: Merchant MUST have Adiq credentials
+        if not client_id or not client_secret or not seller_id:
+            logger.error(
+                "merchant_missing_adiq_credentials",
+                merchant_id=merchant_id,
+                has_client_id=bool(client_id),
+                has_client_secret=bool(client_secret),
+                has_seller_id=bool(seller_id)
+            )
+            raise missing_adiq_credentials_error()
+        
+        logger.info(
+            "creating_adiq_adapter",
+            merchant_id=merchant_id, seller_id=seller_id, env=merchant.get('adiq_environment', 'hml')
+        )
+        
+        adapter = adapter_registry.put(str(merchant_id), merchant)
+        await self._publish_fingerprint(merchant_id, merchant)
+        return adapter
+    
+    def get_adiq_adapter_for(self, merchant_id: UUID, merchant: Dict[str, Any]) -> AdiqAdapter:
+        """
+        Get AdiqAdapter for a merchant row already loaded by the caller
+        (e.g. returned by the begin_payment procedure). Reuses the registry
+        entry while the credentials fingerprint is unchanged.
+        
+        Args:
+            merchant_id: Merchant ID
+            merchant: Merchant row with adiq_* columns
+            
+        Returns:
+            Configured AdiqAdapter
+        """
+        return adapter_registry.put(str(merchant_id), merchant)
+    
+    async def invalidate_adiq_adapter(self, merchant_id: UUID, merchant: Dict[str, Any]) -> None:
+        """
+        Drop the cached adapter after the merchant's Adiq credentials change and
+        publish the new fingerprint, so every worker rebuilds its adapter.
+        
+        Args:
+            merchant_id: Merchant ID
+            merchant: Updated merchant row with adiq_* columns
+        """
+        adapter_registry.invalidate(str(merchant_id))
+        await self._publish_fingerprint(merchant_id, merchant)
+    
+    async def _shared_fingerprint(self, merchant_id: UUID) -> Optional[str]:
+        """
+        Current credentials fingerprint from the shared cache.
+        
+        Args:
+            merchant_id: Merchant ID
+            
+        Returns:
+            Fingerprint, "" if unknown (forces a database read), None if the cache is unavailable
+        """
+        try:
+            fingerprint = await shared_cache.get(credentials_version_key(merchant_id))
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+            return None
+        return "" if fingerprint is MISSING else fingerprint
+    
+    async def _publish_fingerprint(self, merchant_id: UUID, merchant: Dict[str, Any]) -> None:
+        """Store the merchant's credentials fingerprint in the shared cache."""
+        try:
+            await shared_cache.set(
+                credentials_version_key(merchant_id),
+                credentials_fingerprint(merchant),
+                ttl=settings.adiq_credentials_version_ttl
+            )
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
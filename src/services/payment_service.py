@@ -1,89 +1,55 @@
 """
 Payment service - Business logic for payment processing.
 """
+import itertools
+import time
 from uuid import UUID, uuid4
 from typing import Optional, Dict, Any
-from datetime import datetime
+from postgrest.exceptions import APIError
 from src.schemas.payment import PaymentCreate, PaymentResponse
-from src.core.exceptions import InvoiceNotFoundError, InvalidStateTransitionError, AdiqPaymentError
+from src.core.exceptions import (
+    InvoiceNotFoundError,
+    InvalidStateTransitionError,
+    AdiqOutcomeUnknownError,
+    AdiqPaymentError,
+    AdiqUnavailableError,
+)
+from src.adapters.registry import adapter_registry
 from src.core.logger import get_logger
-from src.adapters.adiq import AdiqAdapter
-from src.db.client import supabase
+from src.core.tracing import tracer
+from src.db.client import db
 from src.services.invoice_service import InvoiceService
+from src.services.merchant_service import (
+    MerchantService,
+    merchant_not_found_error,
+    missing_adiq_credentials_error,
+)
 
 logger = get_logger(__name__)
 
+# Adiq return codes of an approval (anything else without authorizationCode is a decline)
+APPROVED_RETURN_CODES = ("0", "00")
+
+# Suffix keeping order numbers unique for payments started in the same millisecond (batches)
+_order_sequence = itertools.count()
+
+
+def next_order_number() -> str:
+    """
+    Generate an Adiq order number (max 13 digits): millisecond clock + 3-digit sequence.
+    
+    Returns:
+        Order number
+    """
+    return f"{(int(time.time() * 1000) * 1000 + next(_order_sequence) % 1000) % 10000000000000}"
+
 
 class PaymentService:
     """Service for payment operations with per-merchant Adiq credentials."""
     
     def __init__(self):
         self.invoice_service = InvoiceService()
-    
-    async def _get_merchant_adiq_adapter(self, merchant_id: UUID) -> AdiqAdapter:
-        """
-        Get AdiqAdapter with merchant-specific credentials.
-        REQUIRES merchant to have Adiq credentials configured.
-        
-        Args:
-            merchant_id: Merchant ID
-            
-        Returns:
-            Configured AdiqAdapter
-            
-        Raises:
-            HTTPException: If merchant not found or missing Adiq credentials
-        """
-        from fastapi import HTTPException, status
-        
-        # Fetch merchant from database
-        result = supabase.table("merchants").select("*").eq("id", str(merchant_id)).execute()
-        
-        if not result.data:
-            logger.error(f"merchant_not_found - merchant_id={merchant_id}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Merchant não encontrado"
-            )
-        
-        merchant = result.data[0]
-        
-        # Get merchant credentials
-        client_id = merchant.get("adiq_client_id")
-        client_secret = merchant.get("adiq_client_secret")
-        seller_id = merchant.get("adiq_seller_id")
-        
-        # VALIDATE: Merchant MUST have Adiq credentials
-        if not client_id or not client_secret or not seller_id:
-            logger.error(
-                f"merchant_missing_adiq_credentials - merchant_id={merchant_id}, "
-                f"has_client_id={bool(client_id)}, has_client_secret={bool(client_secret)}, "
-                f"has_seller_id={bool(seller_id)}"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=(
-                    "Merchant não possui credenciais da Adiq configuradas. "
-                    "Registre-se via POST /v1/merchants/register-adiq antes de processar pagamentos."
-                )
-            )
-        
-        # Determine base URL based on merchant environment
-        adiq_env = merchant.get("adiq_environment", "hml")
-        base_url = "https://ecommerce.adiq.io" if adiq_env == "prd" else "https://ecommerce-hml.adiq.io"
-        
-        logger.info(
-            f"creating_adiq_adapter - merchant_id={merchant_id}, "
-            f"seller_id={seller_id}, env={adiq_env}"
-        )
-        
-        # Create adapter with REQUIRED credentials
-        return AdiqAdapter(
-            client_id=client_id,
-            client_secret=client_secret,
-            seller_id=seller_id,
-            base_url=base_url
-        )
+        self.merchant_service = MerchantService()
     
     async def process_payment(
         self,
@@ -105,61 +71,56 @@ class PaymentService:
         Raises:
             InvoiceNotFoundError: If invoice not found
             AdiqPaymentError: If payment fails
+            AdiqUnavailableError: If Adiq's circuit breaker is open (the invoice is back to PENDING)
+            AdiqOutcomeUnknownError: If Adiq's answer was lost (timeout, dropped connection, 5xx)
+                or not understood; the payment is left PROCESSING for the reconciler
         """
-        # 1. Get AdiqAdapter with merchant credentials
-        adiq = await self._get_merchant_adiq_adapter(merchant_id)
-        
-        # 2. Get and validate invoice
-        invoice = await self.invoice_service.get(data.invoice_id, merchant_id)
+        # 0. Fail fast while Adiq is known to be down: the invoice stays PENDING
+        #    (only possible when the merchant's adapter is cached, i.e. its environment is known)
+        cached_adapter = adapter_registry.get(str(merchant_id))
+        if cached_adapter is not None:
+            operations = ("tokenize_card", "create_payment") if data.pan else ("create_payment",)
+            cached_adapter.ensure_available(*operations)
         
-        if invoice.status != "PENDING":
-            raise InvalidStateTransitionError(invoice.status, "PROCESSING")
+        # Generate unique order number (max 13 chars)
+        order_number = next_order_number()  # 13 dígitos
         
-        # 2. Update invoice to PROCESSING
-        await self.invoice_service.update_status(data.invoice_id, "PROCESSING")
-        
-        # 3. Create transaction record
+        # 1. Begin payment: validate merchant, lock invoice, PENDING → PROCESSING,
+        #    create CREATED transaction (single DB round trip)
         transaction_id = uuid4()
-        transaction_data = {
-            "id": str(transaction_id),
-            "invoice_id": str(data.invoice_id),
-            "merchant_id": str(merchant_id),
-            "amount": invoice.amount,
-            "currency": invoice.currency,
-            "installments": data.installments,
-            "status": "CREATED"
-        }
+        begun = await self._begin_payment(data, merchant_id, transaction_id, order_number)
+        invoice = begun["invoice"]
+        transaction = begun["transaction"]
         
-        try:
-            supabase.table("transactions").insert(transaction_data).execute()
-        except Exception as e:
-            logger.error(f"transaction_creation_failed - error={str(e)}")
-            raise
+        # 2. Get AdiqAdapter with merchant credentials returned by begin_payment
+        with tracer.span("payment.get_adapter"):
+            adiq = self.merchant_service.get_adiq_adapter_for(merchant_id, begun["merchant"])
         
-        # 4. Tokenize card if PAN was provided
+        # 3. Tokenize card if PAN was provided
         card_token = data.card_token
         if data.pan:
-            logger.info(f"tokenizing_pan - merchant_id={merchant_id}, last4={data.pan[-4:]}")
+            logger.info("tokenizing_pan", merchant_id=merchant_id, last4=data.pan[-4:])
             try:
-                token_result = await adiq.tokenize_card(
-                    pan=data.pan,
-                    expiration_month=data.expiration_month,
-                    expiration_year=data.expiration_year,
-                    brand=data.brand
-                )
+                with tracer.span("payment.tokenize", **{"card.brand": data.brand}):
+                    token_result = await adiq.tokenize_card(
+                        pan=data.pan,
+                        expiration_month=data.expiration_month,
+                        expiration_year=data.expiration_year,
+                        brand=data.brand
+                    )
                 card_token = token_result['numberToken']
-                logger.info(f"pan_tokenized - token={card_token[:10]}...")
+                logger.info("pan_tokenized", merchant_id=merchant_id, last4=data.pan[-4:])
+            except AdiqUnavailableError:
+                # Adiq was not called: undo begin_payment so the client can retry after Retry-After
+                await self._abort_payment(transaction_id)
+                raise
             except Exception as e:
-                logger.error(f"tokenization_failed - error={str(e)}")
-                await self.invoice_service.update_status(data.invoice_id, "FAILED")
+                logger.error("tokenization_failed", error=str(e))
+                await self._finish_payment(transaction_id, "DECLINED", "FAILED")
                 raise AdiqPaymentError(f"Failed to tokenize card: {str(e)}")
         
-        # 5. Process payment with Adiq
+        # 4. Process payment with Adiq
         try:
-            # Generate unique order number (max 13 chars)
-            import time
-            order_number = f"{int(time.time() * 1000) % 10000000000000}"  # 13 dígitos
-            
             # Prepare customer data for antifraud (obrigatório para contas com antifraude)
             if customer_data:
                 adiq_customer = {
@@ -190,93 +151,214 @@ class PaymentService:
                 }
             
             # Call Adiq with merchant-specific adapter
-            payment_result = await adiq.create_payment(
-                amount=invoice.amount,
-                number_token=card_token,  # Use tokenized card
-                brand=data.brand or "visa",  # Use provided brand or default
-                cardholder_name=data.cardholder_name,
-                expiration_month=data.expiration_month,
-                expiration_year=data.expiration_year,
-                security_code=data.security_code,
-                order_number=order_number,
-                installments=data.installments,
-                capture_type=data.capture_type,
-                customer=adiq_customer
+            with tracer.span("payment.authorize", **{
+                "payment.amount": invoice["amount"],
+                "payment.installments": data.installments,
+                "payment.capture_type": data.capture_type
+            }):
+                payment_result = await adiq.create_payment(
+                    amount=invoice["amount"],
+                    number_token=card_token,  # Use tokenized card
+                    brand=data.brand or "visa",  # Use provided brand or default
+                    cardholder_name=data.cardholder_name,
+                    expiration_month=data.expiration_month,
+                    expiration_year=data.expiration_year,
+                    security_code=data.security_code,
+                    order_number=order_number,
+                    installments=data.installments,
+                    capture_type=data.capture_type,
+                    customer=adiq_customer
+                )
+            
+        except AdiqUnavailableError:
+            await self._abort_payment(transaction_id)
+            raise
+        except AdiqOutcomeUnknownError:
+            # Adiq may have approved the charge: leave CREATED/PROCESSING for the reconciler
+            logger.warning(
+                "payment_outcome_unknown",
+                transaction_id=transaction_id, invoice_id=data.invoice_id, order_number=order_number
+            )
+            raise
+        except Exception as e:
+            # Payment failed - update statuses
+            logger.error(
+                "payment_processing_failed",
+                transaction_id=transaction_id, invoice_id=data.invoice_id, error=str(e)
             )
             
-            # 5. Update transaction with Adiq response
-            # A resposta vem dentro de paymentAuthorization
-            payment_auth = payment_result.get("paymentAuthorization", {})
-            adiq_status = payment_auth.get("returnCode", "")
+            # Transaction → DECLINED and invoice → FAILED together
+            await self._finish_payment(transaction_id, "DECLINED", "FAILED")
             
-            # Se tem authorization code, foi aprovado
-            # Verificar se é auto-captura (ac) ou pré-auth (pa)
-            if payment_auth.get("authorizationCode"):
-                if data.capture_type == "ac":
-                    transaction_status = "CAPTURED"  # Auto-captura = já capturado
-                else:
-                    transaction_status = "AUTHORIZED"  # Pré-auth = apenas autorizado
+            raise
+        
+        # 5. Map Adiq response
+        # A resposta vem dentro de paymentAuthorization
+        payment_auth = payment_result.get("paymentAuthorization", {})
+        adiq_status = payment_auth.get("returnCode", "")
+        
+        # Se tem authorization code, foi aprovado
+        # Verificar se é auto-captura (ac) ou pré-auth (pa)
+        if payment_auth.get("authorizationCode"):
+            if data.capture_type == "ac":
+                transaction_status = "CAPTURED"  # Auto-captura = já capturado
             else:
-                transaction_status = self._map_adiq_status(adiq_status)
-            
-            update_data = {
-                "payment_id": payment_auth.get("paymentId"),
-                "authorization_code": payment_auth.get("authorizationCode"),
-                "nsu": payment_auth.get("nsu"),
-                "tid": payment_auth.get("paymentId"),  # TID é o paymentId
-                "status": transaction_status,
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            
-            if transaction_status == "AUTHORIZED":
-                update_data["authorized_at"] = datetime.utcnow().isoformat()
-            elif transaction_status == "CAPTURED":
-                update_data["captured_at"] = datetime.utcnow().isoformat()
-            
-            supabase.table("transactions")\
-                .update(update_data)\
-                .eq("id", str(transaction_id))\
-                .execute()
+                transaction_status = "AUTHORIZED"  # Pré-auth = apenas autorizado
+        else:
+            transaction_status = self._map_adiq_status(adiq_status)
+            if transaction_status == "CREATED":
+                if adiq_status and adiq_status not in APPROVED_RETURN_CODES:
+                    transaction_status = "DECLINED"  # Código de retorno de recusa explícito
+                else:
+                    # Neither approved nor declined: leave it for the reconciler
+                    logger.warning(
+                        "payment_outcome_unknown",
+                        transaction_id=transaction_id, invoice_id=data.invoice_id, return_code=adiq_status
+                    )
+                    raise AdiqOutcomeUnknownError("create_payment", "no authorization code nor decline code")
+        
+        invoice_status = "PAID" if transaction_status in ["CAPTURED", "AUTHORIZED"] else "FAILED"
+        
+        # 6. Finish payment: transaction result + final invoice status (single DB round trip)
+        # Se falhar aqui, a transação fica CREATED/PROCESSING para a reconciliação
+        finished = await self._finish_payment(
+            transaction_id,
+            transaction_status,
+            invoice_status,
+            payment_auth=payment_auth
+        )
+        transaction = finished["transaction"]
+        
+        # 7. Return payment response
+        return PaymentResponse(
+            id=transaction_id,
+            invoice_id=data.invoice_id,
+            transaction_id=transaction_id,
+            status=transaction_status,
+            amount=invoice["amount"],
+            installments=data.installments,
+            authorization_code=payment_auth.get("authorizationCode"),
+            payment_id=payment_auth.get("paymentId"),
+            nsu=payment_auth.get("nsu"),
+            tid=payment_auth.get("paymentId"),
+            created_at=transaction["created_at"],
+            updated_at=transaction["updated_at"]
+        )
+    
+    async def _begin_payment(
+        self,
+        data: PaymentCreate,
+        merchant_id: UUID,
+        transaction_id: UUID,
+        order_number: str
+    ) -> Dict[str, Any]:
+        """
+        Call the begin_payment procedure.
+        
+        Args:
+            data: Payment creation data
+            merchant_id: Merchant ID
+            transaction_id: ID for the new transaction
+            order_number: Adiq order number stored on the invoice
             
-            # 6. Update invoice status based on payment result
-            if transaction_status in ["CAPTURED", "AUTHORIZED"]:
-                await self.invoice_service.update_status(data.invoice_id, "PAID")
-            else:
-                await self.invoice_service.update_status(data.invoice_id, "FAILED")
+        Returns:
+            Dict with invoice, transaction and merchant (Adiq credentials) rows
             
-            # 7. Return payment response
-            return PaymentResponse(
-                id=transaction_id,
-                invoice_id=data.invoice_id,
-                transaction_id=transaction_id,
-                status=transaction_status,
-                amount=invoice.amount,
-                installments=data.installments,
-                authorization_code=payment_auth.get("authorizationCode"),
-                payment_id=payment_auth.get("paymentId"),
-                nsu=payment_auth.get("nsu"),
-                tid=payment_auth.get("paymentId"),
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
-            )
+        Raises:
+            InvoiceNotFoundError: If invoice not found
+            InvalidStateTransitionError: If invoice is not PENDING
+            HTTPException: If merchant not found or missing Adiq credentials
+        """
+        try:
+            with tracer.span("payment.begin", **{"invoice.id": str(data.invoice_id), "merchant.id": str(merchant_id)}):
+                result = await db.rpc("begin_payment", {
+                    "p_merchant_id": str(merchant_id),
+                    "p_invoice_id": str(data.invoice_id),
+                    "p_transaction_id": str(transaction_id),
+                    "p_installments": data.installments,
+                    "p_order_number": order_number,
+                    "p_card_brand": data.brand,
+                    "p_card_last4": data.pan[-4:] if data.pan else None
+                }).execute()
+        except APIError as e:
+            if e.message == "INVOICE_NOT_FOUND":
+                raise InvoiceNotFoundError(str(data.invoice_id))
+            if e.message == "INVALID_STATE_TRANSITION":
+                raise InvalidStateTransitionError(e.details or "UNKNOWN", "PROCESSING")
+            if e.message == "MERCHANT_NOT_FOUND":
+                raise merchant_not_found_error()
+            if e.message == "MERCHANT_MISSING_ADIQ_CREDENTIALS":
+                raise missing_adiq_credentials_error()
+            logger.error("begin_payment_failed", invoice_id=data.invoice_id, error=str(e))
+            raise
+        
+        logger.info("payment_begun", invoice_id=data.invoice_id, transaction_id=transaction_id, merchant_id=merchant_id)
+        return result.data
+    
+    async def _finish_payment(
+        self,
+        transaction_id: UUID,
+        transaction_status: str,
+        invoice_status: str,
+        payment_auth: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Call the finish_payment procedure.
+        
+        Args:
+            transaction_id: Transaction ID
+            transaction_status: Final transaction status
+            invoice_status: Final invoice status (PAID or FAILED)
+            payment_auth: Adiq paymentAuthorization block, if any
             
+        Returns:
+            Dict with updated invoice and transaction rows
+        """
+        payment_auth = payment_auth or {}
+        
+        try:
+            with tracer.span("payment.finish", **{
+                "transaction.id": str(transaction_id),
+                "transaction.status": transaction_status,
+                "invoice.status": invoice_status
+            }):
+                result = await db.rpc("finish_payment", {
+                    "p_transaction_id": str(transaction_id),
+                    "p_transaction_status": transaction_status,
+                    "p_invoice_status": invoice_status,
+                    "p_payment_id": payment_auth.get("paymentId"),
+                    "p_authorization_code": payment_auth.get("authorizationCode"),
+                    "p_nsu": payment_auth.get("nsu"),
+                    "p_tid": payment_auth.get("paymentId")  # TID é o paymentId
+                }).execute()
         except Exception as e:
-            # Payment failed - update statuses
             logger.error(
-                f"payment_processing_failed - transaction_id={str(transaction_id)}, "
-                f"invoice_id={str(data.invoice_id)}, error={str(e)}"
+                "finish_payment_failed",
+                transaction_id=transaction_id, status=transaction_status, error=str(e)
             )
-            
-            # Update transaction to DECLINED
-            supabase.table("transactions")\
-                .update({"status": "DECLINED", "updated_at": datetime.utcnow().isoformat()})\
-                .eq("id", str(transaction_id))\
-                .execute()
-            
-            # Update invoice to FAILED
-            await self.invoice_service.update_status(data.invoice_id, "FAILED")
-            
             raise
+        
+        logger.info(
+            "payment_finished",
+            transaction_id=transaction_id, status=transaction_status, invoice_status=invoice_status
+        )
+        return result.data
+    
+    async def _abort_payment(self, transaction_id: UUID) -> None:
+        """
+        Call the abort_payment procedure (Adiq was never called).
+        
+        Args:
+            transaction_id: CREATED transaction to drop; its invoice goes back to PENDING
+        """
+        try:
+            with tracer.span("payment.abort", **{"transaction.id": str(transaction_id)}):
+                await db.rpc("abort_payment", {"p_transaction_id": str(transaction_id)}).execute()
+        except Exception as e:
+            logger.error("abort_payment_failed", transaction_id=transaction_id, error=str(e))
+            raise
+        
+        logger.info("payment_aborted", transaction_id=transaction_id)
     
     def _map_adiq_status(self, adiq_status: str) -> str:
         """
@@ -311,7 +393,7 @@ class PaymentService:
             Payment response
         """
         try:
-            result = supabase.table("transactions")\
+            result = await db.table("transactions")\
                 .select("*")\
                 .eq("id", str(transaction_id))\
                 .eq("merchant_id", str(merchant_id))\
@@ -322,21 +404,9 @@ class PaymentService:
             
             transaction = result.data[0]
             
-            return PaymentResponse(
-                id=UUID(transaction["id"]),
-                invoice_id=UUID(transaction["invoice_id"]),
-                transaction_id=UUID(transaction["id"]),
-                status=transaction["status"],
-                amount=transaction["amount"],
-                installments=transaction["installments"],
-                authorization_code=transaction.get("authorization_code"),
-                payment_id=transaction.get("payment_id"),
-                nsu=transaction.get("nsu"),
-                tid=transaction.get("tid"),
-                created_at=datetime.fromisoformat(transaction["created_at"]),
-                updated_at=datetime.fromisoformat(transaction["updated_at"])
-            )
+            # Trusted DB row: no validation
+            return PaymentResponse.from_row({**transaction, "transaction_id": transaction["id"]})
             
         except Exception as e:
-            logger.error(f"get_payment_failed - transaction_id={str(transaction_id)}, error={str(e)}")
+            logger.error("get_payment_failed", transaction_id=transaction_id, error=str(e))
             raise
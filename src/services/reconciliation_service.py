@@ -0,0 +1,369 @@
+"""
+Payment reconciler - settles transactions and invoices nobody finished.
+
+A payment whose process dies (or whose finish_payment fails) after Adiq
+answered leaves the transaction CREATED and the invoice PROCESSING until a
+webhook arrives, which may never happen. Every RECONCILE_INTERVAL one worker
+(shared cache lock) scans, in keyset batches of RECONCILE_BATCH_SIZE:
+
+1. CREATED transactions older than RECONCILE_STALE_AFTER: the Adiq payment_id
+   is taken from the transaction or, when finish_payment never stored it,
+   from a received webhook for the invoice's orderNumber; the payment is then
+   read with AdiqAdapter.get_payment (at most RECONCILE_CONCURRENCY lookups per
+   merchant, adapters and tokens from the registry). Statuses the state
+   machine allows are applied with one reconcile_transactions call per batch.
+2. PROCESSING invoices whose transaction already has a final status (e.g. a
+   webhook failed to update the invoice): fixed with one UPDATE per target
+   status and batch.
+
+Progress (counters per batch) is logged, exported as metrics and kept in the
+shared cache for GET /health/reconciler.
+"""
+import asyncio
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+from src.core.cache import MISSING
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.core.metrics import RECONCILER_ROWS
+from src.core.pagination import apply_keyset, encode_cursor
+from src.core.shared_cache import shared_cache
+from src.core.state_machine import can_reach_transaction, get_invoice_source_states
+from src.db.client import db
+from src.services.merchant_service import MerchantService
+
+logger = get_logger(__name__)
+
+PROGRESS_KEY = "reconciler:progress"
+LOCK_KEY = "lock:reconciler"
+
+# Adiq payment status -> internal transaction status (others: still pending)
+ADIQ_STATUSES = {
+    "Authorized": "AUTHORIZED",
+    "Captured": "CAPTURED",
+    "Settled": "SETTLED",
+    "Declined": "DECLINED",
+    "Cancelled": "CANCELLED",
+    "Refunded": "REFUNDED"
+}
+
+# Final invoice status for a transaction status (same rule as finish_payment)
+INVOICE_STATUSES = {
+    "AUTHORIZED": "PAID",
+    "CAPTURED": "PAID",
+    "SETTLED": "PAID",
+    "REFUNDED": "PAID",  # Was paid, then refunded
+    "DECLINED": "FAILED",
+    "CANCELLED": "FAILED"
+}
+
+
+@dataclass
+class ReconcileReport:
+    """Counters of one reconciler run."""
+    started_at: str
+    finished_at: Optional[str] = None
+    status: str = "running"
+    error: Optional[str] = None
+    transactions: Dict[str, int] = field(default_factory=lambda: {
+        "scanned": 0, "updated": 0, "superseded": 0, "pending": 0, "unresolved": 0, "errors": 0
+    })
+    invoices: Dict[str, int] = field(default_factory=lambda: {
+        "scanned": 0, "updated": 0, "skipped": 0
+    })
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class PaymentReconciler:
+    """Background reconciliation of stale CREATED transactions and PROCESSING invoices."""
+    
+    def __init__(self):
+        self.merchant_service = MerchantService()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._manual: Optional[asyncio.Task] = None
+        self._run_lock = asyncio.Lock()
+    
+    @property
+    def running(self) -> bool:
+        """Whether the background loop is running."""
+        return self._task is not None and not self._task.done()
+    
+    async def start(self) -> None:
+        """Start the background loop (no-op if RECONCILE_ENABLED is false)."""
+        if self.running or not settings.reconcile_enabled:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info("reconciler_started", interval=settings.reconcile_interval)
+    
+    async def stop(self) -> None:
+        """Stop the background loop; an interrupted run resumes on the next start."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("reconciler_stopped")
+    
+    def trigger(self) -> bool:
+        """
+        Start a run now, in the background (admin endpoint).
+        
+        Returns:
+            False if this worker is already running one
+        """
+        if self._run_lock.locked():
+            return False
+        self._manual = asyncio.create_task(self._run_locked())
+        return True
+    
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.reconcile_interval)
+            await self._run_locked()
+    
+    async def _run_locked(self) -> None:
+        if not await self._acquire_lock():
+            logger.info("reconciler_run_skipped", reason="another_worker")
+            return
+        try:
+            await self.run_once()
+        finally:
+            await self._release_lock()
+    
+    async def _acquire_lock(self) -> bool:
+        """One run at a time across workers; expires if the holder dies."""
+        if not shared_cache.shared:
+            return True
+        try:
+            return await shared_cache.add(LOCK_KEY, os.getpid(), ttl=settings.reconcile_lock_ttl)
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+            return True
+    
+    async def _release_lock(self) -> None:
+        if not shared_cache.shared:
+            return
+        try:
+            await shared_cache.delete(LOCK_KEY)
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+    
+    async def run_once(self) -> ReconcileReport:
+        """
+        Reconcile every stale row once.
+        
+        Returns:
+            Report of the run (also saved for GET /health/reconciler)
+        """
+        async with self._run_lock:
+            now = datetime.utcnow()
+            stale_before = _timestamp(now - timedelta(seconds=settings.reconcile_stale_after))
+            oldest = _timestamp(now - timedelta(seconds=settings.reconcile_lookback))
+            report = ReconcileReport(started_at=now.isoformat())
+            await self._save(report)
+            
+            try:
+                await self._reconcile_transactions(report, stale_before, oldest)
+                await self._reconcile_invoices(report, stale_before, oldest)
+                report.status = "completed"
+            except Exception as e:
+                logger.error("reconciler_run_failed", error=str(e))
+                report.status = "failed"
+                report.error = str(e)
+            
+            report.finished_at = datetime.utcnow().isoformat()
+            await self._save(report)
+            logger.info(
+                "reconciler_run_finished",
+                status=report.status, transactions=report.transactions, invoices=report.invoices
+            )
+            return report
+    
+    async def _scan(
+        self,
+        table: str,
+        select: str,
+        status: str,
+        stale_column: str,
+        stale_before: str,
+        oldest: str
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Keyset batches of rows in a status, untouched since stale_before."""
+        cursor = None
+        while True:
+            query = db.table(table).select(select)\
+                .eq("status", status)\
+                .lt(stale_column, stale_before)\
+                .gte("created_at", oldest)
+            query = apply_keyset(query, cursor).limit(settings.reconcile_batch_size)
+            
+            rows = (await query.execute()).data
+            if rows:
+                yield rows
+            if len(rows) < settings.reconcile_batch_size:
+                return
+            cursor = encode_cursor(rows[-1])
+    
+    async def _reconcile_transactions(self, report: ReconcileReport, stale_before: str, oldest: str) -> None:
+        counters = report.transactions
+        batches = self._scan(
+            "transactions",
+            "id, merchant_id, invoice_id, payment_id, created_at, invoices(order_number)",
+            "CREATED", "created_at", stale_before, oldest
+        )
+        async for rows in batches:
+            payment_ids = await self._payment_ids(rows)
+            results = await asyncio.gather(*[
+                self._check(row, payment_ids.get(row["id"])) for row in rows
+            ])
+            
+            updates = []
+            for result, update in results:
+                if update:
+                    updates.append(update)
+                else:
+                    self._count(counters, "transactions", result)
+            
+            if updates:
+                response = await db.rpc("reconcile_transactions", {"p_updates": updates}).execute()
+                applied = response.data or 0
+                self._count(counters, "transactions", "updated", applied)
+                # Left CREATED since they were read (webhook or the payment itself finished them)
+                self._count(counters, "transactions", "superseded", len(updates) - applied)
+            
+            counters["scanned"] += len(rows)
+            logger.info("reconciler_transactions_batch", rows=len(rows), **counters)
+            await self._save(report)
+    
+    async def _payment_ids(self, rows: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Adiq payment_id per transaction id: stored on the row, else from a
+        received webhook carrying the invoice's orderNumber (one query per batch).
+        """
+        payment_ids = {row["id"]: row["payment_id"] for row in rows if row.get("payment_id")}
+        
+        orders = {}
+        for row in rows:
+            order_number = (row.get("invoices") or {}).get("order_number")
+            if row["id"] not in payment_ids and order_number:
+                orders[order_number] = row["id"]
+        
+        if orders:
+            result = await db.table("webhook_logs")\
+                .select("payment_id, order_number:payload->>orderNumber")\
+                .in_("payload->>orderNumber", list(orders))\
+                .not_.is_("payment_id", "null")\
+                .execute()
+            for webhook in result.data:
+                payment_ids[orders[webhook["order_number"]]] = webhook["payment_id"]
+        
+        return payment_ids
+    
+    def _semaphore(self, merchant_id: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(merchant_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.reconcile_concurrency)
+            self._semaphores[merchant_id] = semaphore
+        return semaphore
+    
+    async def _check(self, row: Dict[str, Any], payment_id: Optional[str]) -> tuple:
+        """
+        Ask Adiq for the status of one stale transaction.
+        
+        Args:
+            row: Stale transaction row
+            payment_id: Adiq payment ID, if known
+            
+        Returns:
+            Tuple of (counter name, reconcile_transactions entry or None)
+        """
+        if not payment_id:
+            # Adiq never answered, or its answer was lost and no webhook came:
+            # nothing to look up, left for an operator
+            return "unresolved", None
+        
+        try:
+            async with self._semaphore(row["merchant_id"]):
+                adapter = await self.merchant_service.get_adiq_adapter(row["merchant_id"])
+                payment = await adapter.get_payment(payment_id)
+        except Exception as e:
+            logger.warning(
+                "reconciler_lookup_failed",
+                transaction_id=row["id"], payment_id=payment_id, error=str(getattr(e, "detail", e))
+            )
+            return "errors", None
+        
+        status = ADIQ_STATUSES.get(payment.get("status"))
+        if status is None or not can_reach_transaction("CREATED", status):
+            return "pending", None
+        
+        authorization = payment.get("paymentAuthorization") or {}
+        return "updated", {
+            "id": row["id"],
+            "status": status,
+            "invoice_status": INVOICE_STATUSES.get(status),
+            "payment_id": payment_id,
+            "authorization_code": authorization.get("authorizationCode"),
+            "nsu": authorization.get("nsu")
+        }
+    
+    async def _reconcile_invoices(self, report: ReconcileReport, stale_before: str, oldest: str) -> None:
+        counters = report.invoices
+        batches = self._scan(
+            "invoices", "id, created_at, transactions(status)", "PROCESSING", "updated_at", stale_before, oldest
+        )
+        async for rows in batches:
+            targets: Dict[str, List[str]] = {}
+            for row in rows:
+                statuses = [transaction["status"] for transaction in row.get("transactions") or []]
+                # A CREATED transaction is the first pass' job
+                if not statuses or "CREATED" in statuses:
+                    self._count(counters, "invoices", "skipped")
+                    continue
+                invoice_statuses = {INVOICE_STATUSES.get(status) for status in statuses}
+                target = "PAID" if "PAID" in invoice_statuses else "FAILED"
+                targets.setdefault(target, []).append(row["id"])
+            
+            for target, invoice_ids in targets.items():
+                result = await db.table("invoices")\
+                    .update({"status": target, "updated_at": _timestamp(datetime.utcnow())})\
+                    .in_("id", invoice_ids)\
+                    .in_("status", get_invoice_source_states(target))\
+                    .execute()
+                self._count(counters, "invoices", "updated", len(result.data))
+            
+            counters["scanned"] += len(rows)
+            logger.info("reconciler_invoices_batch", rows=len(rows), **counters)
+            await self._save(report)
+    
+    @staticmethod
+    def _count(counters: Dict[str, int], table: str, result: str, amount: int = 1) -> None:
+        counters[result] += amount
+        RECONCILER_ROWS.labels(table, result).inc(amount)
+    
+    async def _save(self, report: ReconcileReport) -> None:
+        try:
+            await shared_cache.set(PROGRESS_KEY, asdict(report), ttl=max(settings.reconcile_interval * 10, 3600))
+        except Exception as e:
+            logger.warning("reconciler_progress_save_failed", error=str(e))
+    
+    async def stats(self) -> Dict[str, Any]:
+        """Latest (or current) run report, for health checks."""
+        try:
+            last_run = await shared_cache.get(PROGRESS_KEY)
+        except Exception:
+            last_run = MISSING
+        return {
+            "enabled": settings.reconcile_enabled,
+            "running": self.running,
+            "last_run": None if last_run is MISSING else last_run
+        }
+
+
+# Global instance (started with the app)
+payment_reconciler = PaymentReconciler()
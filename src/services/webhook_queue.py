@@ -0,0 +1,286 @@
+"""
+Webhook queue - Background processing of stored Adiq webhooks.
+
+The webhook endpoint only persists the raw event and enqueues it here; a pool
+of workers runs WebhookService.process_logged_webhooks. Events are already in
+webhook_logs, so anything not processed (queue overflow, crash, restart) is
+resumed from the database. Failed events are picked up again every
+WEBHOOK_RETRY_INTERVAL once their backoff elapsed.
+
+A row is processed by one process at a time: received rows are stored already
+claimed and resumed rows are claimed in the database (claim_pending_webhooks),
+so other processes skip them until the WEBHOOK_CLAIM_LEASE expires.
+
+Work is partitioned by payment_id: events for one payment are buffered together
+and handled by one worker at a time, in arrival order. Events arriving within
+WEBHOOK_COALESCE_WINDOW are applied as a single batch (one DB write).
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from src.core.config import settings
+from src.core.logger import get_logger
+from src.core.metrics import WEBHOOK_EVENTS, WEBHOOK_QUEUE_DEPTH, WEBHOOK_QUEUE_IN_FLIGHT, WEBHOOK_QUEUE_LAG
+from src.core.shared_cache import shared_cache
+from src.services.webhook_service import WebhookService
+
+logger = get_logger(__name__)
+
+
+def partition_key(webhook_log: Dict[str, Any]) -> str:
+    """Partition key for a stored webhook: its payment_id, else its own id."""
+    return webhook_log.get("payment_id") or webhook_log["id"]
+
+
+class WebhookQueue:
+    """Bounded in-process queue, partitioned by payment, with a pool of webhook workers."""
+    
+    def __init__(self, concurrency: int, max_size: int):
+        """
+        Args:
+            concurrency: Number of worker tasks
+            max_size: Max buffered events before enqueue applies back-pressure
+        """
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.service = WebhookService()
+        self._keys: Optional[asyncio.Queue] = None
+        self._buffers: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+        self._scheduled: Set[str] = set()
+        self._space: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._retrier: Optional[asyncio.Task] = None
+        self._pending_ids: Set[str] = set()
+        self._overflowed = False
+        
+        # Back-pressure metrics
+        self.buffered = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.overflowed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+    
+    @property
+    def running(self) -> bool:
+        """Whether workers are running."""
+        return bool(self._workers)
+    
+    async def start(self) -> None:
+        """Start workers and resume unprocessed webhook_logs rows."""
+        if self.running:
+            return
+        
+        # Keys queue holds each scheduled payment once, so it is unbounded;
+        # max_size applies to buffered events
+        self._keys = asyncio.Queue()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(self.concurrency)
+        ]
+        self._retrier = asyncio.create_task(self._retry_loop())
+        logger.info("webhook_queue_started", workers=self.concurrency, max_size=self.max_size)
+        
+        await self.resume_pending(exclusive=True)
+    
+    async def stop(self) -> None:
+        """Stop workers. Buffered events stay unprocessed in the DB and resume on next start."""
+        tasks = self._workers + ([self._retrier] if self._retrier else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._retrier = None
+        self._buffers.clear()
+        self._scheduled.clear()
+        self._pending_ids.clear()
+        self.buffered = 0
+        WEBHOOK_QUEUE_DEPTH.set(0)
+        logger.info("webhook_queue_stopped", processed=self.processed, failed=self.failed)
+    
+    async def enqueue(self, webhook_log: Dict[str, Any]) -> bool:
+        """
+        Queue a stored webhook for processing.
+        Waits up to WEBHOOK_ENQUEUE_TIMEOUT when the queue is full.
+        
+        Args:
+            webhook_log: Stored webhook_log row
+            
+        Returns:
+            True if queued, False if deferred (it stays in the DB for resumption)
+        """
+        if self._keys is None or webhook_log["id"] in self._pending_ids:
+            return False
+        
+        if self.buffered >= self.max_size:
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=settings.webhook_enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.overflowed += 1
+                WEBHOOK_EVENTS.labels("deferred").inc()
+                self._overflowed = True
+                logger.warning("webhook_queue_full", webhook_id=webhook_log['id'], depth=self.buffered)
+                await self._release(webhook_log["id"])
+                return False
+        
+        key = partition_key(webhook_log)
+        self._buffers.setdefault(key, []).append((time.monotonic(), webhook_log))
+        self._pending_ids.add(webhook_log["id"])
+        self.buffered += 1
+        WEBHOOK_QUEUE_DEPTH.set(self.buffered)
+        
+        # One scheduling per payment: later events join the same buffer
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._keys.put_nowait(key)
+        return True
+    
+    async def resume_pending(self, exclusive: bool = False, lock_ttl: Optional[float] = None) -> int:
+        """
+        Enqueue webhook_logs rows that were stored but not processed yet (including due retries).
+        
+        Args:
+            exclusive: Only one worker process resumes (shared cache lock), e.g. on startup
+            lock_ttl: Lock duration (default WEBHOOK_RESUME_LOCK_TTL)
+            
+        Returns:
+            Number of resumed rows
+        """
+        self._overflowed = False
+        
+        if exclusive and not await self._acquire_resume_lock(lock_ttl or settings.webhook_resume_lock_ttl):
+            logger.info("webhook_resume_skipped", reason="another_worker")
+            return 0
+        
+        # Claim only what fits: claimed rows are skipped by other processes until processed
+        limit = min(settings.webhook_resume_batch_size, self.max_size - self.buffered)
+        if limit <= 0:
+            return 0
+        
+        try:
+            rows = await self.service.claim_pending_webhooks(limit)
+        except Exception as e:
+            logger.error("webhook_resume_failed", error=str(e))
+            return 0
+        
+        resumed = 0
+        for row in rows:
+            if await self.enqueue(row):
+                resumed += 1
+        
+        if resumed:
+            logger.info("webhook_queue_resumed", count=resumed)
+        return resumed
+    
+    async def _release(self, webhook_id: str) -> None:
+        """Release a deferred row at once instead of waiting for its claim to expire."""
+        try:
+            await self.service.release_webhooks([webhook_id])
+        except Exception as e:
+            logger.warning("webhook_release_failed", webhook_id=webhook_id, error=str(e))
+    
+    async def _acquire_resume_lock(self, ttl: float) -> bool:
+        """Take the resume lock; expires so the next deploy or retry round resumes again."""
+        if not shared_cache.shared:
+            return True
+        try:
+            return await shared_cache.add("lock:webhook_resume", os.getpid(), ttl=ttl)
+        except Exception as e:
+            logger.warning("shared_cache_unavailable", error=str(e))
+            return True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Back-pressure metrics for health checks."""
+        return {
+            "running": self.running,
+            "workers": len(self._workers),
+            "depth": self.buffered,
+            "partitions": len(self._buffers),
+            "max_size": self.max_size,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "overflowed": self.overflowed,
+            "last_lag_seconds": round(self.last_lag, 3),
+            "max_lag_seconds": round(self.max_lag, 3)
+        }
+    
+    async def _retry_loop(self) -> None:
+        """Pick failed webhooks up again once their backoff elapsed, one worker process per round."""
+        while True:
+            await asyncio.sleep(settings.webhook_retry_interval)
+            await self.resume_pending(exclusive=True, lock_ttl=settings.webhook_retry_interval)
+    
+    async def _worker(self, index: int) -> None:
+        """Process scheduled payments until cancelled."""
+        while True:
+            key = await self._keys.get()
+            try:
+                # Let a burst for this payment accumulate before applying it
+                if settings.webhook_coalesce_window > 0:
+                    await asyncio.sleep(settings.webhook_coalesce_window)
+                
+                batch = self._buffers.pop(key, [])
+                await self._process_batch(index, batch)
+            finally:
+                # Events that arrived meanwhile go after this batch; the key stays
+                # scheduled so no other worker picks the payment up concurrently
+                if key in self._buffers:
+                    self._keys.put_nowait(key)
+                else:
+                    self._scheduled.discard(key)
+                self._keys.task_done()
+            
+            # Events deferred by a full queue are picked up again once it drains
+            if self._overflowed and self.buffered == 0:
+                await self.resume_pending()
+    
+    async def _process_batch(self, index: int, batch: List[Tuple[float, Dict[str, Any]]]) -> None:
+        """Apply one payment's buffered webhooks."""
+        if not batch:
+            return
+        
+        webhook_logs = [webhook_log for _, webhook_log in batch]
+        self.buffered -= len(webhook_logs)
+        WEBHOOK_QUEUE_DEPTH.set(self.buffered)
+        if self.buffered < self.max_size:
+            self._space.set()
+        
+        self.in_flight += len(webhook_logs)
+        WEBHOOK_QUEUE_IN_FLIGHT.set(self.in_flight)
+        self.last_lag = time.monotonic() - batch[0][0]
+        self.max_lag = max(self.max_lag, self.last_lag)
+        WEBHOOK_QUEUE_LAG.observe(self.last_lag)
+        
+        try:
+            await self.service.process_logged_webhooks(webhook_logs)
+            self.processed += len(webhook_logs)
+            self.coalesced += len(webhook_logs) - 1
+            WEBHOOK_EVENTS.labels("processed").inc(len(webhook_logs))
+            WEBHOOK_EVENTS.labels("coalesced").inc(len(webhook_logs) - 1)
+        except Exception as e:
+            # Erro já registrado em webhook_logs.error
+            self.failed += len(webhook_logs)
+            WEBHOOK_EVENTS.labels("failed").inc(len(webhook_logs))
+            logger.error(
+                "webhook_worker_failed",
+                worker=index, payment_id=webhook_logs[0].get('payment_id'), count=len(webhook_logs), error=str(e)
+            )
+        finally:
+            self.in_flight -= len(webhook_logs)
+            WEBHOOK_QUEUE_IN_FLIGHT.set(self.in_flight)
+            for webhook_log in webhook_logs:
+                self._pending_ids.discard(webhook_log["id"])
+
+
+# Global webhook queue (started/stopped with the app)
+webhook_queue = WebhookQueue(
+    concurrency=settings.webhook_workers,
+    max_size=settings.webhook_queue_max_size
+)
@@ -2,16 +2,69 @@
 Webhook service - Process Adiq webhook notifications.
 """
 from uuid import uuid4
-from typing import Dict, Any
-from datetime import datetime
-from src.schemas.webhook import WebhookPayload, WebhookResponse
-from src.core.exceptions import DuplicateWebhookError
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.exceptions import DuplicateWebhookError, InvalidStateTransitionError
+from src.core.state_machine import can_reach_transaction, get_transaction_source_states
 from src.core.logger import get_logger
-from src.db.client import supabase
+from src.core.tracing import tracer
+from src.db.client import db
 from src.services.invoice_service import InvoiceService
 
 logger = get_logger(__name__)
 
+# Postgres unique_violation (idx_webhook_logs_dedup_key)
+UNIQUE_VIOLATION = "23505"
+
+# Recently received dedup keys - skips the insert for Adiq retry storms
+_recent_webhooks = TTLCache(
+    max_size=settings.webhook_dedup_cache_size,
+    ttl=settings.webhook_dedup_ttl
+)
+
+
+def webhook_dedup_key(payload: Dict[str, Any]) -> Optional[str]:
+    """
+    Build the deduplication key for a webhook payload.
+    
+    Distinct statuses for the same payment (e.g. Captured then Settled) get
+    distinct keys; retries of the same notification share one.
+    
+    Args:
+        payload: Webhook payload
+        
+    Returns:
+        "{paymentId}:{status or eventType}", or None without a paymentId
+    """
+    payment_id = payload.get("paymentId")
+    if not payment_id:
+        return None
+    
+    return f"{payment_id}:{payload.get('status') or payload.get('eventType', '')}"
+
+
+def webhook_retry_delay(attempts: int) -> float:
+    """
+    Backoff before retrying a webhook that failed `attempts` times.
+    
+    Args:
+        attempts: Failed attempts so far (>= 1)
+        
+    Returns:
+        Delay in seconds, doubled per attempt up to WEBHOOK_RETRY_BACKOFF_MAX
+    """
+    return min(settings.webhook_retry_backoff * 2 ** (attempts - 1), settings.webhook_retry_backoff_max)
+
+
+def claim_expiry() -> str:
+    """next_attempt_at of a row this process is about to process (see claim_pending_webhooks)."""
+    expiry = datetime.utcnow() + timedelta(seconds=settings.webhook_claim_lease)
+    return expiry.strftime("%Y-%m-%d %H:%M:%S")
+
 
 class WebhookService:
     """Service for webhook processing."""
@@ -19,97 +72,215 @@ class WebhookService:
     def __init__(self):
         self.invoice_service = InvoiceService()
     
-    async def process_webhook(
+    async def receive_webhook(
         self,
         payload: Dict[str, Any],
         signature: str
-    ) -> WebhookResponse:
+    ) -> Dict[str, Any]:
         """
-        Process incoming webhook from Adiq.
+        Persist an incoming Adiq webhook (fast path, before acknowledging).
+        Processing happens later in the webhook queue workers.
         
         Args:
             payload: Webhook payload
             signature: Webhook signature
             
         Returns:
-            Webhook response
+            Stored webhook_log row
             
         Raises:
-            DuplicateWebhookError: If webhook already processed
+            DuplicateWebhookError: If the same event was already received
+            Exception: If the event could not be stored (Adiq must retry)
         """
-        webhook_id = str(uuid4())
-        payment_id = payload.get("paymentId")
-        event_type = payload.get("eventType", "payment.status.changed")
+        dedup_key = webhook_dedup_key(payload)
+        
+        # Fast path: retry seen recently by this process, no DB round trip
+        if dedup_key and _recent_webhooks.get(dedup_key, False):
+            raise DuplicateWebhookError(dedup_key)
         
-        # 1. Log webhook receipt
         webhook_log = {
-            "id": webhook_id,
-            "event_type": event_type,
-            "payment_id": payment_id,
+            "id": str(uuid4()),
+            "event_type": payload.get("eventType", "payment.status.changed"),
+            "payment_id": payload.get("paymentId"),
             "payload": payload,
             "signature": signature,
             "processed": False,
-            "merchant_id": None  # Será preenchido depois se encontrar a transaction
+            "dedup_key": dedup_key,
+            "merchant_id": None,  # Será preenchido depois se encontrar a transaction
+            # Claimed by this process (enqueued next): other processes' resumes skip it
+            "next_attempt_at": claim_expiry()
             # received_at usa default do banco (NOW())
         }
         
         try:
-            supabase.table("webhook_logs").insert(webhook_log).execute()
-        except Exception as e:
-            logger.error(f"webhook_log_failed: {str(e)}")
-            # Continue processing even if log fails
-        
-        # 2. Check for duplicate
-        try:
-            existing = supabase.table("webhook_logs")\
-                .select("id")\
-                .eq("payment_id", payment_id)\
-                .eq("processed", True)\
-                .execute()
-            
-            if existing.data:
-                logger.warning(f"duplicate_webhook - payment_id={payment_id}")
-                raise DuplicateWebhookError(payment_id)
-        except DuplicateWebhookError:
+            with tracer.span("webhook.store", **{"webhook.payment_id": webhook_log["payment_id"]}):
+                await db.table("webhook_logs").insert(webhook_log, returning=ReturnMethod.minimal).execute()
+        except APIError as e:
+            # Unique index rejected the insert: already stored
+            if e.code == UNIQUE_VIOLATION:
+                _recent_webhooks.set(dedup_key, True)
+                raise DuplicateWebhookError(dedup_key)
+            logger.error("webhook_log_failed", payment_id=webhook_log['payment_id'], error=str(e))
             raise
         except Exception as e:
-            logger.error(f"duplicate_check_failed: {str(e)}")
+            logger.error("webhook_log_failed", payment_id=webhook_log['payment_id'], error=str(e))
+            raise
         
-        # 3. Process webhook
-        try:
-            # Process payment update
-            await self._process_payment_update(payload)
+        if dedup_key:
+            _recent_webhooks.set(dedup_key, True)
+        
+        logger.info(
+            "webhook_received",
+            webhook_id=webhook_log['id'], payment_id=webhook_log['payment_id'], event_type=webhook_log['event_type']
+        )
+        return webhook_log
+    
+    async def process_logged_webhook(self, webhook_log: Dict[str, Any]) -> None:
+        """
+        Process a single stored webhook_log row.
+        
+        Args:
+            webhook_log: Row from webhook_logs (id, payment_id, event_type, payload)
             
-            # Mark as processed
-            now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-            supabase.table("webhook_logs")\
-                .update({
-                    "processed": True,
-                    "processed_at": now
-                })\
-                .eq("id", webhook_id)\
-                .execute()
+        Raises:
+            Exception: If processing fails (error is recorded on the row)
+        """
+        await self.process_logged_webhooks([webhook_log])
+    
+    async def process_logged_webhooks(self, webhook_logs: List[Dict[str, Any]]) -> None:
+        """
+        Process stored webhook_log rows for one payment, in arrival order.
+        
+        Superseded intermediate statuses are collapsed so the whole batch costs
+        one transaction update; every row is then marked processed together.
+        
+        Args:
+            webhook_logs: Rows from webhook_logs for the same payment_id
             
-            logger.info(f"webhook_processed - webhook_id={webhook_id}, payment_id={payment_id}, event_type={event_type}")
+        Raises:
+            Exception: If processing fails (error is recorded on the rows)
+        """
+        webhook_ids = [webhook_log["id"] for webhook_log in webhook_logs]
+        payment_id = webhook_logs[0].get("payment_id")
+        
+        try:
+            # Root span for queue workers (child of the request span when called inline)
+            with tracer.span("webhook.process_batch", **{
+                "webhook.payment_id": payment_id,
+                "webhook.count": len(webhook_ids)
+            }) as span:
+                payload = self._coalesce_payloads([
+                    webhook_log.get("payload") or {} for webhook_log in webhook_logs
+                ])
+                span.set_attribute("webhook.status", payload.get("status"))
+                
+                # Process payment update
+                with tracer.span("webhook.payment_update"):
+                    await self._process_payment_update(payload)
+                
+                # Mark as processed
+                with tracer.span("webhook.mark_processed"):
+                    await self._mark_processed(webhook_ids)
             
-            return WebhookResponse(
-                success=True,
-                message="Webhook processed successfully",
-                webhook_id=webhook_id
+            logger.info(
+                "webhook_processed",
+                webhook_ids=webhook_ids,
+                payment_id=payment_id,
+                status=payload.get('status'),
+                coalesced=len(webhook_ids)
             )
-            
+        
         except Exception as e:
-            # Log error
+            # Record the failure; the row stays pending and is retried after a backoff
             error_msg = str(e)
-            logger.error(f"webhook_processing_failed - webhook_id={webhook_id}, payment_id={payment_id}, error={error_msg}")
+            attempts = max(webhook_log.get("attempts") or 0 for webhook_log in webhook_logs) + 1
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=webhook_retry_delay(attempts))
+            logger.error(
+                "webhook_processing_failed",
+                payment_id=payment_id, error=error_msg, attempts=attempts,
+                gave_up=attempts >= settings.webhook_retry_max_attempts
+            )
             
-            supabase.table("webhook_logs")\
-                .update({"error": error_msg})\
-                .eq("id", webhook_id)\
+            await db.table("webhook_logs")\
+                .update({
+                    "error": error_msg,
+                    "attempts": attempts,
+                    "next_attempt_at": next_attempt_at.strftime("%Y-%m-%d %H:%M:%S")
+                })\
+                .in_("id", webhook_ids)\
                 .execute()
             
             raise
     
+    def _coalesce_payloads(self, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Collapse a payment's webhook payloads into the one to apply.
+        
+        Walks the payloads in arrival order and keeps the latest status that
+        can follow the current one; a stale status (e.g. Authorized arriving
+        after Captured) is dropped. The last authorizationCode seen is kept.
+        
+        Args:
+            payloads: Webhook payloads for one payment, oldest first
+            
+        Returns:
+            Payload for the final status
+        """
+        final = payloads[0]
+        authorization_code = final.get("authorizationCode")
+        
+        for payload in payloads[1:]:
+            current_status = self._map_adiq_status(final.get("status"))
+            new_status = self._map_adiq_status(payload.get("status"))
+            if can_reach_transaction(current_status, new_status):
+                final = payload
+            authorization_code = payload.get("authorizationCode") or authorization_code
+        
+        if authorization_code:
+            final = {**final, "authorizationCode": authorization_code}
+        return final
+    
+    async def claim_pending_webhooks(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Claim stored webhooks still to process: never tried (e.g. after a crash)
+        or failed, once their backoff elapsed and below WEBHOOK_RETRY_MAX_ATTEMPTS.
+        
+        Claimed rows are leased for WEBHOOK_CLAIM_LEASE seconds: other processes
+        skip them, so each row is processed by one process at a time.
+        
+        Args:
+            limit: Max rows
+            
+        Returns:
+            Oldest unprocessed webhook_log rows that are due, now claimed
+        """
+        result = await db.rpc("claim_pending_webhooks", {
+            "p_limit": limit,
+            "p_max_attempts": settings.webhook_retry_max_attempts,
+            "p_lease_seconds": settings.webhook_claim_lease
+        }).execute()
+        
+        return result.data or []
+    
+    async def release_webhooks(self, webhook_ids: List[str]) -> None:
+        """Give up the claim on unprocessed rows so the next resume, by any process, picks them up."""
+        await db.table("webhook_logs")\
+            .update({"next_attempt_at": None})\
+            .in_("id", webhook_ids)\
+            .eq("processed", False)\
+            .execute()
+    
+    async def _mark_processed(self, webhook_ids: List[str]) -> None:
+        """Mark webhook_log rows as processed (single statement)."""
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        await db.table("webhook_logs")\
+            .update({
+                "processed": True,
+                "processed_at": now
+            })\
+            .in_("id", webhook_ids)\
+            .execute()
+    
     async def _process_payment_update(self, payload: Dict[str, Any]) -> None:
         """
         Process payment status update from webhook.
@@ -125,21 +296,7 @@ class WebhookService:
             logger.warning("webhook_missing_payment_id")
             return
         
-        # Find transaction by payment_id
         try:
-            result = supabase.table("transactions")\
-                .select("*")\
-                .eq("payment_id", payment_id)\
-                .execute()
-            
-            if not result.data:
-                logger.warning(f"transaction_not_found_for_webhook - payment_id={payment_id}")
-                return
-            
-            transaction = result.data[0]
-            transaction_id = transaction["id"]
-            invoice_id = transaction["invoice_id"]
-            
             # Map Adiq status to internal status
             internal_status = self._map_adiq_status(new_status)
             
@@ -160,27 +317,49 @@ class WebhookService:
             elif internal_status == "SETTLED":
                 update_data["settled_at"] = now
             
-            supabase.table("transactions")\
+            # Compare-and-set: only rows whose status can still reach the new one,
+            # so a stale status never overwrites a newer one
+            result = await db.table("transactions")\
                 .update(update_data)\
-                .eq("id", transaction_id)\
+                .eq("payment_id", payment_id)\
+                .in_("status", get_transaction_source_states(internal_status))\
                 .execute()
             
+            if not result.data:
+                logger.warning(
+                    "payment_update_skipped",
+                    payment_id=payment_id, status=internal_status, reason="transaction_not_found_or_newer_status"
+                )
+                return
+            
+            transaction = result.data[0]
+            transaction_id = transaction["id"]
+            invoice_id = transaction["invoice_id"]
+            
             # Update invoice status if needed
+            invoice_status = None
             if internal_status in ["CAPTURED", "SETTLED"]:
-                await self.invoice_service.update_status(invoice_id, "PAID")
+                invoice_status = "PAID"
             elif internal_status in ["DECLINED", "CANCELLED"]:
-                await self.invoice_service.update_status(invoice_id, "FAILED")
+                invoice_status = "FAILED"
+            
+            if invoice_status:
+                try:
+                    await self.invoice_service.update_status(invoice_id, invoice_status)
+                except InvalidStateTransitionError:
+                    # Invoice já está no estado final (ex.: PAID pelo finish_payment)
+                    logger.info("invoice_status_unchanged", invoice_id=invoice_id, status=invoice_status)
             
             logger.info(
-                f"payment_updated_from_webhook - transaction_id={transaction_id}, "
-                f"payment_id={payment_id}, status={internal_status}"
+                "payment_updated_from_webhook",
+                transaction_id=transaction_id, payment_id=payment_id, status=internal_status
             )
-            
+        
         except Exception as e:
-            logger.error(f"payment_update_failed - payment_id={payment_id}, error={str(e)}")
+            logger.error("payment_update_failed", payment_id=payment_id, error=str(e))
             raise
     
-    def _map_adiq_status(self, adiq_status: str) -> str:
+    def _map_adiq_status(self, adiq_status: Optional[str]) -> str:
         """Map Adiq status to internal status."""
         status_map = {
             "Authorized": "AUTHORIZED",
@@ -105,7 +105,9 @@ for i in range(30, 0, -5):
 # 4. Verificar se webhook chegou
 print(f"\n4️⃣ Verificando webhooks recebidos...")
 
-from src.db.client import supabase
+from src.db.client import get_supabase_client
+
+supabase = get_supabase_client()
 
 try:
     # Buscar webhooks dos ultimos 5 minutos
@@ -149,7 +149,8 @@ if payment_response.status_code == 201:
     # 7. Verificar webhook no Supabase
     print(f"\n7️⃣ Verificando se webhook foi recebido...")
     
-    from src.db.client import supabase
+    from src.db.client import get_supabase_client
+    supabase = get_supabase_client()
     
     webhooks = supabase.table("webhook_logs")\
         .select("*")\
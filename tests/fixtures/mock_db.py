@@ -0,0 +1,45 @@
+"""
+Async PostgREST client wired to an in-memory request handler.
+"""
+from typing import Callable
+import httpx
+from src.db.client import create_db_client, PooledPostgrestClient
+
+INVOICE_ID = "2f520f49-6b64-4529-b8c1-cf586c7e73d7"
+MERCHANT_ID = "219c230a-5c4b-43d4-861d-f25979de2e88"
+CUSTOMER_ID = "3b415031-7236-425e-bc8f-35c7a5f572ab"
+
+
+def invoice_row() -> dict:
+    """Build an invoice row as PostgREST returns it."""
+    return {
+        "id": INVOICE_ID,
+        "merchant_id": MERCHANT_ID,
+        "customer_id": CUSTOMER_ID,
+        "amount": 1000,
+        "currency": "BRL",
+        "status": "PENDING",
+        "description": None,
+        "order_number": None,
+        "created_at": "2025-10-30T12:00:00",
+        "updated_at": "2025-10-30T12:00:00"
+    }
+
+
+def mock_db_client(handler: Callable[[httpx.Request], httpx.Response]) -> PooledPostgrestClient:
+    """
+    Build an async DB client whose requests are answered by a handler.
+    
+    Args:
+        handler: Function receiving the PostgREST request and returning a response
+        
+    Returns:
+        Async PostgREST client that never touches the network
+    """
+    client = create_db_client()
+    client.session = httpx.AsyncClient(
+        base_url=client.session.base_url,
+        headers=client.session.headers,
+        transport=httpx.MockTransport(handler)
+    )
+    return client
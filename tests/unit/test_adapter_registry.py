@@ -0,0 +1,103 @@
+"""
+Unit tests for the AdiqAdapter registry.
+"""
+import httpx
+import pytest
+from src.adapters.registry import AdiqAdapterRegistry, adapter_registry
+from src.core.shared_cache import shared_cache
+from src.services import merchant_service
+from src.services.merchant_service import MerchantService, credentials_version_key
+from tests.fixtures.mock_db import mock_db_client, MERCHANT_ID
+
+
+def merchant_row(client_secret: str = "secret", environment: str = "hml") -> dict:
+    """Build a merchant row with Adiq credentials."""
+    return {
+        "adiq_client_id": "client",
+        "adiq_client_secret": client_secret,
+        "adiq_seller_id": "seller",
+        "adiq_environment": environment
+    }
+
+
+def test_same_credentials_reuse_adapter():
+    """Test the adapter is reused while credentials are unchanged."""
+    registry = AdiqAdapterRegistry(max_size=10)
+    
+    adapter = registry.put("m1", merchant_row())
+    
+    assert registry.put("m1", merchant_row()) is adapter
+    assert registry.get("m1") is adapter
+
+
+def test_credential_change_rebuilds_adapter():
+    """Test a new fingerprint replaces the adapter."""
+    registry = AdiqAdapterRegistry(max_size=10)
+    
+    old = registry.put("m1", merchant_row())
+    new = registry.put("m1", merchant_row(environment="prd"))
+    
+    assert new is not old
+    assert new.base_url == "https://ecommerce.adiq.io"
+
+
+def test_lru_eviction():
+    """Test the least recently used merchant is evicted."""
+    registry = AdiqAdapterRegistry(max_size=2)
+    
+    registry.put("m1", merchant_row())
+    registry.put("m2", merchant_row())
+    registry.get("m1")
+    registry.put("m3", merchant_row())
+    
+    assert registry.get("m2") is None
+    assert registry.get("m1") is not None
+    assert len(registry) == 2
+
+
+def test_invalidate():
+    """Test invalidation drops the adapter."""
+    registry = AdiqAdapterRegistry(max_size=10)
+    registry.put("m1", merchant_row())
+    
+    registry.invalidate("m1")
+    
+    assert registry.get("m1") is None
+
+
+@pytest.mark.asyncio
+async def test_registry_hit_notices_credentials_changed_by_another_worker(monkeypatch):
+    """Test a cached adapter is rebuilt when the shared fingerprint no longer matches it."""
+    db_reads = []
+    current = {"row": merchant_row()}
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        db_reads.append(request)
+        return httpx.Response(200, json=[{"id": MERCHANT_ID, **current["row"]}])
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(merchant_service, "db", client)
+    adapter_registry.clear()
+    service = MerchantService()
+    
+    try:
+        old = await service.get_adiq_adapter(MERCHANT_ID)
+        assert await service.get_adiq_adapter(MERCHANT_ID) is old
+        assert len(db_reads) == 1
+        
+        # Another worker registers new credentials: only the shared fingerprint reaches this one
+        current["row"] = merchant_row(client_secret="rotated")
+        other_worker = AdiqAdapterRegistry(max_size=10)
+        monkeypatch.setattr(merchant_service, "adapter_registry", other_worker)
+        await service.invalidate_adiq_adapter(MERCHANT_ID, current["row"])
+        monkeypatch.setattr(merchant_service, "adapter_registry", adapter_registry)
+        
+        new = await service.get_adiq_adapter(MERCHANT_ID)
+    finally:
+        adapter_registry.clear()
+        await shared_cache.delete(credentials_version_key(MERCHANT_ID))
+        await client.aclose()
+    
+    assert new is not old
+    assert new.client_secret == "rotated"
+    assert len(db_reads) == 2
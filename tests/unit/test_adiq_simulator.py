@@ -0,0 +1,116 @@
+"""
+Unit tests for the local Adiq simulator, driven through AdiqAdapter.
+"""
+import httpx
+import pytest
+from src.adapters import http_client
+from src.adapters.adiq import AdiqAdapter
+from src.adapters.token_cache import token_cache
+from src.core.exceptions import AdiqError, AdiqPaymentError
+from simulator.adiq import SimulatorConfig, create_adiq_simulator
+
+
+def use_simulator(config: SimulatorConfig):
+    """Route pooled Adiq clients to a fresh simulator and return its state."""
+    app = create_adiq_simulator(config)
+    token_cache.clear()
+    http_client.set_transport(httpx.ASGITransport(app=app))
+    return app.state.simulator
+
+
+@pytest.fixture(autouse=True)
+def restore_transport():
+    """Send Adiq traffic back to the network after each test."""
+    yield
+    http_client.set_transport(None)
+    token_cache.clear()
+
+
+def make_adapter() -> AdiqAdapter:
+    """Build an adapter with test credentials (HML base URL)."""
+    return AdiqAdapter(client_id="client", client_secret="secret", seller_id="seller")
+
+
+async def pay(adapter: AdiqAdapter, capture_type: str = "ac") -> dict:
+    """Tokenize the test Visa card and pay 1000 cents."""
+    token = await adapter.tokenize_card("4761739001010036", "12", "30", "visa")
+    return await adapter.create_payment(
+        amount=1000,
+        number_token=token["numberToken"],
+        brand="visa",
+        cardholder_name="JOSE DA SILVA",
+        expiration_month="12",
+        expiration_year="30",
+        security_code="123",
+        order_number="1234567890123",
+        capture_type=capture_type
+    )
+
+
+@pytest.mark.asyncio
+async def test_payment_flow_returns_payment_authorization():
+    """Test tokenize + payment + lookup with camelCase responses."""
+    simulator = use_simulator(SimulatorConfig())
+    adapter = make_adapter()
+    
+    result = await pay(adapter)
+    authorization = result["paymentAuthorization"]
+    payment = await adapter.get_payment(authorization["paymentId"])
+    
+    assert authorization["returnCode"] == "00"
+    assert authorization["authorizationCode"]
+    assert authorization["orderNumber"] == "1234567890123"
+    assert payment["status"] == "Captured"
+    assert payment["last4"] == "0036"
+    assert simulator.calls["token"] == 1
+
+
+@pytest.mark.asyncio
+async def test_injected_errors_and_declines():
+    """Test error_rate answers 503 and decline_rate declines the payment."""
+    use_simulator(SimulatorConfig(error_rate={"tokenize": 1.0}))
+    with pytest.raises(AdiqError):
+        await make_adapter().tokenize_card("4761739001010036", "12", "30", "visa")
+    
+    use_simulator(SimulatorConfig(decline_rate=1.0))
+    with pytest.raises(AdiqPaymentError):
+        await pay(make_adapter())
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_rejected():
+    """Test calls with an expired access token get 401 and drop the cached token."""
+    simulator = use_simulator(SimulatorConfig(token_ttl=0))
+    adapter = make_adapter()
+    
+    with pytest.raises(AdiqError):
+        await adapter.tokenize_card("4761739001010036", "12", "30", "visa")
+    
+    assert token_cache.peek(adapter.token_key) is None
+    assert simulator.calls["tokenize"] == 1
+
+
+@pytest.mark.asyncio
+async def test_webhook_callbacks_are_sent_to_gateway():
+    """Test Captured and Settled callbacks reach the configured webhook URL."""
+    received = []
+    
+    def gateway(request: httpx.Request) -> httpx.Response:
+        received.append(request)
+        return httpx.Response(200, json={"success": True})
+    
+    simulator = use_simulator(SimulatorConfig(
+        webhook_url="http://gateway/v1/webhooks/adiq",
+        webhook_delay=0,
+        settle_delay=0,
+        webhook_transport=httpx.MockTransport(gateway)
+    ))
+    
+    result = await pay(make_adapter())
+    await simulator.drain_webhooks()
+    await simulator.close()
+    
+    payment_id = result["paymentAuthorization"]["paymentId"]
+    assert [w["status"] for w in simulator.webhooks_sent] == ["Captured", "Settled"]
+    assert all(w["paymentId"] == payment_id for w in simulator.webhooks_sent)
+    assert received[0].url.path == "/v1/webhooks/adiq"
@@ -0,0 +1,160 @@
+"""
+Unit tests for batch payments (PaymentService and merchant lookup mocked).
+"""
+import asyncio
+import httpx
+import pytest
+from src.adapters import http_client
+from src.adapters.adiq import AdiqAdapter
+from src.adapters.token_cache import token_cache
+from src.core.config import settings
+from src.core.exceptions import InvalidStateTransitionError, ValidationError
+from src.schemas.payment import PaymentCreate, PaymentResponse
+from src.services.batch_payment_service import BatchPaymentService
+from src.services.merchant_service import MerchantService
+from src.services.payment_service import PaymentService
+from tests.fixtures.mock_db import MERCHANT_ID
+
+INVOICE_IDS = [f"00000000-0000-4000-8000-{index:012d}" for index in range(6)]
+
+
+class FakeAdapter:
+    """Adapter stub counting token fetches."""
+    
+    def __init__(self):
+        self.authentications = 0
+    
+    async def authenticate(self) -> None:
+        self.authentications += 1
+
+
+def item(invoice_id: str) -> PaymentCreate:
+    """Build a tokenized payment request."""
+    return PaymentCreate(
+        invoice_id=invoice_id,
+        card_token="number-token-123",
+        brand="visa",
+        cardholder_name="JOSE DA SILVA",
+        expiration_month="12",
+        expiration_year="25",
+        security_code="123"
+    )
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """Batch service whose payments take 50ms and fail for the second invoice."""
+    adapter = FakeAdapter()
+    lookups = []
+    stats = {"in_flight": 0, "max_in_flight": 0}
+    
+    async def get_adiq_adapter(self, merchant_id):
+        lookups.append(merchant_id)
+        return adapter
+    
+    async def process_payment(self, data, merchant_id, customer_data=None):
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        await asyncio.sleep(0.05)
+        stats["in_flight"] -= 1
+        if str(data.invoice_id) == INVOICE_IDS[1]:
+            raise InvalidStateTransitionError("PAID", "PROCESSING")
+        return PaymentResponse(
+            id=data.invoice_id,
+            invoice_id=data.invoice_id,
+            transaction_id=data.invoice_id,
+            status="CAPTURED",
+            amount=1000,
+            installments=1,
+            created_at="2025-10-30T12:00:00",
+            updated_at="2025-10-30T12:00:01"
+        )
+    
+    monkeypatch.setattr(MerchantService, "get_adiq_adapter", get_adiq_adapter)
+    monkeypatch.setattr(PaymentService, "process_payment", process_payment)
+    monkeypatch.setattr(settings, "payment_batch_concurrency", 2)
+    return BatchPaymentService(), adapter, lookups, stats
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_each_item_with_bounded_concurrency(batch):
+    """Test one lookup/token per batch, per-item results and the concurrency limit."""
+    service, adapter, lookups, stats = batch
+    
+    result = await service.process_batch([item(invoice_id) for invoice_id in INVOICE_IDS], MERCHANT_ID)
+    
+    assert (result.total, result.succeeded, result.failed) == (6, 5, 1)
+    assert [r.index for r in result.results] == list(range(6))
+    assert result.results[1].error_code == "INVALID_STATE_TRANSITION"
+    assert result.results[0].payment.status == "CAPTURED"
+    assert lookups == [MERCHANT_ID]
+    assert adapter.authentications == 1
+    assert stats["max_in_flight"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_too_many_items(batch, monkeypatch):
+    """Test batches above PAYMENT_BATCH_MAX_ITEMS are refused before any payment."""
+    service, _, lookups, _ = batch
+    monkeypatch.setattr(settings, "payment_batch_max_items", 3)
+    
+    with pytest.raises(ValidationError):
+        await service.process_batch([item(invoice_id) for invoice_id in INVOICE_IDS], MERCHANT_ID)
+    
+    assert lookups == []
+
+
+@pytest.mark.asyncio
+async def test_batch_job_can_be_polled(batch):
+    """Test an async job goes from running to completed with results."""
+    service, _, _, _ = batch
+    
+    job = await service.submit([item(invoice_id) for invoice_id in INVOICE_IDS[:3]], MERCHANT_ID)
+    assert job.status == "running"
+    assert (await service.get_job(job.job_id, MERCHANT_ID)).total == 3
+    
+    for _ in range(100):
+        finished = await service.get_job(job.job_id, MERCHANT_ID)
+        if finished.status != "running":
+            break
+        await asyncio.sleep(0.01)
+    
+    assert finished.status == "completed"
+    assert finished.processed == 3
+    assert finished.result.succeeded == 2
+    assert await service.get_job(job.job_id, "another-merchant") is None
+
+
+@pytest.mark.asyncio
+async def test_batches_share_one_cached_token(batch, monkeypatch):
+    """Test a real AdiqAdapter fetches one OAuth token across batches and their items."""
+    service, _, _, _ = batch
+    adapter = AdiqAdapter(client_id="client", client_secret="secret", seller_id="seller")
+    token_calls = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/auth/oauth2/v1/token":
+            token_calls.append(request)
+            return httpx.Response(200, json={"accessToken": "token-1", "expiresIn": 3600})
+        return httpx.Response(404)
+    
+    async def get_adiq_adapter(self, merchant_id):
+        return adapter
+    
+    async def process_payment(self, data, merchant_id, customer_data=None):
+        # Every Adiq call of a payment starts like this
+        await adapter._ensure_authenticated()
+        raise InvalidStateTransitionError("PAID", "PROCESSING")
+    
+    token_cache.clear()
+    http_client.set_transport(httpx.MockTransport(handler))
+    monkeypatch.setattr(MerchantService, "get_adiq_adapter", get_adiq_adapter)
+    monkeypatch.setattr(PaymentService, "process_payment", process_payment)
+    try:
+        await service.process_batch([item(invoice_id) for invoice_id in INVOICE_IDS[:3]], MERCHANT_ID)
+        await service.process_batch([item(invoice_id) for invoice_id in INVOICE_IDS[3:]], MERCHANT_ID)
+    finally:
+        http_client.set_transport(None)
+        token_cache.clear()
+    
+    assert len(token_calls) == 1
@@ -0,0 +1,26 @@
+"""
+Smoke test for the offline benchmark runner (keeps the stand-ins in sync with the services).
+"""
+import pytest
+from benchmarks.run import Environment, run_scenario, percentile
+from simulator.adiq import SimulatorConfig
+
+
+def test_percentile_nearest_rank():
+    """Test nearest-rank percentiles."""
+    values = [float(n) for n in range(1, 101)]
+    
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.95) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_scenarios_run_without_errors():
+    """Test each scenario completes against the stand-ins with no failed requests."""
+    async with Environment(db_latency=lambda: 0.0, adiq_config=SimulatorConfig()) as env:
+        for scenario in ["invoices", "payments", "webhooks"]:
+            result = await run_scenario(env, scenario, count=6, concurrency=3)
+            
+            assert result.errors == 0, result.status_codes
+            assert result.requests == 6
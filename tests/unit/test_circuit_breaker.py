@@ -0,0 +1,209 @@
+"""
+Unit tests for the Adiq circuit breakers and adaptive timeouts.
+"""
+import json
+import time
+import httpx
+import pytest
+from src.adapters import http_client
+from src.adapters.registry import adapter_registry
+from src.adapters.resilience import CLOSED, HALF_OPEN, OPEN, AdaptiveTimeout, CircuitBreaker, adiq_resilience
+from src.adapters.token_cache import token_cache
+from src.core.config import settings
+from src.core.exceptions import AdiqUnavailableError
+from src.schemas.payment import PaymentCreate
+from src.services import payment_service
+from src.services.payment_service import PaymentService
+from tests.fixtures.mock_db import mock_db_client, invoice_row, INVOICE_ID, MERCHANT_ID
+
+MERCHANT_ROW = {
+    "id": MERCHANT_ID,
+    "adiq_client_id": "client",
+    "adiq_client_secret": "secret",
+    "adiq_seller_id": "seller",
+    "adiq_environment": "hml"
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    """Start every test with closed breakers and empty caches."""
+    adiq_resilience.reset()
+    adapter_registry.clear()
+    token_cache.clear()
+    yield
+    adiq_resilience.reset()
+    http_client.set_transport(None)
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    """Test closed -> open after the threshold, half-open after the reset timeout, closed on success."""
+    breaker = CircuitBreaker("create_payment:hml", failure_threshold=3, reset_timeout=30.0)
+    
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 30.0
+    
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+    
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # a single probe at a time
+    
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens(monkeypatch):
+    """Test a failing half-open probe opens the breaker again."""
+    breaker = CircuitBreaker("tokenize_card:hml", failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert breaker.allow()
+    
+    breaker.record_failure()
+    assert breaker._state == OPEN
+
+
+def test_adaptive_timeout_is_clamped():
+    """Test the timeout follows the latency percentile, between the floor and the call's cap."""
+    timeout = AdaptiveTimeout(percentile=0.99, multiplier=3.0, floor=2.0, min_samples=10, window=100)
+    
+    assert timeout.current(30.0) == 30.0  # not enough samples yet
+    
+    for _ in range(10):
+        timeout.observe(1.5)
+    assert timeout.current(30.0) == 4.5
+    assert timeout.current(3.0) == 3.0
+    
+    fast = AdaptiveTimeout(percentile=0.99, multiplier=3.0, floor=2.0, min_samples=10, window=100)
+    for _ in range(10):
+        fast.observe(0.1)
+    assert fast.current(30.0) == 2.0
+
+
+@pytest.mark.asyncio
+async def test_transport_fails_fast_when_open(monkeypatch):
+    """Test 5xx responses open the breaker and later calls never reach Adiq."""
+    monkeypatch.setattr(settings, "adiq_breaker_failure_threshold", 2)
+    calls = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(503)
+    
+    http_client.set_transport(httpx.MockTransport(handler))
+    client = http_client.get_http_client("https://ecommerce-hml.adiq.io")
+    
+    for _ in range(2):
+        response = await client.get("/v1/payments/pay-1")
+        assert response.status_code == 503
+    
+    with pytest.raises(AdiqUnavailableError) as exc:
+        await client.get("/v1/payments/pay-1")
+    
+    assert len(calls) == 2
+    assert exc.value.code == "ADIQ_UNAVAILABLE"
+    assert adiq_resilience.snapshot()["get_payment:hml"]["state"] == OPEN
+
+
+@pytest.mark.asyncio
+async def test_payment_rejected_before_touching_invoice(monkeypatch):
+    """Test an open breaker rejects the payment without calling begin_payment."""
+    adapter_registry.put(MERCHANT_ID, MERCHANT_ROW)
+    breaker = adiq_resilience.breaker("create_payment", "hml")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    
+    db_calls = []
+    client = mock_db_client(lambda request: db_calls.append(request) or httpx.Response(500))
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    data = PaymentCreate(
+        invoice_id=INVOICE_ID,
+        card_token="number-token-123",
+        brand="visa",
+        cardholder_name="JOSE DA SILVA",
+        expiration_month="12",
+        expiration_year="25",
+        security_code="123"
+    )
+    with pytest.raises(AdiqUnavailableError):
+        await PaymentService().process_payment(data, MERCHANT_ID)
+    
+    assert db_calls == []
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pan", [None, "4761739001010036"])
+async def test_uncached_rejection_rolls_invoice_back(monkeypatch, pan):
+    """Test a breaker rejection after begin_payment (adapter not cached) aborts instead of failing the invoice."""
+    for operation in ("tokenize_card", "create_payment"):
+        breaker = adiq_resilience.breaker(operation, "hml")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+    http_client.set_transport(httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"accessToken": "token", "expiresIn": 3600})
+    ))
+    
+    db_calls = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        db_calls.append(request.url.path)
+        if request.url.path.endswith("/begin_payment"):
+            body = {"invoice": invoice_row(), "transaction": {}, "merchant": MERCHANT_ROW}
+        else:
+            body = {"invoice": invoice_row()}
+        return httpx.Response(200, content=json.dumps(body))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    data = PaymentCreate(
+        invoice_id=INVOICE_ID,
+        pan=pan,
+        card_token=None if pan else "number-token-123",
+        brand="visa",
+        cardholder_name="JOSE DA SILVA",
+        expiration_month="12",
+        expiration_year="25",
+        security_code="123"
+    )
+    with pytest.raises(AdiqUnavailableError):
+        await PaymentService().process_payment(data, MERCHANT_ID)
+    
+    assert db_calls == ["/rest/v1/rpc/begin_payment", "/rest/v1/rpc/abort_payment"]
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_create_payment_keeps_its_own_timeout():
+    """Test the non-idempotent create_payment is never given an adaptive read timeout."""
+    read_timeouts = {}
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        read_timeouts[request.url.path] = request.extensions["timeout"]["read"]
+        return httpx.Response(200, json={})
+    
+    http_client.set_transport(httpx.MockTransport(handler))
+    client = http_client.get_http_client("https://ecommerce-hml.adiq.io")
+    for operation in ("create_payment", "get_payment"):
+        for _ in range(settings.adiq_timeout_min_samples):
+            adiq_resilience.timeout(operation, "hml").observe(0.1)
+    
+    await client.post("/v1/payments", json={}, timeout=90.0)
+    await client.get("/v1/payments/pay-1", timeout=90.0)
+    
+    assert read_timeouts["/v1/payments"] == 90.0
+    assert read_timeouts["/v1/payments/pay-1"] == settings.adiq_timeout_floor
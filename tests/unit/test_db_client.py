@@ -0,0 +1,39 @@
+"""
+Unit tests for the async database client.
+"""
+import json
+import httpx
+import pytest
+from tests.fixtures.mock_db import mock_db_client, invoice_row, INVOICE_ID, MERCHANT_ID
+from src.services import invoice_service
+from src.services.invoice_service import InvoiceService
+
+@pytest.mark.asyncio
+async def test_invoice_get_uses_async_client(monkeypatch):
+    """Test InvoiceService.get awaits the async PostgREST client."""
+    requests = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=json.dumps([invoice_row()]))
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    
+    invoice = await InvoiceService().get(INVOICE_ID, MERCHANT_ID)
+    
+    assert str(invoice.id) == INVOICE_ID
+    assert requests[0].url.path == "/rest/v1/invoices"
+    assert requests[0].url.params["id"] == f"eq.{INVOICE_ID}"
+    assert requests[0].headers["apikey"]
+    
+    await client.aclose()
+
+
+def test_sync_supabase_client_is_not_built_by_the_app():
+    """Test importing the app never creates the scripts-only synchronous client."""
+    import src.main  # noqa: F401
+    from src.db import client
+    
+    assert client._supabase is None
+    assert not hasattr(client, "supabase")
@@ -0,0 +1,96 @@
+"""
+Unit tests for streaming exports (DB mocked).
+"""
+import csv
+import gzip
+import io
+import json
+import httpx
+import pytest
+from src.api.dependencies import get_current_merchant
+from src.core.config import settings
+from src.services import export_service
+from src.services.export_service import EXPORTS, ExportService
+from tests.fixtures.mock_db import mock_db_client, invoice_row, MERCHANT_ID
+
+
+def rows(count: int) -> list:
+    """Invoice rows with distinct ids, newest first."""
+    return [
+        {**invoice_row(), "id": f"20000000-0000-4000-8000-{index:012d}", "created_at": f"2025-10-30T12:00:{59 - index:02d}"}
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Mock DB serving 5 invoices through keyset queries; records query params."""
+    params = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        params.append(request.url.params)
+        remaining = rows(5)
+        if "or" in request.url.params:
+            last_id = request.url.params["or"].rsplit('id.lt."', 1)[1].split('"')[0]
+            remaining = remaining[[row["id"] for row in remaining].index(last_id) + 1:]
+        page = [{**row, "transactions": [{"card_brand": "visa"}]} for row in remaining[:2]]
+        return httpx.Response(200, json=page)
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(export_service, "db", client)
+    monkeypatch.setattr(settings, "export_batch_size", 2)
+    return params
+
+
+@pytest.mark.asyncio
+async def test_batches_are_read_with_keyset(queries):
+    """Test rows are read in bounded keyset batches with filters and only exported columns."""
+    batches = [
+        batch async for batch in ExportService().batches(EXPORTS["invoices"], MERCHANT_ID, status="PAID", brand="VISA")
+    ]
+    
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert "transactions" not in batches[0][0]
+    assert all(query["limit"] == "2" for query in queries)
+    assert queries[0]["order"] == "created_at.desc,id.desc"
+    assert queries[0]["status"] == "eq.PAID"
+    assert queries[0]["transactions.card_brand"] == "eq.visa"
+    assert "transactions!inner(card_brand)" in queries[0]["select"]
+    assert "or" not in queries[0]
+    assert queries[1]["or"].endswith(f'id.lt."{batches[0][-1]["id"]}"))')
+
+
+@pytest.mark.asyncio
+async def test_csv_export_is_streamed_gzipped(queries):
+    """Test the CSV export endpoint writes a header and every row, gzip-compressed on request."""
+    from src.main import app
+    
+    app.dependency_overrides[get_current_merchant] = lambda: MERCHANT_ID
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/v1/exports/invoices", params={"format": "csv"}, headers={"Accept-Encoding": "gzip"}
+            )
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="invoices.csv"' in response.headers["content-disposition"]
+    
+    lines = list(csv.DictReader(io.StringIO(response.text)))
+    assert [line["id"] for line in lines] == [row["id"] for row in rows(5)]
+    assert len(queries) == 3
+
+
+@pytest.mark.asyncio
+async def test_gzip_chunks_round_trip():
+    """Test the gzip stream decompresses to the original NDJSON."""
+    async def batches():
+        yield [{"id": 1}, {"id": 2}]
+        yield [{"id": 3}]
+    
+    body = b"".join([chunk async for chunk in export_service.gzip_chunks(export_service.ndjson_chunks(batches()))])
+    
+    lines = gzip.decompress(body).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2, 3]
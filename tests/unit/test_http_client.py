@@ -0,0 +1,29 @@
+"""
+Unit tests for the shared Adiq HTTP connection pool.
+"""
+import pytest
+from src.adapters import http_client
+from src.adapters.adiq import AdiqAdapter
+
+
+@pytest.mark.asyncio
+async def test_adapters_share_pooled_client():
+    """Test adapters with the same base URL reuse one client."""
+    first = AdiqAdapter("id-1", "secret-1", "seller-1", base_url="https://adiq.test")
+    second = AdiqAdapter("id-2", "secret-2", "seller-2", base_url="https://adiq.test")
+    
+    assert first.client is second.client
+    
+    await http_client.close_http_clients()
+
+
+@pytest.mark.asyncio
+async def test_close_http_clients_reopens_on_demand():
+    """Test a closed pool is rebuilt on the next request."""
+    client = http_client.get_http_client("https://adiq.test")
+    await http_client.close_http_clients()
+    
+    assert client.is_closed
+    assert http_client.get_http_client("https://adiq.test") is not client
+    
+    await http_client.close_http_clients()
@@ -0,0 +1,114 @@
+"""
+Unit tests for Idempotency-Key handling on POST /v1/payments.
+"""
+import asyncio
+import httpx
+import pytest
+from src.api.dependencies import get_current_merchant
+from src.core.exceptions import IdempotencyKeyReuseError
+from src.core.shared_cache import MemoryCacheBackend, shared_cache
+from src.schemas.payment import PaymentResponse
+from src.services.idempotency import IdempotencyStore, create_idempotency_backend
+from src.services.payment_service import PaymentService
+from tests.fixtures.mock_db import INVOICE_ID, MERCHANT_ID
+
+PAYMENT_BODY = {
+    "invoice_id": INVOICE_ID,
+    "card_token": "number-token-123",
+    "brand": "visa",
+    "cardholder_name": "JOSE DA SILVA",
+    "expiration_month": "12",
+    "expiration_year": "25",
+    "security_code": "123"
+}
+
+
+@pytest.mark.asyncio
+async def test_store_claims_replays_and_rejects_reuse():
+    """Test a key is claimed once, replayed after completion and bound to its fingerprint."""
+    store = IdempotencyStore(MemoryCacheBackend(), ttl=60, lock_ttl=5)
+    
+    assert await store.begin(MERCHANT_ID, "key-1", "fp") is None
+    await store.complete(MERCHANT_ID, "key-1", "fp", 201, {"status": "CAPTURED"})
+    
+    stored = await store.begin(MERCHANT_ID, "key-1", "fp")
+    assert stored["status_code"] == 201
+    assert stored["body"] == {"status": "CAPTURED"}
+    
+    # Same key, other merchant: independent
+    assert await store.begin("other-merchant", "key-1", "fp") is None
+    
+    with pytest.raises(IdempotencyKeyReuseError):
+        await store.begin(MERCHANT_ID, "key-1", "other-fp")
+
+
+@pytest.mark.asyncio
+async def test_released_key_can_be_retried():
+    """Test a released key is claimable again."""
+    store = IdempotencyStore(MemoryCacheBackend(), ttl=60, lock_ttl=5)
+    
+    assert await store.begin(MERCHANT_ID, "key-2", "fp") is None
+    await store.release(MERCHANT_ID, "key-2")
+    
+    assert await store.begin(MERCHANT_ID, "key-2", "fp") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_keys_do_not_share_the_cache_lru(monkeypatch):
+    """Test idempotency keys get their own store, so other cache traffic cannot evict them."""
+    monkeypatch.setattr("src.services.idempotency.settings.idempotency_max_keys", 50)
+    backend = create_idempotency_backend()
+    store = IdempotencyStore(backend, ttl=60, lock_ttl=5)
+    
+    assert backend is not shared_cache
+    assert await store.begin(MERCHANT_ID, "key-3", "fp") is None
+    await store.complete(MERCHANT_ID, "key-3", "fp", 201, {"status": "CAPTURED"})
+    for index in range(20000):
+        await shared_cache.set(f"auth:{index}", index, ttl=60)
+    
+    stored = await store.begin(MERCHANT_ID, "key-3", "fp")
+    assert stored["status_code"] == 201
+    
+    for index in range(20000):
+        await shared_cache.delete(f"auth:{index}")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_payment(monkeypatch):
+    """Test duplicates sent together run one payment and replay its response."""
+    from src.main import app
+    
+    calls = []
+    
+    async def process_payment(self, data, merchant_id, customer_data=None):
+        calls.append(data.invoice_id)
+        await asyncio.sleep(0.1)
+        return PaymentResponse(
+            id=INVOICE_ID,
+            invoice_id=INVOICE_ID,
+            transaction_id=INVOICE_ID,
+            status="CAPTURED",
+            amount=1000,
+            installments=1,
+            created_at="2025-10-30T12:00:00",
+            updated_at="2025-10-30T12:00:01"
+        )
+    
+    monkeypatch.setattr(PaymentService, "process_payment", process_payment)
+    app.dependency_overrides[get_current_merchant] = lambda: MERCHANT_ID
+    headers = {"Idempotency-Key": "retry-test-key"}
+    
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            first, second = await asyncio.gather(
+                client.post("/v1/payments/", json=PAYMENT_BODY, headers=headers),
+                client.post("/v1/payments/", json=PAYMENT_BODY, headers=headers)
+            )
+            later = await client.post("/v1/payments/", json=PAYMENT_BODY, headers=headers)
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert len(calls) == 1
+    assert first.status_code == second.status_code == later.status_code == 201
+    assert first.json() == second.json() == later.json()
+    assert later.headers["Idempotent-Replayed"] == "true"
@@ -0,0 +1,161 @@
+"""
+Unit tests for bulk invoice creation (DB mocked).
+"""
+import asyncio
+import json
+import anyio
+import httpx
+import pytest
+from starlette.background import BackgroundTask
+from src.api.v1.invoices import DuplexStreamingResponse
+from src.api.dependencies import get_current_merchant
+from src.core.config import settings
+from src.services import invoice_service
+from src.services.invoice_bulk_service import InvoiceBulkService, InvalidRow, iter_items, iter_ndjson
+from tests.fixtures.mock_db import mock_db_client, invoice_row, CUSTOMER_ID, MERCHANT_ID
+
+UNKNOWN_CUSTOMER = "00000000-0000-4000-8000-000000000000"
+
+
+def row(amount: int, customer_id: str = CUSTOMER_ID) -> dict:
+    """Build a bulk input row."""
+    return {"customer_id": customer_id, "amount": amount, "description": f"Mensalidade {amount}"}
+
+
+@pytest.fixture
+def inserts(monkeypatch):
+    """Mock DB recording INSERT sizes; rows for UNKNOWN_CUSTOMER violate the FK."""
+    sizes = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        rows = body if isinstance(body, list) else [body]
+        sizes.append(len(rows))
+        if any(item["customer_id"] == UNKNOWN_CUSTOMER for item in rows):
+            return httpx.Response(409, json={
+                "code": "23503", "message": "insert violates foreign key constraint", "details": None, "hint": None
+            })
+        created = [
+            {**invoice_row(), **item, "id": f"10000000-0000-4000-8000-{item['amount']:012d}"}
+            for item in rows
+        ]
+        return httpx.Response(201, json=created)
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    monkeypatch.setattr(settings, "invoice_bulk_chunk_size", 2)
+    return sizes
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_inserted_with_one_statement_each(inserts):
+    """Test rows are validated per chunk and written with multi-row INSERTs."""
+    rows = iter_items([row(100), row(200), {"amount": -5}, row(300), row(400)])
+    
+    results = [result async for result in InvoiceBulkService().create(rows, MERCHANT_ID)]
+    
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert "id" in results[0] and "id" in results[4]
+    assert "customer_id" in results[2]["error"] and "amount" in results[2]["error"]
+    assert inserts == [2, 1, 1]  # chunk [0,1], chunk [2 invalid, 3], chunk [4]
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_is_retried_per_row(inserts):
+    """Test a rejected INSERT only fails the offending rows."""
+    rows = iter_items([row(100), row(200, UNKNOWN_CUSTOMER)])
+    
+    results = [result async for result in InvoiceBulkService().create(rows, MERCHANT_ID)]
+    
+    assert "id" in results[0]
+    assert "foreign key" in results[1]["error"]
+    assert inserts == [2, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_is_not_reinserted_on_timeout(monkeypatch):
+    """Test a chunk whose INSERT timed out is reported as failed without per-row inserts."""
+    inserts = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        inserts.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    monkeypatch.setattr(settings, "invoice_bulk_chunk_size", 2)
+    rows = iter_items([row(100), {"amount": -5}, row(200)])
+    
+    results = [result async for result in InvoiceBulkService().create(rows, MERCHANT_ID)]
+    
+    assert len(inserts) == 2  # one per chunk, never per row
+    assert "not retried" in results[0]["error"] and "not retried" in results[2]["error"]
+    assert "amount" in results[1]["error"]
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ndjson_lines_split_across_chunks():
+    """Test NDJSON parsing with lines split over body chunks and invalid lines."""
+    async def body():
+        yield b'{"amount": 1}\n{"amo'
+        yield b'unt": 2}\n\nnot json\n{"amount": 3}'
+    
+    parsed = [item async for item in iter_ndjson(body())]
+    
+    assert parsed[0] == {"amount": 1}
+    assert parsed[1] == {"amount": 2}
+    assert isinstance(parsed[2], InvalidRow)
+    assert parsed[3] == {"amount": 3}
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_streams_ndjson(inserts):
+    """Test NDJSON input gets per-row NDJSON results and a totals line."""
+    from src.main import app
+    
+    app.dependency_overrides[get_current_merchant] = lambda: MERCHANT_ID
+    body = "\n".join(json.dumps(item) for item in [row(100), row(200), row(300)])
+    
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/v1/invoices/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+            )
+    finally:
+        app.dependency_overrides.clear()
+    
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [line["index"] for line in lines[:3]] == [0, 1, 2]
+    assert lines[3] == {"total": 3, "created": 3, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_duplex_response_handles_disconnect_after_body():
+    """Test the duplex response listens for a disconnect only once the body is read, then runs its background."""
+    request_read = anyio.Event()
+    sent = []
+    background = []
+    
+    async def content():
+        yield b"first\n"
+        request_read.set()
+        await asyncio.sleep(10)  # cancelled by the disconnect
+        yield b"never\n"
+    
+    async def receive():
+        assert request_read.is_set()  # body chunks are left to the request stream
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        sent.append(message)
+    
+    response = DuplexStreamingResponse(
+        content(), request_read=request_read, background=BackgroundTask(background.append, "done")
+    )
+    await asyncio.wait_for(response({"type": "http"}, receive, send), timeout=1)
+    
+    assert [message.get("body") for message in sent if message["type"] == "http.response.body"] == [b"first\n"]
+    assert background == ["done"]
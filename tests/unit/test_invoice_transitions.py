@@ -0,0 +1,73 @@
+"""
+Unit tests for compare-and-set invoice status transitions.
+"""
+import json
+import httpx
+import pytest
+from src.core.exceptions import InvalidStateTransitionError, InvoiceNotFoundError
+from src.core.state_machine import get_invoice_source_states
+from src.services import invoice_service
+from src.services.invoice_service import InvoiceService
+from tests.fixtures.mock_db import mock_db_client, invoice_row, INVOICE_ID
+
+
+def test_invoice_source_states():
+    """Test source states are derived from INVOICE_TRANSITIONS."""
+    assert get_invoice_source_states("PROCESSING") == ["PENDING"]
+    assert get_invoice_source_states("PAID") == ["PROCESSING"]
+    assert get_invoice_source_states("PENDING") == []
+    assert get_invoice_source_states("UNKNOWN") == []
+
+
+@pytest.mark.asyncio
+async def test_update_status_single_conditional_update(monkeypatch):
+    """Test a valid transition is one PATCH guarded by the source status."""
+    requests = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        row = {**invoice_row(), "status": "PROCESSING"}
+        return httpx.Response(200, content=json.dumps([row]))
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    
+    invoice = await InvoiceService().update_status(INVOICE_ID, "PROCESSING")
+    
+    assert invoice.status == "PROCESSING"
+    assert len(requests) == 1
+    assert requests[0].method == "PATCH"
+    assert requests[0].url.params["status"] == "in.(PENDING)"
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_update_status_lost_race(monkeypatch):
+    """Test no matched row reports the invoice's actual status."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "PATCH":
+            return httpx.Response(200, content="[]")
+        return httpx.Response(200, content=json.dumps([{"status": "PROCESSING"}]))
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    
+    with pytest.raises(InvalidStateTransitionError) as exc:
+        await InvoiceService().update_status(INVOICE_ID, "PROCESSING")
+    
+    assert "PROCESSING to PROCESSING" in exc.value.message
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_update_status_not_found(monkeypatch):
+    """Test a missing invoice raises InvoiceNotFoundError."""
+    client = mock_db_client(lambda request: httpx.Response(200, content="[]"))
+    monkeypatch.setattr(invoice_service, "db", client)
+    
+    with pytest.raises(InvoiceNotFoundError):
+        await InvoiceService().update_status(INVOICE_ID, "PAID")
+    
+    await client.aclose()
@@ -0,0 +1,111 @@
+"""
+Unit tests for the structured, queue-based logger.
+"""
+import json
+import logging
+import queue
+from prometheus_client import REGISTRY
+from src.core.logger import (
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    StructuredLogger,
+    parse_sample_rates,
+    sanitize_data
+)
+
+
+class CollectingHandler(logging.Handler):
+    """Keeps emitted records in memory."""
+    
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+
+def make_logger(name: str, level: int = logging.INFO, sample_rate: float = 1.0):
+    """Isolated stdlib logger with a collecting handler, wrapped in StructuredLogger."""
+    handler = CollectingHandler()
+    base = logging.getLogger(name)
+    base.handlers = [handler]
+    base.propagate = False
+    base.setLevel(level)
+    return StructuredLogger(base, sample_rate), handler
+
+
+def test_json_output_has_fields_and_redacts_sensitive_keys():
+    """Test fields become JSON keys and sensitive ones are redacted at format time."""
+    logger, handler = make_logger("test.logging.json")
+    logger.info("payment_finished", transaction_id="tx-1", status="APPROVED", security_code="123")
+    
+    entry = json.loads(JsonFormatter().format(handler.records[0]))
+    assert entry["event"] == "payment_finished"
+    assert entry["level"] == "INFO"
+    assert entry["transaction_id"] == "tx-1"
+    assert entry["security_code"] == "***REDACTED***"
+
+
+def test_disabled_levels_and_sampling_create_no_records():
+    """Test calls below the level are dropped and sampling never drops warnings."""
+    logger, handler = make_logger("test.logging.sampled", level=logging.INFO, sample_rate=0.0)
+    
+    logger.debug("noisy_debug", value=1)
+    logger.info("merchant_authenticated", merchant_id="m-1")
+    logger.warning("invalid_api_key", key_hash="abc")
+    
+    assert [record.getMessage() for record in handler.records] == ["invalid_api_key"]
+    assert parse_sample_rates("src.main=0.1, src.api.dependencies=2") == {
+        "src.main": 0.1,
+        "src.api.dependencies": 1.0
+    }
+
+
+def test_queue_handler_drops_on_overflow_without_blocking():
+    """Test a full queue drops the record and counts it instead of blocking the caller."""
+    log_queue = queue.Queue(maxsize=1)
+    handler = NonBlockingQueueHandler(log_queue)
+    before = REGISTRY.get_sample_value("spdpay_log_records_dropped_total") or 0.0
+    
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "event", (), None)
+    handler.handle(record)
+    handler.handle(record)
+    
+    assert log_queue.qsize() == 1
+    assert log_queue.get_nowait() is record
+    assert REGISTRY.get_sample_value("spdpay_log_records_dropped_total") == before + 1
+
+
+def test_queued_fields_are_snapshotted():
+    """Test later mutations by the caller do not change a queued record's fields."""
+    log_queue = queue.Queue()
+    logger, _ = make_logger("test.logging.snapshot")
+    logger.logger.handlers = [NonBlockingQueueHandler(log_queue)]
+    payload = {"status": "PENDING", "items": [{"sku": "A1"}]}
+    
+    logger.info("webhook_received", payload=payload)
+    payload["status"] = "PAID"
+    payload["items"][0]["cardNumber"] = "4111111111111111"
+    
+    entry = json.loads(JsonFormatter().format(log_queue.get_nowait()))
+    assert entry["payload"] == {"status": "PENDING", "items": [{"sku": "A1"}]}
+
+
+def test_sanitize_redacts_nested_keys_without_copying_clean_branches():
+    """Test nested sensitive keys are redacted (any case) and clean branches are shared, not copied."""
+    merchant = {"sellerId": "seller-1", "name": "Loja"}
+    payload = {
+        "merchant": merchant,
+        "cardInfo": {"cardNumber": "4111111111111111", "brand": "visa"},
+        "items": [{"securityCode": "123"}, {"sku": "A1"}]
+    }
+    
+    sanitized = sanitize_data(payload)
+    
+    assert sanitized["cardInfo"] == {"cardNumber": "***REDACTED***", "brand": "visa"}
+    assert sanitized["items"][0] == {"securityCode": "***REDACTED***"}
+    assert sanitized["merchant"] is merchant
+    assert sanitized["items"][1] is payload["items"][1]
+    assert payload["cardInfo"]["cardNumber"] == "4111111111111111"
+    assert sanitize_data(merchant) is merchant
@@ -0,0 +1,87 @@
+"""
+Unit tests for Prometheus metrics.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+from src.core.metrics import (
+    InstrumentedTransport,
+    adiq_operation,
+    db_statement_labels,
+    observe_db_statement,
+    render_metrics,
+)
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# One gunicorn worker: bumps a counter and sets the queue depth gauge
+WORKER_SCRIPT = """
+from src.core.metrics import LOG_RECORDS_DROPPED, WEBHOOK_QUEUE_DEPTH
+LOG_RECORDS_DROPPED.inc()
+WEBHOOK_QUEUE_DEPTH.set(3)
+"""
+
+
+def sample(name: str, **labels) -> float:
+    """Current value of a metric sample (0 if never observed)."""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_operation_labels():
+    """Test request paths map to bounded operation labels."""
+    assert adiq_operation("POST", "/v1/payments") == "create_payment"
+    assert adiq_operation("GET", "/v1/payments/0200489674") == "get_payment"
+    assert adiq_operation("POST", "/auth/oauth2/v1/token") == "oauth_token"
+    assert db_statement_labels("PATCH", "/rest/v1/invoices") == ("invoices", "update")
+    assert db_statement_labels("POST", "/rest/v1/rpc/begin_payment") == ("begin_payment", "rpc")
+
+
+@pytest.mark.asyncio
+async def test_instrumented_transport_records_latency_and_errors():
+    """Test DB statements are timed and failures counted per table/operation."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(409 if request.method == "POST" else 200, json=[])
+    
+    before = sample("spdpay_db_statement_duration_seconds_count", table="webhook_logs", operation="select")
+    errors_before = sample("spdpay_db_statement_errors_total", table="webhook_logs", operation="insert", reason="409")
+    
+    transport = InstrumentedTransport(httpx.MockTransport(handler), observe_db_statement)
+    async with httpx.AsyncClient(transport=transport, base_url="http://db/rest/v1") as client:
+        await client.get("/webhook_logs")
+        await client.post("/webhook_logs", json={})
+    
+    assert sample("spdpay_db_statement_duration_seconds_count", table="webhook_logs", operation="select") == before + 1
+    assert sample("spdpay_db_statement_errors_total", table="webhook_logs", operation="insert", reason="409") == errors_before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_route_histograms():
+    """Test /metrics serves request histograms labeled by route template and status."""
+    from src.main import app
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/health")
+        response = await client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'spdpay_http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    assert "spdpay_webhook_queue_depth" in response.text
+
+
+def test_multiprocess_metrics_aggregate_every_worker(tmp_path, monkeypatch):
+    """Test /metrics in multiprocess mode sums the samples written by all workers."""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", WORKER_SCRIPT], cwd=ROOT, env=env, check=True)
+    
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    body, _ = render_metrics()
+    text = body.decode()
+    
+    assert "spdpay_log_records_dropped_total 2.0" in text
+    assert "spdpay_webhook_queue_depth 6.0" in text
@@ -0,0 +1,109 @@
+"""
+Unit tests for keyset pagination of invoices (DB mocked).
+"""
+import base64
+import json
+import httpx
+import pytest
+from src.core.exceptions import ValidationError
+from src.core.pagination import decode_cursor, encode_cursor, keyset_filter
+from src.services import invoice_service
+from src.services.invoice_service import InvoiceService
+from tests.fixtures.mock_db import mock_db_client, invoice_row, MERCHANT_ID
+
+
+def rows(count: int) -> list:
+    """Invoice rows with distinct ids, newest first."""
+    return [
+        {**invoice_row(), "id": f"20000000-0000-4000-8000-{index:012d}", "created_at": f"2025-10-30T12:00:{59 - index:02d}"}
+        for index in range(count)
+    ]
+
+
+def test_cursor_round_trip_and_filter():
+    """Test cursors are opaque, reversible and become a (created_at, id) keyset filter."""
+    row_id = rows(1)[0]["id"]
+    cursor = encode_cursor({"created_at": "2025-10-30T12:00:00.123+00:00", "id": row_id})
+    
+    assert "2025" not in cursor
+    assert decode_cursor(cursor) == ("2025-10-30T12:00:00.123+00:00", row_id)
+    assert keyset_filter(cursor) == (
+        'created_at.lt."2025-10-30T12:00:00.123+00:00",'
+        f'and(created_at.eq."2025-10-30T12:00:00.123+00:00",id.lt."{row_id}")'
+    )
+
+
+@pytest.mark.parametrize("fields", [
+    ["2025-10-30T12:00:00", 'x"),id.gt.("'],  # filter injection in the id
+    ["2025-10-30T12:00:00", "abc"],
+    ['2025-10-30",status.eq."PAID', "20000000-0000-4000-8000-000000000000"],
+    ["yesterday", "20000000-0000-4000-8000-000000000000"],
+    [1, 2],
+    ["only-one-field"],
+])
+def test_malformed_cursors_are_rejected(fields):
+    """Test cursors whose fields are not a timestamp and a UUID raise ValidationError (400), not a 500."""
+    cursor = base64.urlsafe_b64encode(json.dumps(fields).encode()).decode()
+    
+    with pytest.raises(ValidationError):
+        keyset_filter(cursor)
+
+
+def test_garbage_cursor_is_rejected():
+    """Test a cursor that is not base64 JSON raises ValidationError."""
+    with pytest.raises(ValidationError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_list_pages_with_keyset(monkeypatch):
+    """Test pages are ordered by (created_at, id), fetch limit + 1 and chain through next_cursor."""
+    requests = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.params)
+        return httpx.Response(200, json=rows(3) if "or" not in request.url.params else rows(3)[2:])
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    service = InvoiceService()
+    
+    first, next_cursor = await service.list(MERCHANT_ID, limit=2)
+    
+    assert [str(invoice.id) for invoice in first] == [row["id"] for row in rows(2)]
+    assert requests[0]["order"] == "created_at.desc,id.desc"
+    assert requests[0]["limit"] == "3"
+    assert "offset" not in requests[0]
+    assert decode_cursor(next_cursor) == (rows(2)[1]["created_at"], rows(2)[1]["id"])
+    
+    last, end = await service.list(MERCHANT_ID, limit=2, cursor=next_cursor)
+    
+    assert len(last) == 1
+    assert end is None
+    assert requests[1]["or"].startswith('(created_at.lt."2025-10-30T12:00:58"')
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_exact_count_is_cached(monkeypatch):
+    """Test exact totals hit the database once per filter set within the cache TTL."""
+    calls = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.headers["prefer"])
+        return httpx.Response(200, json=[], headers={"content-range": "*/1234"})
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(invoice_service, "db", client)
+    service = InvoiceService()
+    
+    assert await service.count(MERCHANT_ID, status="PAID", estimated=False) == 1234
+    assert await service.count(MERCHANT_ID, status="PAID", estimated=False) == 1234
+    assert await service.count(MERCHANT_ID, status="PAID") == 1234
+    
+    assert len(calls) == 2
+    assert "count=exact" in calls[0]
+    assert "count=estimated" in calls[1]
+    
+    await client.aclose()
@@ -0,0 +1,215 @@
+"""
+Unit tests for PaymentService.process_payment (DB and Adiq mocked).
+"""
+import json
+import httpx
+import pytest
+from src.adapters import http_client
+from src.adapters.registry import adapter_registry
+from src.adapters.resilience import adiq_resilience
+from src.adapters.token_cache import token_cache
+from src.core.exceptions import (
+    AdiqOutcomeUnknownError,
+    AdiqPaymentError,
+    AdiqTimeoutError,
+    InvalidStateTransitionError,
+)
+from src.schemas.payment import PaymentCreate
+from src.services import payment_service
+from src.services.payment_service import PaymentService
+from tests.fixtures.mock_db import mock_db_client, invoice_row, INVOICE_ID, MERCHANT_ID
+
+TRANSACTION_ROW = {
+    "created_at": "2025-10-30T12:00:00",
+    "updated_at": "2025-10-30T12:00:01"
+}
+
+MERCHANT_ROW = {
+    "id": MERCHANT_ID,
+    "adiq_client_id": "client",
+    "adiq_client_secret": "secret",
+    "adiq_seller_id": "seller",
+    "adiq_environment": "hml"
+}
+
+
+def adiq_handler(request: httpx.Request) -> httpx.Response:
+    """Answer Adiq calls with an approved payment."""
+    if request.url.path == "/auth/oauth2/v1/token":
+        return httpx.Response(200, json={"accessToken": "token", "expiresIn": 3600})
+    if request.url.path == "/v1/tokens/cards":
+        return httpx.Response(200, json={"numberToken": "number-token-123"})
+    return httpx.Response(200, json={
+        "paymentAuthorization": {
+            "paymentId": "pay-1",
+            "authorizationCode": "123456",
+            "nsu": "999",
+            "returnCode": "0"
+        }
+    })
+
+
+def payment_data() -> PaymentCreate:
+    """Build a PAN payment request."""
+    return PaymentCreate(
+        invoice_id=INVOICE_ID,
+        pan="4761739001010036",
+        brand="visa",
+        cardholder_name="JOSE DA SILVA",
+        expiration_month="12",
+        expiration_year="25",
+        security_code="123"
+    )
+
+
+@pytest.fixture(autouse=True)
+def mock_adiq():
+    """Route Adiq traffic to the in-memory handler."""
+    adapter_registry.clear()
+    token_cache.clear()
+    adiq_resilience.reset()
+    http_client.set_transport(httpx.MockTransport(adiq_handler))
+    yield
+    http_client.set_transport(None)
+    adiq_resilience.reset()
+
+
+@pytest.mark.asyncio
+async def test_process_payment_uses_two_db_round_trips(monkeypatch):
+    """Test a payment is begin_payment + finish_payment only."""
+    calls = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.endswith("/begin_payment"):
+            body = {"invoice": invoice_row(), "transaction": TRANSACTION_ROW, "merchant": MERCHANT_ROW}
+        else:
+            body = {"invoice": {**invoice_row(), "status": "PAID"}, "transaction": TRANSACTION_ROW}
+        return httpx.Response(200, content=json.dumps(body))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    payment = await PaymentService().process_payment(payment_data(), MERCHANT_ID)
+    
+    assert calls == ["/rest/v1/rpc/begin_payment", "/rest/v1/rpc/finish_payment"]
+    assert payment.status == "CAPTURED"
+    assert payment.payment_id == "pay-1"
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_process_payment_invoice_not_pending(monkeypatch):
+    """Test begin_payment rejecting a non-PENDING invoice."""
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, content=json.dumps({
+            "code": "P0001",
+            "message": "INVALID_STATE_TRANSITION",
+            "details": "PAID",
+            "hint": None
+        }))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    with pytest.raises(InvalidStateTransitionError) as exc:
+        await PaymentService().process_payment(payment_data(), MERCHANT_ID)
+    
+    assert "PAID to PROCESSING" in exc.value.message
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_process_payment_timeout_is_left_for_reconciler(monkeypatch):
+    """Test a create_payment timeout neither declines the transaction nor fails the invoice."""
+    def timing_out_adiq(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/payments":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return adiq_handler(request)
+    
+    http_client.set_transport(httpx.MockTransport(timing_out_adiq))
+    calls = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        body = {"invoice": invoice_row(), "transaction": TRANSACTION_ROW, "merchant": MERCHANT_ROW}
+        return httpx.Response(200, content=json.dumps(body))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    with pytest.raises(AdiqTimeoutError):
+        await PaymentService().process_payment(payment_data(), MERCHANT_ID)
+    
+    assert calls == ["/rest/v1/rpc/begin_payment"]
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("failure", [
+    httpx.Response(502, text="Bad Gateway"),
+    httpx.Response(504, text="Gateway Timeout"),
+    httpx.ReadError("connection reset"),
+    httpx.RemoteProtocolError("server disconnected"),
+])
+async def test_process_payment_lost_answer_is_left_for_reconciler(monkeypatch, failure):
+    """Test a 5xx or a broken connection after sending neither declines nor fails the payment."""
+    def failing_adiq(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/payments":
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+        return adiq_handler(request)
+    
+    http_client.set_transport(httpx.MockTransport(failing_adiq))
+    calls = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        body = {"invoice": invoice_row(), "transaction": TRANSACTION_ROW, "merchant": MERCHANT_ROW}
+        return httpx.Response(200, content=json.dumps(body))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    with pytest.raises(AdiqOutcomeUnknownError):
+        await PaymentService().process_payment(payment_data(), MERCHANT_ID)
+    
+    assert calls == ["/rest/v1/rpc/begin_payment"]
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_process_payment_4xx_decline_fails_invoice(monkeypatch):
+    """Test an explicit 4xx decline finishes the transaction DECLINED and the invoice FAILED."""
+    def declining_adiq(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/payments":
+            body = {"paymentAuthorization": {"returnCode": "51", "description": "Insufficient funds"}}
+            return httpx.Response(422, content=json.dumps(body))
+        return adiq_handler(request)
+    
+    http_client.set_transport(httpx.MockTransport(declining_adiq))
+    finished = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/rest/v1/rpc/finish_payment":
+            finished.append(json.loads(request.content))
+            return httpx.Response(200, content="null")
+        body = {"invoice": invoice_row(), "transaction": TRANSACTION_ROW, "merchant": MERCHANT_ROW}
+        return httpx.Response(200, content=json.dumps(body))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(payment_service, "db", client)
+    
+    with pytest.raises(AdiqPaymentError):
+        await PaymentService().process_payment(payment_data(), MERCHANT_ID)
+    
+    assert len(finished) == 1
+    assert finished[0]["p_transaction_status"] == "DECLINED"
+    assert finished[0]["p_invoice_status"] == "FAILED"
+    
+    await client.aclose()
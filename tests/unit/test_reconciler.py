@@ -0,0 +1,150 @@
+"""
+Unit tests for the stale payment reconciler (DB and Adiq mocked).
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from src.core.config import settings
+from src.services import reconciliation_service
+from src.services.reconciliation_service import PaymentReconciler
+from tests.fixtures.mock_db import mock_db_client, MERCHANT_ID
+
+
+def transaction(index: int, merchant_id: str = MERCHANT_ID, payment_id: str = None, order_number: str = None) -> dict:
+    """Stale CREATED transaction row as the reconciler selects it."""
+    return {
+        "id": f"30000000-0000-4000-8000-{index:012d}",
+        "merchant_id": merchant_id,
+        "invoice_id": f"20000000-0000-4000-8000-{index:012d}",
+        "payment_id": payment_id,
+        "created_at": f"2025-10-30T12:00:{59 - index:02d}",
+        "invoices": {"order_number": order_number}
+    }
+
+
+class FakeAdapter:
+    """AdiqAdapter stand-in recording concurrent get_payment calls."""
+    
+    def __init__(self, statuses: dict):
+        self.statuses = statuses
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def get_payment(self, payment_id: str) -> dict:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return {
+            "paymentId": payment_id,
+            "status": self.statuses[payment_id],
+            "paymentAuthorization": {"authorizationCode": "123456", "nsu": "000000000001"}
+        }
+
+
+def reconciler_with(monkeypatch, handler, adapter: FakeAdapter) -> PaymentReconciler:
+    """Reconciler wired to a mock DB and a fake adapter."""
+    client = mock_db_client(handler)
+    monkeypatch.setattr(reconciliation_service, "db", client)
+    reconciler = PaymentReconciler()
+    
+    async def get_adiq_adapter(merchant_id):
+        return adapter
+    
+    monkeypatch.setattr(reconciler.merchant_service, "get_adiq_adapter", get_adiq_adapter)
+    return reconciler
+
+
+@pytest.mark.asyncio
+async def test_stale_transactions_are_applied_in_one_call(monkeypatch):
+    """Test Adiq statuses are looked up (payment_id from row or webhook) and applied with one RPC per batch."""
+    rpc_bodies = []
+    transactions = [
+        transaction(0, payment_id="p0"),
+        transaction(1, order_number="O1"),
+        transaction(2, order_number="O2"),
+        transaction(3, payment_id="p3")
+    ]
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/transactions"):
+            return httpx.Response(200, json=transactions)
+        if path.endswith("/webhook_logs"):
+            assert request.url.params["payload->>orderNumber"] == "in.(O1,O2)"
+            return httpx.Response(200, json=[{"payment_id": "p1", "order_number": "O1"}])
+        if path.endswith("/rpc/reconcile_transactions"):
+            rpc_bodies.append(json.loads(request.content))
+            return httpx.Response(200, json=2)
+        return httpx.Response(200, json=[])  # invoices pass
+    
+    adapter = FakeAdapter({"p0": "Captured", "p1": "Declined", "p3": "Pending"})
+    reconciler = reconciler_with(monkeypatch, handler, adapter)
+    
+    report = await reconciler.run_once()
+    
+    assert report.status == "completed"
+    assert len(rpc_bodies) == 1
+    updates = {update["id"]: update for update in rpc_bodies[0]["p_updates"]}
+    assert updates[transactions[0]["id"]]["status"] == "CAPTURED"
+    assert updates[transactions[0]["id"]]["invoice_status"] == "PAID"
+    assert updates[transactions[1]["id"]]["status"] == "DECLINED"
+    assert updates[transactions[1]["id"]]["payment_id"] == "p1"
+    assert report.transactions == {
+        "scanned": 4, "updated": 2, "superseded": 0, "pending": 1, "unresolved": 1, "errors": 0
+    }
+    
+    stats = await reconciler.stats()
+    assert stats["last_run"]["transactions"]["updated"] == 2
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_bounded_per_merchant(monkeypatch):
+    """Test at most RECONCILE_CONCURRENCY Adiq lookups run at once for one merchant."""
+    transactions = [transaction(index, payment_id=f"p{index}") for index in range(6)]
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/transactions"):
+            return httpx.Response(200, json=transactions)
+        return httpx.Response(200, json=[])
+    
+    adapter = FakeAdapter({f"p{index}": "Pending" for index in range(6)})
+    monkeypatch.setattr(settings, "reconcile_concurrency", 2)
+    reconciler = reconciler_with(monkeypatch, handler, adapter)
+    
+    report = await reconciler.run_once()
+    
+    assert report.transactions["pending"] == 6
+    assert adapter.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_processing_invoices_are_updated_per_target_status(monkeypatch):
+    """Test PROCESSING invoices with a final transaction get one guarded UPDATE per target status."""
+    patches = []
+    invoices = [
+        {"id": "i0", "created_at": "2025-10-30T12:00:59", "transactions": [{"status": "CAPTURED"}]},
+        {"id": "i1", "created_at": "2025-10-30T12:00:58", "transactions": [{"status": "AUTHORIZED"}]},
+        {"id": "i2", "created_at": "2025-10-30T12:00:57", "transactions": [{"status": "DECLINED"}]},
+        {"id": "i3", "created_at": "2025-10-30T12:00:56", "transactions": [{"status": "CREATED"}]}
+    ]
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "PATCH":
+            patches.append(request.url.params)
+            ids = request.url.params["id"][len("in.("):-1].split(",")
+            return httpx.Response(200, json=[{"id": invoice_id} for invoice_id in ids])
+        if request.url.path.endswith("/invoices"):
+            return httpx.Response(200, json=invoices)
+        return httpx.Response(200, json=[])
+    
+    reconciler = reconciler_with(monkeypatch, handler, FakeAdapter({}))
+    
+    report = await reconciler.run_once()
+    
+    assert {params["id"]: params["status"] for params in patches} == {
+        "in.(i0,i1)": "in.(PROCESSING)",
+        "in.(i2)": "in.(PROCESSING)"
+    }
+    assert report.invoices == {"scanned": 4, "updated": 3, "skipped": 1}
@@ -0,0 +1,45 @@
+"""
+Unit tests for the orjson / trusted-model response path (DB mocked).
+"""
+import httpx
+import pytest
+from src.api.dependencies import get_current_merchant
+from src.schemas.invoice import InvoiceResponse
+from src.services import invoice_service
+from tests.fixtures.mock_db import mock_db_client, invoice_row, INVOICE_ID, MERCHANT_ID
+
+
+def test_from_row_skips_validation():
+    """Test from_row keeps DB values as they are and drops non-field columns."""
+    row = {**invoice_row(), "merchant_secret_column": "x"}
+    
+    invoice = InvoiceResponse.from_row(row)
+    
+    assert invoice.id == INVOICE_ID  # Not converted to UUID
+    assert invoice.created_at == row["created_at"]
+    assert "merchant_secret_column" not in invoice.model_dump(warnings=False)
+
+
+@pytest.mark.asyncio
+async def test_invoice_endpoints_match_validated_output(monkeypatch):
+    """Test trusted invoice responses serialize exactly like validated models did."""
+    from src.main import app
+    
+    client = mock_db_client(lambda request: httpx.Response(200, json=[invoice_row()]))
+    monkeypatch.setattr(invoice_service, "db", client)
+    app.dependency_overrides[get_current_merchant] = lambda: MERCHANT_ID
+    expected = InvoiceResponse(**invoice_row()).model_dump(mode="json")
+    
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            single = await http.get(f"/v1/invoices/{INVOICE_ID}")
+            listing = await http.get("/v1/invoices/")
+    finally:
+        app.dependency_overrides.clear()
+        await client.aclose()
+    
+    assert single.status_code == 200
+    assert single.json() == expected
+    assert listing.json() == {
+        "invoices": [expected], "next_cursor": None, "total": None, "total_is_estimate": None
+    }
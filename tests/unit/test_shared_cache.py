@@ -0,0 +1,108 @@
+"""
+Unit tests for caches shared across worker processes.
+"""
+import asyncio
+import httpx
+import pytest
+from src.adapters.token_cache import AdiqTokenCache
+from src.api import dependencies
+from src.api import admin
+from src.core.cache import MISSING
+from src.core.config import settings
+from src.core.shared_cache import MemoryCacheBackend, create_cache_backend
+from tests.fixtures.mock_db import MERCHANT_ID, mock_db_client
+
+KEY = ("https://ecommerce-hml.adiq.io", "client-1")
+
+
+class SharedMemoryBackend(MemoryCacheBackend):
+    """Memory backend flagged as shared: stands in for Redis across simulated workers."""
+    shared = True
+
+
+@pytest.mark.asyncio
+async def test_workers_share_one_token_fetch():
+    """Test two workers (token caches) on one backend call Adiq's token endpoint once."""
+    backend = SharedMemoryBackend()
+    workers = [AdiqTokenCache(300, 60, backend=backend, lock_ttl=2) for _ in range(2)]
+    calls = {"count": 0}
+    
+    async def fetch():
+        calls["count"] += 1
+        await asyncio.sleep(0.05)
+        return "shared-token", 3600
+    
+    tokens = await asyncio.gather(*[worker.get_token(KEY, fetch) for worker in workers for _ in range(5)])
+    
+    assert set(tokens) == {"shared-token"}
+    assert calls["count"] == 1
+    
+    # A third worker starting later reads the token without fetching
+    late_worker = AdiqTokenCache(300, 60, backend=backend)
+    assert await late_worker.get_token(KEY, fetch) == "shared-token"
+    assert calls["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_api_key_lookup_uses_shared_entry_before_db(monkeypatch):
+    """Test an API key resolved by another worker is served from the shared backend."""
+    backend = SharedMemoryBackend()
+    statements = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        statements.append(request.url.path)
+        return httpx.Response(200, json=[{"id": MERCHANT_ID, "is_active": True}])
+    
+    monkeypatch.setattr(dependencies, "shared_cache", backend)
+    monkeypatch.setattr(dependencies, "db", mock_db_client(handler))
+    dependencies._api_key_cache.clear()
+    
+    assert await dependencies._lookup_api_key("hash-1") == (MERCHANT_ID, True)
+    
+    # Another worker: empty local cache, same backend
+    dependencies._api_key_cache.clear()
+    assert await dependencies._lookup_api_key("hash-1") == (MERCHANT_ID, True)
+    assert len(statements) == 1
+    dependencies._api_key_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_deactivation_evicts_shared_api_key_entries(monkeypatch):
+    """Test deactivating a merchant drops its shared auth entries, so other workers re-read the DB."""
+    backend = SharedMemoryBackend()
+    merchant = {"id": MERCHANT_ID, "is_active": True}
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "PATCH":
+            merchant["is_active"] = False
+        return httpx.Response(200, json=[dict(merchant)])
+    
+    client = mock_db_client(handler)
+    monkeypatch.setattr(dependencies, "shared_cache", backend)
+    monkeypatch.setattr(dependencies, "db", client)
+    monkeypatch.setattr(admin, "db", client)
+    monkeypatch.setattr(settings, "admin_api_key", "admin-secret")
+    dependencies._api_key_cache.clear()
+    
+    assert await dependencies._lookup_api_key("hash-1") == (MERCHANT_ID, True)
+    assert await backend.get("auth:hash-1") is not MISSING
+    
+    from src.main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        response = await http.post(
+            f"/admin/merchants/{MERCHANT_ID}/deactivate", headers={"X-Admin-Key": "admin-secret"}
+        )
+    
+    assert response.status_code == 200
+    assert await backend.get("auth:hash-1") is MISSING
+    
+    # Another worker (empty local cache) now sees the inactive merchant
+    assert await dependencies._lookup_api_key("hash-1") == (MERCHANT_ID, False)
+    dependencies._api_key_cache.clear()
+    await client.aclose()
+
+
+def test_unknown_backend_is_rejected():
+    """Test a typo in CACHE_BACKEND fails at startup."""
+    with pytest.raises(ValueError):
+        create_cache_backend("memcache")
@@ -0,0 +1,71 @@
+"""
+Unit tests for the process-wide Adiq OAuth token cache.
+"""
+import asyncio
+import pytest
+from src.adapters.token_cache import AdiqTokenCache
+
+KEY = ("https://ecommerce-hml.adiq.io", "client-1")
+
+
+def make_fetcher(expires_in: int = 3600, delay: float = 0.01):
+    """Build a fake token fetcher that counts its calls."""
+    calls = {"count": 0}
+    
+    async def fetch():
+        calls["count"] += 1
+        await asyncio.sleep(delay)
+        return f"token-{calls['count']}", expires_in
+    
+    return fetch, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_single_refresh():
+    """Test many callers with an empty cache trigger one token call."""
+    cache = AdiqTokenCache(refresh_margin=300, expiry_margin=60)
+    fetch, calls = make_fetcher()
+    
+    tokens = await asyncio.gather(*[cache.get_token(KEY, fetch) for _ in range(20)])
+    
+    assert calls["count"] == 1
+    assert set(tokens) == {"token-1"}
+
+
+@pytest.mark.asyncio
+async def test_fresh_token_served_from_cache():
+    """Test a fresh token does not call Adiq again."""
+    cache = AdiqTokenCache(refresh_margin=300, expiry_margin=60)
+    fetch, calls = make_fetcher()
+    
+    await cache.get_token(KEY, fetch)
+    await cache.get_token(KEY, fetch)
+    
+    assert calls["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_token_in_refresh_window_is_refreshed_in_background():
+    """Test a token near expiry is served while a refresh runs."""
+    cache = AdiqTokenCache(refresh_margin=3600, expiry_margin=60)
+    fetch, calls = make_fetcher(expires_in=600)
+    
+    assert await cache.get_token(KEY, fetch) == "token-1"
+    assert await cache.get_token(KEY, fetch) == "token-1"
+    
+    await asyncio.sleep(0.05)
+    
+    assert calls["count"] == 2
+    assert await cache.get_token(KEY, fetch) == "token-2"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_refresh():
+    """Test an invalidated token is fetched again."""
+    cache = AdiqTokenCache(refresh_margin=300, expiry_margin=60)
+    fetch, calls = make_fetcher()
+    
+    await cache.get_token(KEY, fetch)
+    cache.invalidate(KEY)
+    
+    assert await cache.get_token(KEY, fetch) == "token-2"
@@ -0,0 +1,86 @@
+"""
+Unit tests for request tracing.
+"""
+import httpx
+import pytest
+from src.core.config import settings
+from src.core.metrics import db_span_namer
+from src.core.tracing import RingBufferExporter, Tracer, TracingTransport, ring_buffer, tracer
+
+
+def test_spans_nest_and_export_whole_trace():
+    """Test child spans share the trace id and the trace is exported when the root ends."""
+    exporter = RingBufferExporter(capacity=5)
+    local_tracer = Tracer()
+    local_tracer.add_exporter(exporter)
+    
+    with local_tracer.span("root") as root:
+        with local_tracer.span("child", **{"card.pan": "4111111111111111"}) as child:
+            pass
+        assert exporter.list_traces() == []
+    
+    spans = exporter.get_trace(root.trace_id)
+    assert [span["name"] for span in spans] == ["root", "child"]
+    assert child.parent_id == root.span_id
+    assert spans[1]["attributes"]["card.pan"] != "4111111111111111"
+
+
+def test_span_records_error_status():
+    """Test an exception marks the span as error and is re-raised."""
+    exporter = RingBufferExporter(capacity=5)
+    local_tracer = Tracer()
+    local_tracer.add_exporter(exporter)
+    
+    with pytest.raises(ValueError):
+        with local_tracer.span("failing"):
+            raise ValueError("boom")
+    
+    summary = exporter.list_traces()[0]
+    assert summary["status"] == "error"
+    assert summary["span_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tracing_transport_adds_child_span_without_query_string():
+    """Test outbound calls become child spans named after table/operation, without filters."""
+    exporter = RingBufferExporter(capacity=5)
+    tracer.add_exporter(exporter)
+    transport = TracingTransport(httpx.MockTransport(lambda request: httpx.Response(200, json=[])), db_span_namer)
+    
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://db/rest/v1") as client:
+            # Outside a trace: no span
+            await client.get("/merchants")
+            with tracer.span("request") as root:
+                await client.get("/merchants", params={"api_key_hash": "eq.secret"})
+    finally:
+        tracer.exporters.remove(exporter)
+    
+    assert len(exporter.list_traces()) == 1
+    spans = exporter.get_trace(root.trace_id)
+    assert spans[1]["name"] == "db.merchants.select"
+    assert spans[1]["parent_id"] == root.span_id
+    assert "secret" not in str(spans[1])
+
+
+@pytest.mark.asyncio
+async def test_admin_traces_endpoint(monkeypatch):
+    """Test /admin/traces is hidden without ADMIN_API_KEY and serves the ring buffer with it."""
+    from src.main import app
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        monkeypatch.setattr(settings, "admin_api_key", None)
+        assert (await client.get("/admin/traces")).status_code == 404
+        
+        monkeypatch.setattr(settings, "admin_api_key", "admin-secret")
+        if ring_buffer not in tracer.exporters:
+            monkeypatch.setattr(tracer, "exporters", [ring_buffer])
+        
+        assert (await client.get("/admin/traces", headers={"X-Admin-Key": "wrong"})).status_code == 401
+        
+        health = await client.get("/health")
+        trace_id = health.headers["X-Trace-Id"]
+        response = await client.get(f"/admin/traces/{trace_id}", headers={"X-Admin-Key": "admin-secret"})
+    
+    assert response.status_code == 200
+    assert response.json()["spans"][0]["name"] == "GET /health"
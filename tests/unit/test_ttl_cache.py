@@ -0,0 +1,48 @@
+"""
+Unit tests for the in-process TTL cache and cached API key lookups.
+"""
+import pytest
+from src.core.cache import TTLCache, MISSING
+from src.api import dependencies
+
+
+def test_expired_entry_is_missing():
+    """Test entries disappear after their TTL."""
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("key", "value", ttl=0)
+    
+    assert cache.get("key") is MISSING
+
+
+def test_none_is_cached_value():
+    """Test None is stored as a value (negative caching)."""
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("bad-key", None)
+    
+    assert cache.get("bad-key") is None
+
+
+def test_max_size_evicts_oldest():
+    """Test the least recently used entry is evicted."""
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+
+
+@pytest.mark.asyncio
+async def test_evict_merchant_auth():
+    """Test deactivation eviction drops only that merchant's keys."""
+    dependencies._api_key_cache.clear()
+    dependencies._api_key_cache.set("hash-1", ("merchant-1", True))
+    dependencies._api_key_cache.set("hash-2", ("merchant-1", True))
+    dependencies._api_key_cache.set("hash-3", ("merchant-2", True))
+    dependencies._api_key_cache.set("hash-4", None)
+    
+    assert await dependencies.evict_merchant_auth("merchant-1") == 2
+    assert dependencies._api_key_cache.get("hash-3") == ("merchant-2", True)
+    assert dependencies._api_key_cache.get("hash-4") is None
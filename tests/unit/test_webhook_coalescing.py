@@ -0,0 +1,69 @@
+"""
+Unit tests for per-payment webhook coalescing (DB mocked).
+"""
+import json
+import httpx
+import pytest
+from src.core.state_machine import can_reach_transaction, get_transaction_source_states
+from src.services import invoice_service, webhook_service
+from src.services.webhook_service import WebhookService
+from tests.fixtures.mock_db import mock_db_client, invoice_row, INVOICE_ID
+
+
+def test_transaction_reachability():
+    """Test a later status is reachable and an earlier one is not."""
+    assert can_reach_transaction("CREATED", "SETTLED")
+    assert can_reach_transaction("CAPTURED", "CAPTURED")
+    assert not can_reach_transaction("CAPTURED", "AUTHORIZED")
+    assert sorted(get_transaction_source_states("CAPTURED")) == ["AUTHORIZED", "CAPTURED", "CREATED"]
+
+
+def test_coalesce_drops_stale_status():
+    """Test a late Authorized does not replace Captured; the auth code is kept."""
+    payload = WebhookService()._coalesce_payloads([
+        {"paymentId": "pay-1", "status": "Authorized", "authorizationCode": "123456"},
+        {"paymentId": "pay-1", "status": "Captured"},
+        {"paymentId": "pay-1", "status": "Authorized"},
+    ])
+    
+    assert payload["status"] == "Captured"
+    assert payload["authorizationCode"] == "123456"
+
+
+@pytest.mark.asyncio
+async def test_batch_costs_one_transaction_update(monkeypatch):
+    """Test three webhooks for one payment cause a single compare-and-set update."""
+    requests = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.url.path, str(request.url.params)))
+        if request.url.path.endswith("/transactions"):
+            body = [{"id": "tx-1", "invoice_id": INVOICE_ID, "status": "SETTLED"}]
+        elif request.url.path.endswith("/invoices"):
+            body = [{**invoice_row(), "status": "PAID"}]
+        else:
+            body = []
+        return httpx.Response(200, content=json.dumps(body))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(webhook_service, "db", client)
+    monkeypatch.setattr(invoice_service, "db", client)
+    
+    await WebhookService().process_logged_webhooks([
+        {"id": "wh-1", "payment_id": "pay-1", "payload": {"paymentId": "pay-1", "status": "Authorized"}},
+        {"id": "wh-2", "payment_id": "pay-1", "payload": {"paymentId": "pay-1", "status": "Captured"}},
+        {"id": "wh-3", "payment_id": "pay-1", "payload": {"paymentId": "pay-1", "status": "Settled"}},
+    ])
+    
+    transaction_updates = [r for r in requests if r[1].endswith("/transactions")]
+    assert len(transaction_updates) == 1
+    method, _, params = transaction_updates[0]
+    assert method == "PATCH"
+    assert "payment_id=eq.pay-1" in params
+    assert "CAPTURED" in params and "SETTLED" in params
+    
+    webhook_updates = [r for r in requests if r[1].endswith("/webhook_logs")]
+    assert len(webhook_updates) == 1
+    assert "wh-1" in webhook_updates[0][2] and "wh-3" in webhook_updates[0][2]
+    
+    await client.aclose()
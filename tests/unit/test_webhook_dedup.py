@@ -0,0 +1,74 @@
+"""
+Unit tests for webhook deduplication on receive (DB mocked).
+"""
+import json
+import httpx
+import pytest
+from src.core.exceptions import DuplicateWebhookError
+from src.services import webhook_service
+from src.services.webhook_service import WebhookService, webhook_dedup_key
+from tests.fixtures.mock_db import mock_db_client
+
+
+@pytest.fixture(autouse=True)
+def clear_recent_webhooks():
+    """Start every test with an empty recent-events set."""
+    webhook_service._recent_webhooks.clear()
+    yield
+    webhook_service._recent_webhooks.clear()
+
+
+def test_dedup_key_distinguishes_statuses():
+    """Test Captured and Settled for one payment get distinct keys."""
+    captured = webhook_dedup_key({"paymentId": "pay-1", "status": "Captured"})
+    settled = webhook_dedup_key({"paymentId": "pay-1", "status": "Settled"})
+    
+    assert captured == "pay-1:Captured"
+    assert captured != settled
+    assert webhook_dedup_key({"status": "Captured"}) is None
+
+
+@pytest.mark.asyncio
+async def test_retry_is_rejected_without_db_round_trip(monkeypatch):
+    """Test a retried event is answered from the recent-events set."""
+    calls = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        return httpx.Response(201)
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(webhook_service, "db", client)
+    payload = {"paymentId": "pay-1", "status": "Captured"}
+    
+    webhook_log = await WebhookService().receive_webhook(payload, "")
+    with pytest.raises(DuplicateWebhookError):
+        await WebhookService().receive_webhook(payload, "")
+    
+    assert webhook_log["dedup_key"] == "pay-1:Captured"
+    assert webhook_log["next_attempt_at"]  # stored claimed by this process
+    assert calls == ["POST"]
+    
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_unique_violation_is_reported_as_duplicate(monkeypatch):
+    """Test the unique index rejecting an event another process stored."""
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(409, content=json.dumps({
+            "code": "23505",
+            "message": "duplicate key value violates unique constraint",
+            "details": None,
+            "hint": None
+        }))
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(webhook_service, "db", client)
+    
+    with pytest.raises(DuplicateWebhookError):
+        await WebhookService().receive_webhook({"paymentId": "pay-2", "status": "Settled"}, "")
+    
+    assert webhook_service._recent_webhooks.get("pay-2:Settled", False)
+    
+    await client.aclose()
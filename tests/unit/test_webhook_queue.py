@@ -0,0 +1,206 @@
+"""
+Unit tests for the background webhook queue.
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from src.services import webhook_service
+from src.services.webhook_queue import WebhookQueue
+from src.services.webhook_service import WebhookService
+from tests.fixtures.mock_db import mock_db_client, INVOICE_ID
+
+
+class FakeWebhookService:
+    """Records processed webhooks instead of touching the database."""
+    
+    def __init__(self, pending=None, fail_ids=()):
+        self.pending = pending or []
+        self.fail_ids = set(fail_ids)
+        self.processed = []
+        self.batches = []
+        self.released = []
+    
+    async def claim_pending_webhooks(self, limit):
+        return self.pending[:limit]
+    
+    async def release_webhooks(self, webhook_ids):
+        self.released.extend(webhook_ids)
+    
+    async def process_logged_webhooks(self, webhook_logs):
+        await asyncio.sleep(0)
+        self.batches.append([webhook_log["id"] for webhook_log in webhook_logs])
+        if any(webhook_log["id"] in self.fail_ids for webhook_log in webhook_logs):
+            raise RuntimeError("boom")
+        self.processed.extend(webhook_log["id"] for webhook_log in webhook_logs)
+
+
+@pytest.fixture(autouse=True)
+def no_coalesce_window(monkeypatch):
+    """Process events immediately unless a test opts into coalescing."""
+    monkeypatch.setattr("src.services.webhook_queue.settings.webhook_coalesce_window", 0)
+
+
+def make_queue(service, concurrency=2, max_size=10):
+    queue = WebhookQueue(concurrency=concurrency, max_size=max_size)
+    queue.service = service
+    return queue
+
+
+async def drain(queue):
+    await queue._keys.join()
+
+
+@pytest.mark.asyncio
+async def test_enqueued_webhooks_are_processed_by_workers():
+    """Test queued webhooks are processed by the worker pool."""
+    service = FakeWebhookService()
+    queue = make_queue(service)
+    await queue.start()
+    
+    for index in range(5):
+        assert await queue.enqueue({"id": f"wh-{index}"})
+    await drain(queue)
+    await queue.stop()
+    
+    assert sorted(service.processed) == [f"wh-{index}" for index in range(5)]
+    assert queue.stats()["processed"] == 5
+
+
+@pytest.mark.asyncio
+async def test_start_resumes_unprocessed_rows():
+    """Test start() re-enqueues rows left unprocessed by a previous run."""
+    service = FakeWebhookService(pending=[{"id": "old-1"}, {"id": "old-2"}])
+    queue = make_queue(service)
+    await queue.start()
+    await drain(queue)
+    await queue.stop()
+    
+    assert sorted(service.processed) == ["old-1", "old-2"]
+
+
+@pytest.mark.asyncio
+async def test_failures_are_counted_and_workers_keep_running():
+    """Test a failing webhook is counted and does not stop its worker."""
+    service = FakeWebhookService(fail_ids={"bad"})
+    queue = make_queue(service, concurrency=1)
+    await queue.start()
+    
+    await queue.enqueue({"id": "bad"})
+    await queue.enqueue({"id": "good"})
+    await drain(queue)
+    stats = queue.stats()
+    await queue.stop()
+    
+    assert service.processed == ["good"]
+    assert stats["failed"] == 1
+    assert stats["processed"] == 1
+    assert stats["depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_defers_event_to_database(monkeypatch):
+    """Test enqueue gives up on a full queue, releasing the event's claim for resumption."""
+    monkeypatch.setattr("src.services.webhook_queue.settings.webhook_enqueue_timeout", 0.01)
+    service = FakeWebhookService()
+    queue = make_queue(service, concurrency=1, max_size=1)
+    queue._keys = asyncio.Queue()  # no workers: the buffer stays full
+    queue._space = asyncio.Event()
+    
+    assert await queue.enqueue({"id": "a"})
+    assert not await queue.enqueue({"id": "b"})
+    assert queue.stats()["overflowed"] == 1
+    assert service.released == ["b"]
+    assert await queue.resume_pending() == 0  # no room: nothing is claimed
+
+
+@pytest.mark.asyncio
+async def test_events_for_one_payment_are_coalesced_in_order(monkeypatch):
+    """Test a burst for one payment is applied as one ordered batch."""
+    monkeypatch.setattr("src.services.webhook_queue.settings.webhook_coalesce_window", 0.05)
+    service = FakeWebhookService()
+    queue = make_queue(service, concurrency=4)
+    await queue.start()
+    
+    for webhook_id in ["auth", "capture", "settle"]:
+        await queue.enqueue({"id": webhook_id, "payment_id": "pay-1"})
+    await queue.enqueue({"id": "other", "payment_id": "pay-2"})
+    await drain(queue)
+    stats = queue.stats()
+    await queue.stop()
+    
+    assert ["auth", "capture", "settle"] in service.batches
+    assert ["other"] in service.batches
+    assert stats["coalesced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_events_arriving_mid_batch_wait_for_the_same_payment():
+    """Test one payment is never processed by two workers at once."""
+    active = set()
+    overlaps = []
+    
+    class SlowService(FakeWebhookService):
+        async def process_logged_webhooks(self, webhook_logs):
+            payment_id = webhook_logs[0]["payment_id"]
+            if payment_id in active:
+                overlaps.append(payment_id)
+            active.add(payment_id)
+            await asyncio.sleep(0.02)
+            active.discard(payment_id)
+            await super().process_logged_webhooks(webhook_logs)
+    
+    service = SlowService()
+    queue = make_queue(service, concurrency=4)
+    await queue.start()
+    
+    await queue.enqueue({"id": "first", "payment_id": "pay-1"})
+    await asyncio.sleep(0.005)
+    await queue.enqueue({"id": "second", "payment_id": "pay-1"})
+    await drain(queue)
+    await queue.stop()
+    
+    assert overlaps == []
+    assert service.processed == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_failed_webhook_is_retried_until_applied(monkeypatch):
+    """Test a webhook whose first attempt fails stays pending and is applied by a later retry round."""
+    monkeypatch.setattr("src.services.webhook_service.settings.webhook_retry_backoff", 0)
+    row = {
+        "id": "wh-1", "payment_id": "pay-1", "payload": {"paymentId": "pay-1", "status": "Authorized"},
+        "attempts": 0, "processed": False, "error": None
+    }
+    transaction_updates = []
+    claims = []
+    
+    def db_handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/rpc/claim_pending_webhooks"):
+            claims.append(json.loads(request.content))
+            return httpx.Response(200, json=[] if row["processed"] else [dict(row)])
+        if path.endswith("/webhook_logs"):
+            row.update(json.loads(request.content))
+            return httpx.Response(200, json=[])
+        transaction_updates.append(request)
+        if len(transaction_updates) == 1:
+            return httpx.Response(503, json={"message": "database unavailable"})
+        return httpx.Response(200, json=[{"id": "tx-1", "invoice_id": INVOICE_ID, "status": "AUTHORIZED"}])
+    
+    client = mock_db_client(db_handler)
+    monkeypatch.setattr(webhook_service, "db", client)
+    queue = make_queue(WebhookService(), concurrency=1)
+    
+    await queue.start()  # resumes the row: first attempt fails
+    await drain(queue)
+    assert row["attempts"] == 1 and row["error"] and not row["processed"]
+    
+    assert await queue.resume_pending() == 1  # what the retry loop runs
+    await drain(queue)
+    await queue.stop()
+    await client.aclose()
+    
+    assert row["processed"]
+    assert len(transaction_updates) == 2
+    assert claims[0] == {"p_limit": 10, "p_max_attempts": 10, "p_lease_seconds": 300.0}
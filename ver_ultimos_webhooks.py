@@ -1,7 +1,9 @@
 """
 Ver últimos webhooks no banco
 """
-from src.db.client import supabase
+from src.db.client import get_supabase_client
+
+supabase = get_supabase_client()
 
 print("Consultando últimos webhooks...")
 
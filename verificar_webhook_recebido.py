@@ -1,9 +1,11 @@
 """
 Verificar se webhook foi recebido
 """
-from src.db.client import supabase
+from src.db.client import get_supabase_client
 import time
 
+supabase = get_supabase_client()
+
 PAYMENT_ID = "020061252510301733450001281820620000000000"
 
 print("Verificando webhooks...")